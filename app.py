@@ -2,16 +2,22 @@ import streamlit as st
 import os
 import time
 import hashlib
+import html
 import csv
+import threading
+import uuid
 from datetime import datetime
-from PIL import Image
-
-try:
-    import gspread
-    from oauth2client.service_account import ServiceAccountCredentials
-except Exception:
-    gspread = None
-    ServiceAccountCredentials = None
+import image_pack
+from image_cache import ImageByteCache
+from image_normalize import normalized_path
+from result_journal import ResultJournal, make_record, read_journal
+from sheets_client import DEFAULT_READS_PER_MINUTE, DEFAULT_WRITES_PER_MINUTE, SheetsGateway, sheets_backend
+from sheets_emulator import emulator_settings
+from image_viewer import cxr_viewer, png_data_uri, telemetry_json
+from rapid_rating import rapid_rating
+from static_images import StaticImagePublisher
+from study_index import StudyIndex
+from warmup import WarmupRunner, start_health_server
 
 # =========================================================
 # Bilingual helper
@@ -45,8 +51,39 @@ ASSIGNMENT_PATH_CANDIDATES = [
     "./M2SMF_external_QA_hidden_assignment.csv",
     "/mnt/data/M2SMF_external_QA_hidden_assignment.csv",
 ]
+# scripts/build_study_index.py로 만든 SQLite index. CSV보다 오래되었거나 없으면 CSV를 직접 읽습니다.
+STUDY_INDEX_PATH = os.environ.get("M2SMF_STUDY_INDEX", "study_index.sqlite")
 IMAGE_ROOT_CANDIDATES = [".", "./images", "/mnt/data"]
+# scripts/build_image_pack.py로 만든 image pack. 설정되어 있고 이미지가 pack에 있으면 pack URI로 읽습니다.
+IMAGE_PACK_PATH = os.environ.get("M2SMF_IMAGE_PACK", "")
+# scripts/normalize_images.py 출력 폴더(normalized/<version>). 설정되어 있으면 정규화된 이미지를 먼저 사용합니다.
+NORMALIZED_IMAGE_DIR = os.environ.get("M2SMF_NORMALIZED_DIR", "")
+# static_images.py로 이미지를 content-hash URL로 보내 browser cache를 씁니다. "/app/static/img"(Streamlit static serving)
+# 또는 scripts/serve_static_images.py 주소(http://host:8601). 비어 있으면 기존처럼 st.image에 bytes/경로를 넘깁니다.
+IMAGE_URL_BASE = os.environ.get("M2SMF_IMAGE_URL_BASE", "")
+# "1"이면 st.image 대신 browser-side viewer(image_viewer.py: window/level, invert, zoom)를 쓰고,
+# 결과에 viewer_telemetry column을 추가합니다. 기존 Sheet header와 달라지므로 새 worksheet에서 켜세요.
+IMAGE_VIEWER = os.environ.get("M2SMF_IMAGE_VIEWER", "") == "1"
+# "1"이면 8개 radio 대신 keyboard rapid-entry checklist(rapid_rating.py)를 씁니다. 저장값(X/O/N/A)과 검증 규칙은 같습니다.
+RAPID_RATING = os.environ.get("M2SMF_RAPID_RATING", "") == "1"
 LOCAL_RESULT_DIR = "local_survey_results"
+# local journal의 fsync 주기(초). crash 시 최대 이 시간만큼의 OS buffer가 유실될 수 있습니다.
+JOURNAL_FSYNC_INTERVAL_SEC = 1.0
+# process 전체 이미지 byte cache 상한(MB). 1024² grayscale PNG 한 장은 대략 0.5–1 MB입니다.
+IMAGE_CACHE_MAX_MB = 256
+# 평가 대상 이미지의 표시 높이 상한(px).
+TARGET_IMAGE_MAX_HEIGHT = 1050
+# IMAGE_URL_BASE가 설정되어 있을 때, 현재 case를 보는 동안 browser가 미리 받아둘 다음 case 수.
+PREFETCH_AHEAD = 2
+# 서버 기동 직후 warm-up에서 reader별로 미리 decode할 case 수(현재 case 포함).
+WARMUP_CASES_PER_READER = 1 + PREFETCH_AHEAD
+# warm-up 상태를 http://<host>:<port>/health로 제공합니다. 비어 있으면 띄우지 않습니다 (scripts/serve_app.py가 설정).
+HEALTH_PORT = os.environ.get("M2SMF_HEALTH_PORT", "")
+# 기본은 loopback만. load balancer가 직접 probe해야 하면 M2SMF_HEALTH_HOST=0.0.0.0으로 둡니다.
+HEALTH_HOST = os.environ.get("M2SMF_HEALTH_HOST", "127.0.0.1")
+# process 전체가 공유하는 Google Sheets 요청 예산(분당). 서비스 계정 한도(분당 60)보다 약간 낮게 둡니다.
+SHEETS_READS_PER_MINUTE = int(os.environ.get("M2SMF_SHEETS_READS_PER_MINUTE", DEFAULT_READS_PER_MINUTE))
+SHEETS_WRITES_PER_MINUTE = int(os.environ.get("M2SMF_SHEETS_WRITES_PER_MINUTE", DEFAULT_WRITES_PER_MINUTE))
 
 # NOTE:
 # 이 앱은 artifact checklist만 받습니다.
@@ -148,7 +185,19 @@ HIDDEN_METADATA_HEADERS = [
 ]
 
 ARTIFACT_HEADERS = [a["sheet_col"] for a in ARTIFACTS]
-SHEET_HEADERS = BASE_HEADERS + HIDDEN_METADATA_HEADERS + ARTIFACT_HEADERS + ["time_spent_sec"]
+VIEWER_HEADERS = ["viewer_telemetry"] if IMAGE_VIEWER else []
+SHEET_HEADERS = BASE_HEADERS + HIDDEN_METADATA_HEADERS + ARTIFACT_HEADERS + ["time_spent_sec"] + VIEWER_HEADERS
+
+# Compact 저장 모드: assignment key + rating + timing만 저장합니다.
+# 나머지 column(app_version, blinded id, source path, generator, cv_role 등)은 모두
+# hidden assignment CSV에서 assignment_id로 다시 join할 수 있습니다
+# (scripts/rehydrate_compact_results.py, analyze_external_qa_survey_agreement.py).
+# 큰 study에서 Google Sheet cell limit / write quota를 줄이기 위한 옵션입니다.
+COMPACT_SHEET_HEADERS = ["timestamp", "study_id", "reader_id", "assignment_id"] + ARTIFACT_HEADERS + ["time_spent_sec"] + VIEWER_HEADERS
+RESULT_STORAGE_MODE = os.environ.get("M2SMF_RESULT_STORAGE_MODE", "full").strip().lower()
+if RESULT_STORAGE_MODE not in ("full", "compact"):
+    raise RuntimeError(f"M2SMF_RESULT_STORAGE_MODE must be 'full' or 'compact', got {RESULT_STORAGE_MODE!r}")
+RESULT_HEADERS = COMPACT_SHEET_HEADERS if RESULT_STORAGE_MODE == "compact" else SHEET_HEADERS
 
 # 요청 조건 1 반영: 선택/Select placeholder 제거.
 # radio는 index=None으로 시작해, 사용자가 X/O/N/A 중 하나를 직접 선택해야 합니다.
@@ -164,26 +213,59 @@ st.set_page_config(page_title=b("외부 합성 CXR artifact 설문", "External S
 # =========================================================
 # Google Sheets and local fallback
 # =========================================================
-def get_google_sheet(reader_id: str):
-    if gspread is None or ServiceAccountCredentials is None:
+@st.cache_resource
+def get_sheets_gateway():
+    # process당 하나: 모든 session이 분당 read/write 예산, 동일 read 합치기, deferred row queue를 공유합니다.
+    return SheetsGateway(reads_per_minute=SHEETS_READS_PER_MINUTE, writes_per_minute=SHEETS_WRITES_PER_MINUTE)
+
+
+SHEETS_SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+def existing_worksheet_titles():
+    """
+    SHEET_NAME에 이미 있는 worksheet 제목(read 1회). warm-up은 이 안의 worksheet만 열고,
+    add_worksheet는 reader가 처음 접속할 때 get_google_sheet가 합니다. 연결 설정이 없으면 None.
+    """
+    try:
+        backend = sheets_backend(st.secrets, SHEETS_SCOPE)
+    except Exception:
+        # secrets.toml 없음 또는 gspread 미설치
+        backend = None
+    if backend is None:
         return None
+    authorize, _ = backend
+    worksheets = get_sheets_gateway().read(("worksheets", SHEET_NAME), lambda: authorize().open(SHEET_NAME).worksheets())
+    return {ws.title for ws in worksheets}
+
+
+def get_google_sheet(reader_id: str):
+    """
+    reader worksheet를 process당 한 번만 열고, 이후에는 같은 ManagedWorksheet(sheets_client.py)를 돌려줍니다.
+    M2SMF_SHEETS_EMULATOR 또는 [sheets_emulator] secret이 있으면 Google 대신 local emulator(sheets_emulator.py)를 씁니다.
+    """
     try:
-        scope = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive",
-        ]
-        if "gcp_service_account" not in st.secrets:
+        # gspread/oauth2client는 credentials가 있을 때만 import합니다 (cold start 단축).
+        try:
+            backend = sheets_backend(st.secrets, SHEETS_SCOPE)
+        except ImportError:
+            return None
+        if backend is None:
             return None
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        sh = client.open(SHEET_NAME)
+        authorize, worksheet_not_found = backend
         worksheet_name = READER_CONFIG[reader_id]["worksheet_name"]
-        try:
-            ws = sh.worksheet(worksheet_name)
-        except gspread.exceptions.WorksheetNotFound:
-            ws = sh.add_worksheet(title=worksheet_name, rows=1000, cols=len(SHEET_HEADERS))
-        return ws
+
+        def open_worksheet():
+            sh = authorize().open(SHEET_NAME)
+            try:
+                return sh.worksheet(worksheet_name)
+            except worksheet_not_found:
+                return sh.add_worksheet(title=worksheet_name, rows=1000, cols=len(RESULT_HEADERS))
+
+        return get_sheets_gateway().worksheet((SHEET_NAME, worksheet_name), open_worksheet)
     except Exception as e:
         st.sidebar.error(b("Google Sheet 연결 실패", "Google Sheet connection failed") + f": {e}")
         return None
@@ -195,8 +277,8 @@ def ensure_sheet_header(sheet):
     try:
         values = sheet.get_all_values()
         if len(values) == 0:
-            sheet.append_row(SHEET_HEADERS)
-        elif values[0] != SHEET_HEADERS:
+            sheet.append_row(RESULT_HEADERS)
+        elif values[0] != RESULT_HEADERS:
             st.warning(
                 b(
                     "⚠️ Google Sheet 헤더가 현재 artifact-only v1.2 앱과 다릅니다. 새 worksheet 또는 새 sheet 사용을 권장합니다.",
@@ -207,34 +289,60 @@ def ensure_sheet_header(sheet):
         st.sidebar.error(b("Google Sheet 헤더 확인 실패", "Google Sheet header check failed") + f": {e}")
 
 
+@st.cache_resource
+def get_result_journal():
+    # process당 하나: journal fd를 열어둔 채 group commit(fsync)으로 저장합니다.
+    return ResultJournal(fsync_interval=JOURNAL_FSYNC_INTERVAL_SEC)
+
+
 def local_result_path(reader_id: str) -> str:
+    """예전 local CSV 경로. 지금은 scripts/export_result_journal.py가 journal에서 만들어 줍니다."""
     os.makedirs(LOCAL_RESULT_DIR, exist_ok=True)
-    return os.path.join(LOCAL_RESULT_DIR, f"{STUDY_ID}_{reader_id}.csv")
+    suffix = "_compact" if RESULT_STORAGE_MODE == "compact" else ""
+    return os.path.join(LOCAL_RESULT_DIR, f"{STUDY_ID}_{reader_id}{suffix}.csv")
+
+
+def local_journal_path(reader_id: str) -> str:
+    return os.path.splitext(local_result_path(reader_id))[0] + ".ndjson"
+
+
+def append_local_result(reader_id: str, row: list, token: str):
+    get_result_journal().append(local_journal_path(reader_id), make_record(token, RESULT_HEADERS, row))
 
 
-def append_local_result(reader_id: str, row: list):
+def load_local_processed_assignment_ids(reader_id: str):
+    """Sheet 미연결 시 resume 위치를 local journal(과 예전 local CSV)에서 결정한다."""
+    processed = set()
+    saved_rows = [record["row"] for record in read_journal(local_journal_path(reader_id))]
     path = local_result_path(reader_id)
-    new_file = not os.path.exists(path)
-    with open(path, "a", encoding="utf-8-sig", newline="") as f:
-        writer = csv.writer(f)
-        if new_file:
-            writer.writerow(SHEET_HEADERS)
-        writer.writerow(row)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            saved_rows += list(csv.DictReader(f))
+    for row in saved_rows:
+        if row.get("study_id") == STUDY_ID and row.get("reader_id") == reader_id and row.get("assignment_id"):
+            processed.add(row["assignment_id"])
+    return processed
 
 
 def load_processed_assignment_ids(sheet, reader_id: str):
     """
-    Google Sheet에 이미 저장된 assignment_id만 읽어서 resume 위치를 결정한다.
-    local CSV는 사용하지 않는다.
+    Google Sheet와 local journal에 저장된 assignment_id로 resume 위치를 결정한다.
 
     동작:
       - Sheet에 row가 있으면 해당 assignment_id는 완료 처리
-      - Sheet에 row가 없으면 processed=set() → 처음부터 시작
+      - quota 때문에 아직 Sheet에 못 보낸(deferred) row도 완료 처리
+      - local journal에만 있는 row(Sheet 저장 실패, queue에서 버려진 row)도 완료 처리.
+        submit token은 이미 예약되어 있으므로, 여기서 빼면 같은 case가 다시 나오고
+        "이미 저장된 케이스" toast에서 빠져나오지 못한다. Sheet 누락분은
+        scripts/reconcile_survey_results.py로 채운다.
+      - Sheet와 local journal이 모두 비어 있으면 processed=set() → 처음부터 시작
+        (reset하려면 worksheet와 local journal을 함께 비운다)
+      - Sheet 미연결이면 local journal 기준으로 resume
     """
-    processed = set()
-
     if sheet is None:
-        return processed
+        return load_local_processed_assignment_ids(reader_id)
+
+    processed = set(sheet.pending_tags()) | load_local_processed_assignment_ids(reader_id)
 
     try:
         rows = sheet.get_all_values()
@@ -278,37 +386,214 @@ def load_processed_assignment_ids(sheet, reader_id: str):
 
     return processed
 
+# =========================================================
+# Idempotent submissions / reader lease
+# =========================================================
+# 같은 reader가 두 탭에서 앱을 열거나 "저장하고 다음으로"를 두 번 누르면 같은 assignment_id가
+# 중복 저장될 수 있습니다. 모든 submit은 (study, reader, assignment, attempt)로 만든
+# idempotency token을 가지며, process 안의 모든 session이 공유하는 dedupe index를 통과해야
+# 저장됩니다. reader별 lease는 두 session이 같은 worklist를 동시에 진행하지 못하게 합니다.
+LEASE_TTL_SEC = 900
+
+
+def submission_token(reader_id: str, assignment_id: str, attempt: int = 0) -> str:
+    """
+    같은 assignment에 대한 retry/double click은 같은 token을 만든다.
+    coordinator가 의도적으로 재평가를 허용할 때만 attempt를 올린다.
+    """
+    return hashlib.sha1(f"{STUDY_ID}:{reader_id}:{assignment_id}:{attempt}".encode("utf-8")).hexdigest()[:16]
+
+
+@st.cache_resource
+def get_submission_registry():
+    return {"lock": threading.Lock(), "tokens": set(), "leases": {}}
+
+
+def seed_submission_tokens(registry: dict, reader_id: str, assignment_ids):
+    tokens = {submission_token(reader_id, a) for a in assignment_ids}
+    with registry["lock"]:
+        registry["tokens"].update(tokens)
+
+
+def reserve_submission(registry: dict, token: str) -> bool:
+    """token이 처음이면 예약하고 True, 이미 저장(또는 저장 중)이면 False."""
+    with registry["lock"]:
+        if token in registry["tokens"]:
+            return False
+        registry["tokens"].add(token)
+        return True
+
+
+def release_submission(registry: dict, token: str):
+    with registry["lock"]:
+        registry["tokens"].discard(token)
+
+
+def acquire_reader_lease(registry: dict, reader_id: str, session_token: str, force: bool = False) -> bool:
+    """다른 session이 유효한 lease를 갖고 있으면 False. 성공하면 lease를 갱신한다."""
+    now = time.time()
+    with registry["lock"]:
+        holder = registry["leases"].get(reader_id)
+        if holder and holder[0] != session_token and holder[1] > now and not force:
+            return False
+        registry["leases"][reader_id] = (session_token, now + LEASE_TTL_SEC)
+        return True
+
+
+def release_reader_lease(registry: dict, reader_id: str, session_token: str):
+    with registry["lock"]:
+        holder = registry["leases"].get(reader_id)
+        if holder and holder[0] == session_token:
+            del registry["leases"][reader_id]
+
 # =========================================================
 # Assignment / image loading
 # =========================================================
-@st.cache_data
-def load_assignment():
+ASSIGNMENT_REQUIRED_COLS = [
+    "assignment_id",
+    "reader_id",
+    "reader_sequence",
+    "blinded_image_id",
+    "blinded_filename",
+    "case_hash",
+    "image_relpath",
+    "image_path",
+    "generated_image_id",
+    "prompt_id",
+    "model_key",
+]
+
+
+def find_assignment_path() -> str:
     for path in ASSIGNMENT_PATH_CANDIDATES:
         if path and os.path.exists(path):
-            with open(path, "r", encoding="utf-8-sig", newline="") as f:
-                rows = [row for row in csv.DictReader(f)]
-            required_cols = [
-                "assignment_id",
-                "reader_id",
-                "reader_sequence",
-                "blinded_image_id",
-                "blinded_filename",
-                "case_hash",
-                "image_relpath",
-                "image_path",
-                "generated_image_id",
-                "prompt_id",
-                "model_key",
-            ]
-            missing = [c for c in required_cols if len(rows) == 0 or c not in rows[0]]
-            if missing:
-                raise RuntimeError(f"Assignment CSV is missing columns: {missing}")
-            return rows, path
+            return path
     raise FileNotFoundError(
         "Hidden assignment manifest not found. Expected one of: " + ", ".join(ASSIGNMENT_PATH_CANDIDATES)
     )
 
 
+def load_assignment_from_index(assignment_path: str):
+    """study index가 이 assignment CSV로 만들어졌고 최신이면 index의 row를, 아니면 None을 반환합니다."""
+    if not STUDY_INDEX_PATH or not os.path.exists(STUDY_INDEX_PATH):
+        return None
+    try:
+        index = StudyIndex(STUDY_INDEX_PATH)
+        try:
+            sources = index.source_paths("hidden_assignment")
+            if not index.is_fresh() or not any(os.path.samefile(p, assignment_path) for p in sources):
+                return None
+            return index.assignment_rows()
+        finally:
+            index.close()
+    except Exception:
+        return None
+
+
+def load_assignment():
+    path = find_assignment_path()
+    rows = load_assignment_from_index(path)
+    if rows is None:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = [row for row in csv.DictReader(f)]
+    missing = [c for c in ASSIGNMENT_REQUIRED_COLS if len(rows) == 0 or c not in rows[0]]
+    if missing:
+        raise RuntimeError(f"Assignment CSV is missing columns: {missing}")
+    return rows, path
+
+
+class CaseRecord:
+    """Worklist 한 줄. rerun마다 다시 계산하지 않도록 hash/path/metadata를 미리 담아둡니다."""
+
+    __slots__ = (
+        "assignment_id",
+        "reader_sequence",
+        "blinded_image_id",
+        "blinded_filename",
+        "case_hash",
+        "image_path",
+        "image_refs",
+        "source_metadata",
+        "stem_index",
+    )
+
+    def __init__(self, row: dict, stem_index: "ImageStemIndex"):
+        self.assignment_id = row["assignment_id"]
+        self.reader_sequence = int(row["reader_sequence"])
+        self.blinded_image_id = row["blinded_image_id"]
+        self.blinded_filename = row["blinded_filename"]
+        self.case_hash = row.get("case_hash") or hashlib.sha1(self.assignment_id.encode()).hexdigest()[:10]
+        self.image_path = resolve_image_path(row, stem_index)
+        self.image_refs = {"image_path": row.get("image_path", ""), "image_relpath": row.get("image_relpath", "")}
+        self.source_metadata = tuple(build_source_metadata(row))
+        self.stem_index = stem_index
+
+    def current_image_path(self) -> str:
+        # startup 이후 이미지가 복사된 경우를 위해, 미리 찾은 경로가 없을 때만 다시 찾습니다.
+        # stem fallback은 worklist가 공유하는 index를 쓰므로 rerun마다 walk하지 않습니다.
+        if self.image_path and image_pack.exists(self.image_path):
+            return self.image_path
+        self.image_path = resolve_image_path(self.image_refs, self.stem_index)
+        return self.image_path
+
+
+@st.cache_resource(max_entries=2)
+def compile_worklists(assignment_path: str, manifest_mtime_ns: int):
+    """
+    hidden assignment를 process당 한 번만 읽어 reader별 worklist(tuple of CaseRecord)로 컴파일합니다.
+    manifest_mtime_ns가 cache key에 들어가므로 manifest가 바뀌면 자동으로 다시 컴파일됩니다.
+    """
+    rows, _ = load_assignment()
+    # 직접 resolve되지 않는 row가 있을 때만 walk합니다.
+    stem_index = ImageStemIndex()
+    by_reader = {}
+    for row in rows:
+        by_reader.setdefault(row.get("reader_id"), []).append(CaseRecord(row, stem_index))
+    return {rd: tuple(sorted(cases, key=lambda c: c.reader_sequence)) for rd, cases in by_reader.items()}
+
+
+def get_worklists():
+    path = find_assignment_path()
+    return compile_worklists(path, os.stat(path).st_mtime_ns), path
+
+
+def build_image_stem_index():
+    """
+    IMAGE_ROOT_CANDIDATES를 한 번만 walk해서 stem -> [path, ...] (walk 순서) index를 만듭니다.
+    이미 walk한 root 아래에 있는 root(예: "." 아래의 "./images")는 다시 walk하지 않습니다.
+    """
+    valid_exts = {".png", ".jpg", ".jpeg", ".webp"}
+    index = {}
+    walked = []
+    for root in IMAGE_ROOT_CANDIDATES:
+        if not os.path.exists(root):
+            continue
+        real = os.path.realpath(root)
+        if any(os.path.commonpath([real, w]) == w for w in walked):
+            continue
+        walked.append(real)
+        for dirpath, _, filenames in os.walk(root):
+            for fname in filenames:
+                fstem, fext = os.path.splitext(fname)
+                if fext.lower() in valid_exts:
+                    index.setdefault(fstem, []).append(os.path.join(dirpath, fname))
+    return index
+
+
+class ImageStemIndex:
+    """build_image_stem_index를 처음 조회될 때 한 번만 만드는 lazy wrapper (session thread 간 공유)."""
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def get(self, stem: str, default=None):
+        with self._lock:
+            if self._index is None:
+                self._index = build_image_stem_index()
+        return self._index.get(stem, default)
+
+
 def _case_insensitive_existing_path(path: str):
     """
     Exact path가 없을 때, 같은 폴더 안에서 대소문자만 다른 파일을 찾습니다.
@@ -355,6 +640,8 @@ def _extension_variants(path: str):
         ".JPG",
         ".jpeg",
         ".JPEG",
+        ".webp",
+        ".WEBP",
     ]
 
     # 중복 제거하면서 순서 유지
@@ -371,7 +658,7 @@ def _extension_variants(path: str):
     return variants
 
 
-def resolve_image_path(row: dict) -> str:
+def resolve_image_path(row: dict, stem_index: dict = None) -> str:
     """
     image_path / image_relpath가 .png로 되어 있어도
     실제 파일이 .jpg/.jpeg인 경우까지 찾아서 반환합니다.
@@ -380,7 +667,29 @@ def resolve_image_path(row: dict) -> str:
       manifest: roentgen/P006.png
       실제 파일: roentgen/P006.jpg
       반환: roentgen/P006.jpg
+
+    stem_index(ImageStemIndex 또는 build_image_stem_index의 dict)가 있으면 3) fallback에서 os.walk 대신 index를 사용합니다.
+    IMAGE_PACK_PATH가 설정되어 있으면 0) pack에 들어있는 이미지를 먼저 pack URI로 반환하고,
+    NORMALIZED_IMAGE_DIR가 설정되어 있으면 그 다음으로 정규화된 이미지를 반환합니다.
     """
+    # 0) image pack (pack URI가 manifest에 직접 들어있는 경우 포함)
+    for key in ["image_path", "image_relpath"]:
+        val = row.get(key, "")
+        if image_pack.is_pack_uri(val):
+            return val
+    if IMAGE_PACK_PATH and os.path.exists(IMAGE_PACK_PATH):
+        for key in ["image_relpath", "image_path"]:
+            uri = image_pack.pack_uri(IMAGE_PACK_PATH, os.path.normpath(row.get(key) or ".").replace("\\", "/"))
+            if image_pack.exists(uri):
+                return uri
+    if NORMALIZED_IMAGE_DIR:
+        for key in ["image_relpath", "image_path"]:
+            val = row.get(key, "")
+            if val and not os.path.isabs(val):
+                candidate = normalized_path(NORMALIZED_IMAGE_DIR, os.path.normpath(val))
+                if os.path.exists(candidate):
+                    return candidate
+
     candidates = []
 
     # 1) manifest에 들어있는 image_path, image_relpath 기반 후보 생성
@@ -416,26 +725,18 @@ def resolve_image_path(row: dict) -> str:
     stem, _ = os.path.splitext(basename)
 
     if stem:
-        valid_exts = {".png", ".jpg", ".jpeg"}
-        for root in IMAGE_ROOT_CANDIDATES:
-            if not os.path.exists(root):
-                continue
-
-            for dirpath, _, filenames in os.walk(root):
-                for fname in filenames:
-                    fstem, fext = os.path.splitext(fname)
-                    if fstem == stem and fext.lower() in valid_exts:
-                        candidate = os.path.join(dirpath, fname)
-
-                        # 가능하면 원래 relpath의 folder까지 맞는 것을 우선 반환
-                        norm_candidate = os.path.normpath(candidate).replace("\\", "/")
-                        rel_folder = os.path.dirname(rel)
-                        if rel_folder:
-                            norm_rel_folder = os.path.normpath(rel_folder).replace("\\", "/")
-                            if f"/{norm_rel_folder}/" in f"/{norm_candidate}":
-                                return candidate
-                        else:
-                            return candidate
+        if stem_index is None:
+            stem_index = build_image_stem_index()
+        for candidate in stem_index.get(stem, []):
+            # 가능하면 원래 relpath의 folder까지 맞는 것을 우선 반환
+            norm_candidate = os.path.normpath(candidate).replace("\\", "/")
+            rel_folder = os.path.dirname(rel)
+            if rel_folder:
+                norm_rel_folder = os.path.normpath(rel_folder).replace("\\", "/")
+                if f"/{norm_rel_folder}/" in f"/{norm_candidate}":
+                    return candidate
+            else:
+                return candidate
 
     # 4) 그래도 못 찾으면 기존 값 반환
     return row.get("image_path") or row.get("image_relpath")
@@ -466,17 +767,68 @@ def build_source_metadata(row: dict):
     ]
 
 
-@st.cache_data(ttl=3600)
-def resize_image_pil(image_path, max_height=960):
-    try:
-        img = Image.open(image_path).convert("RGB")
-        if img.height <= max_height:
-            return img
-        aspect_ratio = img.width / img.height
-        new_width = int(max_height * aspect_ratio)
-        return img.resize((new_width, max_height), Image.LANCZOS)
-    except Exception:
-        return None
+@st.cache_resource
+def get_image_cache():
+    # 모든 session이 공유하는 grayscale PNG byte cache (LRU, IMAGE_CACHE_MAX_MB 상한).
+    return ImageByteCache(max_bytes=IMAGE_CACHE_MAX_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def get_static_publisher():
+    return StaticImagePublisher(IMAGE_URL_BASE)
+
+
+def load_display_image(image_path, max_height=960):
+    return get_image_cache().get(image_path, max_height)
+
+
+def render_prefetch_hints(assigned_cases, current_idx: int, processed_ids):
+    """
+    다음 PREFETCH_AHEAD개 미완료 case의 이미지를 숨긴 <img>로 미리 받아 browser cache에 넣습니다.
+    URL은 content hash뿐이라 generator/prompt 정보가 드러나지 않고, 다음 rerun의 st.image와 같은 URL입니다.
+    """
+    if not IMAGE_URL_BASE or PREFETCH_AHEAD <= 0:
+        return
+    urls = []
+    for case in assigned_cases[current_idx + 1:]:
+        if len(urls) >= PREFETCH_AHEAD:
+            break
+        if case.assignment_id in processed_ids:
+            continue
+        path = case.current_image_path()
+        img = load_display_image(path, max_height=TARGET_IMAGE_MAX_HEIGHT) if path else None
+        if img is not None:
+            urls.append(get_static_publisher().url_for_bytes(img))
+    if urls:
+        tags = "".join(f'<img src="{html.escape(u)}" alt="" loading="eager">' for u in urls)
+        st.markdown(f'<div style="display:none">{tags}</div>', unsafe_allow_html=True)
+
+
+def render_image_cache_stats():
+    stats = get_image_cache().stats()
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / lookups if lookups else 0.0
+    with st.sidebar.expander(b("코디네이터: 이미지 캐시", "Coordinator: image cache"), expanded=False):
+        st.caption(
+            f"{stats['entries']} entries · {stats['bytes'] / 1e6:.1f} / {stats['max_bytes'] / 1e6:.0f} MB\n\n"
+            f"hit {stats['hits']} · miss {stats['misses']} · evict {stats['evictions']} · hit rate {hit_rate:.0%}"
+        )
+
+
+def render_sheets_quota_stats():
+    stats = get_sheets_gateway().stats()
+    emulator = emulator_settings(st.secrets)
+    with st.sidebar.expander(b("코디네이터: Google Sheets quota", "Coordinator: Google Sheets quota"), expanded=False):
+        if emulator is not None:
+            # local emulator(sheets_emulator.py)에 저장 중이면 실제 Sheet로 착각하지 않도록 표시합니다.
+            st.warning(b("Sheets emulator 사용 중 (Google Sheet 아님)", "Using the Sheets emulator, not Google Sheets") + f": {emulator.path}")
+        st.caption(
+            f"last minute: read {stats['reads_last_minute']}/{stats['read_limit']} · write {stats['writes_last_minute']}/{stats['write_limit']}\n\n"
+            f"requests: read {stats['read_requests']} · write {stats['write_requests']} · coalesced reads {stats['coalesced_reads']}\n\n"
+            f"retries {stats['retries']} (429: {stats['rate_limited']}) · throttled {stats['read_throttled'] + stats['write_throttled']} · "
+            f"errors {stats['read_errors'] + stats['write_errors']}\n\n"
+            f"deferred {stats['deferred_rows']} · flushed {stats['deferred_flushed']} · pending {stats['pending_rows']} · dropped {stats['deferred_dropped']}"
+        )
 
 
 def artifact_radio(artifact: dict, case_key: str):
@@ -494,10 +846,62 @@ def artifact_radio(artifact: dict, case_key: str):
         return ""
     return CHOICE_LABEL_TO_VALUE[label]
 
+# =========================================================
+# Warm-up
+# =========================================================
+def _warm_manifests():
+    worklists, path = get_worklists()
+    sizes = {r: len(worklists.get(r, ())) for r in READER_OPTIONS}
+    unresolved = sum(1 for cases in worklists.values() for c in cases if not c.image_path)
+    not_100 = [r for r, n in sizes.items() if n != 100]
+    detail = f"{path}: {sum(sizes.values())} cases, {unresolved} unresolved images"
+    return detail + (f", readers without 100 cases: {not_100}" if not_100 else "")
+
+
+@st.cache_resource
+def start_warmup():
+    """
+    process당 한 번, background thread에서 manifest/path index, Google 인증, reader별 현재+다음 case 이미지를
+    미리 준비합니다. 첫 session(동의 화면 포함)이 트리거하고, scripts/serve_app.py는 boot 직후 이를 호출합니다.
+    """
+    processed = {}
+
+    def warm_sheets():
+        titles = existing_worksheet_titles() or set()
+        connected = 0
+        for reader_id in READER_OPTIONS:
+            exists = READER_CONFIG[reader_id]["worksheet_name"] in titles
+            sheet = get_google_sheet(reader_id) if exists else None
+            connected += sheet is not None
+            processed[reader_id] = load_processed_assignment_ids(sheet, reader_id)
+        return f"{connected}/{len(READER_OPTIONS)} sheets connected, {sum(map(len, processed.values()))} saved cases"
+
+    def warm_images():
+        worklists, _ = get_worklists()
+        decoded = 0
+        for reader_id in READER_OPTIONS:
+            done = processed.get(reader_id, set())
+            pending = [c for c in worklists.get(reader_id, ()) if c.assignment_id not in done]
+            for case in pending[:WARMUP_CASES_PER_READER]:
+                path = case.current_image_path()
+                img = load_display_image(path, max_height=TARGET_IMAGE_MAX_HEIGHT) if path else None
+                if img is not None:
+                    decoded += 1
+                    if IMAGE_URL_BASE:
+                        get_static_publisher().url_for_bytes(img)
+        return f"{decoded} images decoded"
+
+    runner = WarmupRunner([("manifests", _warm_manifests), ("sheets", warm_sheets), ("images", warm_images)]).start()
+    if HEALTH_PORT:
+        start_health_server(int(HEALTH_PORT), runner, host=HEALTH_HOST, extras={"sheets": get_sheets_gateway().stats})
+    return runner
+
+
 # =========================================================
 # Main
 # =========================================================
 def main():
+    start_warmup()
     st.title(b("외부 합성 CXR Artifact Checklist 설문", "External Synthetic CXR Artifact Checklist Survey"))
     st.caption(
         b(
@@ -514,7 +918,14 @@ def main():
         format_func=lambda x: f"{READER_CONFIG[x]['display_name']}",
     )
 
+    if "session_token" not in st.session_state:
+        st.session_state["session_token"] = uuid.uuid4().hex
+    session_token = st.session_state["session_token"]
+    registry = get_submission_registry()
+
     if st.session_state.get("active_reader_id") != reader_id:
+        if st.session_state.get("active_reader_id"):
+            release_reader_lease(registry, st.session_state["active_reader_id"], session_token)
         st.session_state["active_reader_id"] = reader_id
         st.session_state["timer_assignment_id"] = None
         st.session_state["case_start_time"] = time.time()
@@ -525,6 +936,18 @@ def main():
         st.warning(b("설문을 진행하려면 동의 체크가 필요합니다.", "Please check consent to proceed."))
         st.stop()
 
+    if not acquire_reader_lease(registry, reader_id, session_token):
+        st.warning(
+            b(
+                "이 평가자 코드는 다른 탭/세션에서 진행 중입니다. 중복 저장을 막기 위해 한 곳에서만 진행해주세요.",
+                "This reader ID is active in another tab/session. Please continue in only one place to avoid duplicate saves.",
+            )
+        )
+        if st.button(b("이 탭에서 이어서 진행", "Continue in this tab")):
+            acquire_reader_lease(registry, reader_id, session_token, force=True)
+            st.rerun()
+        st.stop()
+
     st.sidebar.divider()
     st.sidebar.markdown("**" + b("평가 원칙", "Rating Principles") + "**")
     st.sidebar.markdown("- " + b("generator, prompt, 병명, 나이, 성별, cross-validation 여부는 화면에서 블라인드 처리됩니다.", "Generator, prompt, disease, age, sex, and cross-validation role are blinded on screen."))
@@ -532,13 +955,12 @@ def main():
     st.sidebar.markdown("- " + b("각 항목은 반드시 X/O/N/A 중 하나를 선택해주세요.", "For each artifact, select exactly one of X/O/N/A."))
 
     try:
-        all_rows, assignment_path = load_assignment()
+        worklists, assignment_path = get_worklists()
     except Exception as e:
         st.error(b("assignment manifest 로딩 실패", "Assignment manifest loading failed") + f": {e}")
         st.stop()
 
-    assigned_cases = [r for r in all_rows if r.get("reader_id") == reader_id]
-    assigned_cases = sorted(assigned_cases, key=lambda x: int(x["reader_sequence"]))
+    assigned_cases = worklists.get(reader_id, ())
     total_cases = len(assigned_cases)
     if total_cases != 100:
         st.sidebar.warning(b("이 평가자의 케이스 수가 100장이 아닙니다", "This reader does not have exactly 100 cases") + f": {total_cases}")
@@ -549,15 +971,17 @@ def main():
     if sheet:
         ensure_sheet_header(sheet)
         st.sidebar.caption(b("Google Sheet 연결됨", "Google Sheet connected") + f": {SHEET_NAME}/{READER_CONFIG[reader_id]['worksheet_name']}")
-        st.sidebar.caption(b("주의: Sheet에는 hidden metadata가 저장됩니다. 평가자와 공유하지 마세요.", "Note: Sheet stores hidden metadata. Do not share it with readers."))
+        if RESULT_STORAGE_MODE == "full":
+            st.sidebar.caption(b("주의: Sheet에는 hidden metadata가 저장됩니다. 평가자와 공유하지 마세요.", "Note: Sheet stores hidden metadata. Do not share it with readers."))
     else:
-        st.sidebar.warning(b("Google Sheet 미연결: local CSV로 저장합니다.", "Google Sheet not connected: saving to local CSV."))
-        st.sidebar.caption(local_result_path(reader_id))
+        st.sidebar.warning(b("Google Sheet 미연결: local journal로 저장합니다.", "Google Sheet not connected: saving to local journal."))
+        st.sidebar.caption(local_journal_path(reader_id))
 
     processed_ids = load_processed_assignment_ids(sheet, reader_id)
+    seed_submission_tokens(registry, reader_id, processed_ids)
     start_index = total_cases
     for i, c in enumerate(assigned_cases):
-        if c["assignment_id"] not in processed_ids:
+        if c.assignment_id not in processed_ids:
             start_index = i
             break
     st.session_state["current_index"] = start_index
@@ -569,9 +993,9 @@ def main():
 
     current_idx = st.session_state["current_index"]
     case = assigned_cases[current_idx]
-    assignment_id = case["assignment_id"]
-    case_hash = case.get("case_hash") or hashlib.sha1(assignment_id.encode()).hexdigest()[:10]
-    image_path = resolve_image_path(case)
+    assignment_id = case.assignment_id
+    case_hash = case.case_hash
+    image_path = case.current_image_path()
 
     if st.session_state.get("timer_assignment_id") != assignment_id:
         st.session_state["timer_assignment_id"] = assignment_id
@@ -582,12 +1006,12 @@ def main():
     with col_p1:
         st.caption(b("진행", "Progress") + f": **{current_idx + 1} / {total_cases}**")
     with col_p2:
-        st.caption(b("블라인드 이미지 ID", "Blinded image ID") + f": `{case['blinded_image_id']}`")
+        st.caption(b("블라인드 이미지 ID", "Blinded image ID") + f": `{case.blinded_image_id}`")
     with col_p3:
         st.caption(f"Case ID: `{case_hash}`")
     st.divider()
 
-    if not image_path or not os.path.exists(image_path):
+    if not image_path or not image_pack.exists(image_path):
         st.error(
             b(
                 "이미지 파일을 찾지 못했습니다. image_root와 gpt/gemini/roentgen/sana 폴더 위치를 확인해주세요.",
@@ -597,27 +1021,52 @@ def main():
         )
         st.stop()
 
-    col_left, col_right = st.columns([1.05, 0.95], gap="large")
-
-    with col_left:
-        st.subheader(b("평가 대상 이미지", "Target Image"))
-        img = resize_image_pil(image_path, max_height=1050)
-        if img is not None:
-            st.image(img, use_container_width=True)
-        else:
-            st.image(image_path, use_container_width=True)
-        st.caption(b("화면에는 generator/prompt/병명/나이/성별/cross-validation 여부가 표시되지 않습니다.", "Generator/prompt/disease/age/sex/cross-validation role are intentionally not shown."))
-
-    with col_right:
-        st.subheader(b("Artifact checklist", "Artifact checklist"))
-        qa_box = st.container(height=790, border=True)
-        with qa_box:
-            with st.form(key=f"form_{reader_id}_{assignment_id}"):
+    viewer_value = None
+    # viewer component 값이 "저장하고 다음으로"와 함께 전달되도록 두 column을 모두 form 안에 둡니다.
+    with st.form(key=f"form_{reader_id}_{assignment_id}", border=False):
+        col_left, col_right = st.columns([1.05, 0.95], gap="large")
+
+        with col_left:
+            st.subheader(b("평가 대상 이미지", "Target Image"))
+            img = load_display_image(image_path, max_height=TARGET_IMAGE_MAX_HEIGHT)
+            if img is not None and IMAGE_VIEWER:
+                src = get_static_publisher().url_for_bytes(img) if IMAGE_URL_BASE else png_data_uri(img)
+                viewer_value = cxr_viewer(src, key=f"viewer_{assignment_id}", max_height=TARGET_IMAGE_MAX_HEIGHT)
+                st.caption(b(
+                    "드래그: window/level · 휠: 확대 · Shift+드래그: 이동 · 더블클릭: 초기화",
+                    "Drag: window/level · Wheel: zoom · Shift+drag: pan · Double click: reset",
+                ))
+            elif img is not None and IMAGE_URL_BASE:
+                st.image(get_static_publisher().url_for_bytes(img), use_container_width=True)
+            elif img is not None:
+                st.image(img, use_container_width=True)
+            else:
+                st.image(image_pack.read_source(image_path), use_container_width=True)
+            render_image_cache_stats()
+            if sheet:
+                render_sheets_quota_stats()
+            st.caption(b("화면에는 generator/prompt/병명/나이/성별/cross-validation 여부가 표시되지 않습니다.", "Generator/prompt/disease/age/sex/cross-validation role are intentionally not shown."))
+
+        with col_right:
+            st.subheader(b("Artifact checklist", "Artifact checklist"))
+            qa_box = st.container(height=790, border=True)
+            with qa_box:
                 st.caption(b("각 artifact 항목에 대해 X/O/N/A만 선택해주세요.", "For each artifact, select X/O/N/A only."))
-                artifact_values = {}
-                for art in ARTIFACTS:
-                    artifact_values[art["key"]] = artifact_radio(art, assignment_id)
-                    st.markdown("")
+                if RAPID_RATING:
+                    artifact_values = rapid_rating(
+                        [{"key": a["key"], "label": b(a["ko"], a["en"]), "description": b(a["desc_ko"], a["desc_en"])} for a in ARTIFACTS],
+                        {v: label for label, v in CHOICE_LABEL_TO_VALUE.items()},
+                        case_key=assignment_id,
+                        help_text=b(
+                            "목록을 클릭한 뒤 1–8/↑↓: 항목 선택 · x/o/n: 선택 후 다음 항목 · a: 남은 항목 모두 X · Backspace: 지우기",
+                            "Click the list, then 1–8/↑↓: select item · x/o/n: answer and advance · a: mark remaining X · Backspace: clear",
+                        ),
+                    )
+                else:
+                    artifact_values = {}
+                    for art in ARTIFACTS:
+                        artifact_values[art["key"]] = artifact_radio(art, assignment_id)
+                        st.markdown("")
 
                 st.markdown("---")
                 confirm_all_checked = st.checkbox(
@@ -626,6 +1075,10 @@ def main():
                 )
                 submit = st.form_submit_button(b("저장하고 다음으로", "Save & Next"), type="primary", use_container_width=True)
 
+    with col_right:
+        if not submit:
+            render_prefetch_hints(assigned_cases, current_idx, processed_ids)
+
         if submit:
             errors = []
             for art in ARTIFACTS:
@@ -646,27 +1099,55 @@ def main():
                     APP_VERSION,
                     reader_id,
                     assignment_id,
-                    str(case["reader_sequence"]),
-                    case["blinded_image_id"],
-                    case["blinded_filename"],
+                    str(case.reader_sequence),
+                    case.blinded_image_id,
+                    case.blinded_filename,
                     case_hash,
                 ]
-                row += build_source_metadata(case)
+                row += list(case.source_metadata)
                 row += [artifact_values[a["key"]] for a in ARTIFACTS]
                 row += [f"{elapsed:.2f}"]
+                if IMAGE_VIEWER:
+                    row += [telemetry_json(viewer_value)]
+                if RESULT_STORAGE_MODE == "compact":
+                    record = dict(zip(SHEET_HEADERS, row))
+                    row = [record[h] for h in RESULT_HEADERS]
+
+                if not acquire_reader_lease(registry, reader_id, session_token):
+                    st.error(
+                        b(
+                            "다른 탭/세션이 이 평가자 코드를 넘겨받아 저장하지 않았습니다. 새로고침해주세요.",
+                            "Another tab/session took over this reader ID; nothing was saved. Please reload.",
+                        )
+                    )
+                    st.stop()
+                token = submission_token(reader_id, assignment_id)
+                if not reserve_submission(registry, token):
+                    st.toast(b("이미 저장된 케이스입니다.", "This case was already saved."))
+                    st.rerun()
 
                 saved_to_sheet = False
+                sheet_failed = False
                 if sheet:
                     try:
-                        sheet.append_row(row)
-                        saved_to_sheet = True
+                        # quota가 모자라면 row를 process queue에 두고 나중에 보냅니다 (local journal에는 아래에서 바로 저장).
+                        saved_to_sheet = sheet.append_row_or_defer(row, tag=assignment_id)
                     except Exception as e:
-                        st.error(b("Google Sheet 저장 중 오류. local CSV에도 저장합니다.", "Google Sheet save failed. Saving to local CSV as backup.") + f": {e}")
-                append_local_result(reader_id, row)
+                        sheet_failed = True
+                        st.error(b("Google Sheet 저장 중 오류. local journal에도 저장합니다.", "Google Sheet save failed. Saving to local journal as backup.") + f": {e}")
+                try:
+                    append_local_result(reader_id, row, token)
+                except Exception as e:
+                    if not saved_to_sheet:
+                        release_submission(registry, token)
+                    st.error(b("local journal 저장 중 오류", "Local journal save failed") + f": {e}")
+                    st.stop()
                 if saved_to_sheet:
                     st.toast(b("✅ 저장 완료", "✅ Saved") + f" ({current_idx + 1}/{total_cases})")
+                elif sheet and not sheet_failed:
+                    st.toast(b("✅ 저장 완료 (Google Sheet에는 잠시 후 전송)", "✅ Saved (sent to Google Sheet shortly)") + f" ({current_idx + 1}/{total_cases})")
                 else:
-                    st.toast(b("✅ local CSV 저장 완료", "✅ Saved to local CSV") + f" ({current_idx + 1}/{total_cases})")
+                    st.toast(b("✅ local journal 저장 완료", "✅ Saved to local journal") + f" ({current_idx + 1}/{total_cases})")
                 st.rerun()
 
 
@@ -3,10 +3,11 @@ import os
 import time
 import random
 import hashlib
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
-from PIL import Image
+from image_cache import ImageByteCache
+from image_normalize import normalized_path
+from sheets_client import QuotaExhausted, SheetsGateway, sheets_backend
+from static_images import StaticImagePublisher
 
 # =========================================================
 # Bilingual helper (Korean / English)
@@ -53,6 +54,12 @@ ENABLE_ANCHOR_SET = False
 
 # Example images folder for artifact guidance
 EXAMPLE_IMAGES_DIR = "images"
+IMAGE_CACHE_MAX_MB = 64
+# scripts/normalize_images.py 출력 폴더(normalized/<version>). 설정되어 있으면 화면에는 정규화된 이미지를 표시합니다.
+NORMALIZED_IMAGE_DIR = os.environ.get("M2SMF_NORMALIZED_DIR", "")
+# static_images.py로 이미지를 content-hash URL로 보내 browser cache를 씁니다. "/app/static/img"(Streamlit static serving)
+# 또는 scripts/serve_static_images.py 주소(http://host:8601). 비어 있으면 기존처럼 st.image에 bytes/경로를 넘깁니다.
+IMAGE_URL_BASE = os.environ.get("M2SMF_IMAGE_URL_BASE", "")
 
 # Streamlit page
 st.set_page_config(
@@ -88,6 +95,12 @@ SHEET_HEADERS = [
     "time_spent_sec",
 ]
 
+@st.cache_resource
+def get_sheets_gateway():
+    # process당 하나: 모든 session이 분당 read/write 예산과 동일 read 합치기, 못 보낸 row queue를 공유합니다.
+    return SheetsGateway()
+
+
 def get_google_sheet(rater_id: str):
     """
     rater_id별 워크시트(탭)에 기록.
@@ -98,21 +111,21 @@ def get_google_sheet(rater_id: str):
             "https://www.googleapis.com/auth/spreadsheets",
             "https://www.googleapis.com/auth/drive"
         ]
-        if "gcp_service_account" not in st.secrets:
+        # gspread/oauth2client는 credentials가 있을 때만 import합니다 (cold start 단축).
+        # M2SMF_SHEETS_EMULATOR 또는 [sheets_emulator] secret이 있으면 local emulator(sheets_emulator.py)를 씁니다.
+        backend = sheets_backend(st.secrets, scope)
+        if backend is None:
             return None
+        authorize, worksheet_not_found = backend
 
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-
-        sh = client.open(SHEET_NAME)
+        def open_worksheet():
+            sh = authorize().open(SHEET_NAME)
+            try:
+                return sh.worksheet(rater_id)
+            except worksheet_not_found:
+                return sh.add_worksheet(title=rater_id, rows=2000, cols=len(SHEET_HEADERS))
 
-        try:
-            ws = sh.worksheet(rater_id)
-        except gspread.exceptions.WorksheetNotFound:
-            ws = sh.add_worksheet(title=rater_id, rows=2000, cols=len(SHEET_HEADERS))
-
-        return ws
+        return get_sheets_gateway().worksheet((SHEET_NAME, rater_id), open_worksheet)
     except Exception as e:
         st.sidebar.error(b("Google Sheet 연결 실패", "Google Sheet connection failed") + f": {e}")
         return None
@@ -139,7 +152,6 @@ def load_processed_image_ids(sheet, rater_id: str):
     processed = set()
     if not sheet:
         return processed
-
     try:
         rows = sheet.get_all_values()
         if len(rows) <= 1:
@@ -164,7 +176,6 @@ def load_processed_image_ids(sheet, rater_id: str):
 # =========================================================
 # Image Loading
 # =========================================================
-@st.cache_data
 def load_image_paths(target_folders):
     image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}
     image_paths = []
@@ -212,16 +223,20 @@ def get_example_image_path(question_key):
     return None
 
 
-@st.cache_data(ttl=3600)
+@st.cache_resource
+def get_static_publisher():
+    return StaticImagePublisher(IMAGE_URL_BASE)
+
+
+@st.cache_resource
+def get_image_cache():
+    # 모든 session이 공유하는 PNG byte cache (LRU, IMAGE_CACHE_MAX_MB 상한).
+    return ImageByteCache(max_bytes=IMAGE_CACHE_MAX_MB * 1024 * 1024)
+
+
 def resize_image_pil(image_path, target_height):
-    try:
-        img = Image.open(image_path)
-        aspect_ratio = img.width / img.height
-        new_width = int(target_height * aspect_ratio)
-        resized_img = img.resize((new_width, target_height), Image.LANCZOS)
-        return resized_img
-    except Exception:
-        return None
+    # Example thumbnail은 색/alpha를 유지하고 target_height에 맞춰 확대/축소합니다.
+    return get_image_cache().get(image_path, target_height, upscale=True, grayscale=False)
 
 
 # =========================================================
@@ -264,6 +279,72 @@ def build_case_list_for_rater(hq_paths, lq_paths, rater_id: str):
     return cases
 
 
+def display_image_path(image_path: str) -> str:
+    # image_id/결과 저장은 원본 경로 기준 그대로, 화면 표시만 정규화된 이미지로 바꿉니다.
+    if NORMALIZED_IMAGE_DIR:
+        candidate = normalized_path(NORMALIZED_IMAGE_DIR, make_image_id(image_path))
+        if os.path.exists(candidate):
+            return candidate
+    return image_path
+
+
+class CaseRecord:
+    """Worklist 한 줄. image_id/case_hash를 rerun마다 다시 계산하지 않도록 미리 담아둡니다."""
+
+    __slots__ = ("path", "source_quality", "image_id", "case_hash")
+
+    def __init__(self, path: str, source_quality: str):
+        self.path = path
+        self.source_quality = source_quality
+        self.image_id = make_image_id(path)
+        self.case_hash = hash_case(self.image_id)
+
+
+def ensure_rater_folders(rater_id: str):
+    cfg = RATER_CONFIG[rater_id]
+    for folder in cfg["hq_folders"] + cfg["lq_folders"] + [EXAMPLE_IMAGES_DIR]:
+        os.makedirs(folder, exist_ok=True)
+
+
+def folders_signature(folders):
+    """
+    폴더와 모든 하위 폴더의 (경로, mtime) 목록. 어느 단계에서든 파일이 추가/삭제되면 바뀌므로
+    worklist 재컴파일 key로 사용합니다 (load_image_paths도 하위 폴더까지 walk합니다).
+    """
+    signature = []
+    for folder in folders:
+        try:
+            signature.append((folder, os.stat(folder).st_mtime_ns))
+        except OSError:
+            signature.append((folder, None))
+            continue
+        for root, dirs, _ in os.walk(folder):
+            dirs.sort()
+            for d in dirs:
+                path = os.path.join(root, d)
+                try:
+                    signature.append((path, os.stat(path).st_mtime_ns))
+                except OSError:
+                    signature.append((path, None))
+    return tuple(signature)
+
+
+@st.cache_resource(max_entries=8)
+def compile_rater_worklist(rater_id: str, signature: tuple):
+    """
+    평가자 폴더 walk + 섞기를 process당 한 번만 수행합니다.
+    signature(folders_signature)가 cache key이므로 폴더 내용이 바뀌면 다시 컴파일됩니다.
+    """
+    cfg = RATER_CONFIG[rater_id]
+    hq_paths = load_image_paths(cfg["hq_folders"])
+    lq_paths = load_image_paths(cfg["lq_folders"])
+    if len(hq_paths) == 0 and len(lq_paths) == 0:
+        return ()
+
+    cases = build_case_list_for_rater(hq_paths, lq_paths, rater_id)
+    return tuple(CaseRecord(c["path"], c["source_quality"]) for c in cases)
+
+
 # =========================================================
 # UI Helpers
 # =========================================================
@@ -358,17 +439,16 @@ def main():
     st.sidebar.markdown("- " + b("이미지 출처(HQ/LQ)는 표시되지 않습니다(블라인드).",
                                  "The source (HQ/LQ) is hidden (blinded)."))
 
-    # Load only this rater's folders
-    hq_folders = cfg["hq_folders"]
-    lq_folders = cfg["lq_folders"]
-
-    for folder in hq_folders + lq_folders + [EXAMPLE_IMAGES_DIR]:
-        os.makedirs(folder, exist_ok=True)
-
-    hq_paths = load_image_paths(hq_folders)
-    lq_paths = load_image_paths(lq_folders)
+    # Load only this rater's folders (compiled once per process)
+    try:
+        # signature는 폴더를 만든 뒤에 계산해야 첫 rerun에서 다시 컴파일되지 않습니다.
+        ensure_rater_folders(rater_id)
+        assigned_cases = compile_rater_worklist(rater_id, folders_signature(cfg["hq_folders"] + cfg["lq_folders"]))
+    except Exception as e:
+        st.error(b("케이스 할당 실패", "Case assignment failed") + f": {e}")
+        st.stop()
 
-    if len(hq_paths) == 0 and len(lq_paths) == 0:
+    if len(assigned_cases) == 0:
         st.error(
             b(
                 "지정된 평가자 폴더에 이미지가 없습니다. 폴더 경로를 확인해주세요.",
@@ -377,13 +457,6 @@ def main():
         )
         st.stop()
 
-    # Case assignment
-    try:
-        assigned_cases = build_case_list_for_rater(hq_paths, lq_paths, rater_id)
-    except Exception as e:
-        st.error(b("케이스 할당 실패", "Case assignment failed") + f": {e}")
-        st.stop()
-
     total_cases = len(assigned_cases)
 
     # Google Sheet
@@ -397,8 +470,7 @@ def main():
     # Find first unprocessed index
     start_index = total_cases
     for i, c in enumerate(assigned_cases):
-        img_id = make_image_id(c["path"])
-        if img_id not in processed_ids:
+        if c.image_id not in processed_ids:
             start_index = i
             break
 
@@ -418,9 +490,9 @@ def main():
     # Current case
     current_idx = st.session_state["current_index"]
     case = assigned_cases[current_idx]
-    image_path = case["path"]
-    image_id = make_image_id(image_path)
-    case_hash = hash_case(image_id)
+    image_path = case.path
+    image_id = case.image_id
+    case_hash = case.case_hash
 
     # Timer init
     if st.session_state.get("timer_case_idx") != current_idx:
@@ -440,7 +512,9 @@ def main():
 
     with col_left:
         st.subheader(b("평가 대상 이미지", "Target Image"))
-        st.image(image_path, use_container_width=True)
+        shown_path = display_image_path(image_path)
+        image_url = get_static_publisher().url_for_source(shown_path) if IMAGE_URL_BASE else None
+        st.image(image_url or shown_path, use_container_width=True)
 
     with col_right:
         st.subheader("📝 " + b("평가 입력 (QA 목적)", "Rating Form (QA purpose)"))
@@ -597,7 +671,7 @@ def main():
             else:
                 elapsed = max(0.0, time.time() - st.session_state.get("case_start_time", time.time()))
                 timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                source_quality = case["source_quality"]
+                source_quality = case.source_quality
 
                 row = [
                     timestamp,
@@ -624,11 +698,16 @@ def main():
 
                 if sheet:
                     try:
-                        sheet.append_row(row)
+                        # 이 앱은 local 사본이 없으므로 queue에 미루지 않습니다 (defer=False): 실패하면 다시 제출하게 합니다.
+                        sheet.append_row_or_defer(row, tag=image_id, defer=False)
                         st.toast(b("✅ 저장 완료", "✅ Saved") + f" (Case {current_idx + 1}/{total_cases})")
                         st.rerun()
+                    except QuotaExhausted:
+                        st.error(b("Google Sheet 요청 한도 초과로 저장하지 못했습니다. 잠시 후 다시 저장해주세요.",
+                                   "Not saved: Google Sheet request limit reached. Please submit again in a moment."))
                     except Exception as e:
-                        st.error(b("구글 시트 저장 중 오류", "Error while saving to Google Sheet") + f": {e}")
+                        st.error(b("구글 시트 저장 중 오류. 저장되지 않았으니 다시 저장해주세요.",
+                                   "Error while saving to Google Sheet. Nothing was saved; please submit again.") + f": {e}")
                 else:
                     st.warning(b("⚠️ 구글 시트가 연결되지 않았습니다(테스트 모드).",
                                  "⚠️ Google Sheet not connected (test mode)."))
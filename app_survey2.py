@@ -5,10 +5,12 @@ import time
 import random
 import hashlib
 import csv
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 from datetime import datetime
-from PIL import Image
+import image_pack
+from image_cache import ImageByteCache
+from image_normalize import normalized_path
+from sheets_client import QuotaExhausted, SheetsGateway, sheets_backend
+from static_images import StaticImagePublisher
 
 # =========================================================
 # Bilingual helper (Korean / English)
@@ -37,7 +39,15 @@ RATER_CONFIG = {
 RATER_OPTIONS = list(RATER_CONFIG.keys())
 
 EXAMPLE_IMAGES_DIR = "images"
+IMAGE_CACHE_MAX_MB = 64
 IMAGE_ROOT_CANDIDATES = [".", "/mnt/data"]
+# scripts/build_image_pack.py로 만든 image pack. 설정되어 있고 이미지가 pack에 있으면 pack URI로 읽습니다.
+IMAGE_PACK_PATH = os.environ.get("M2SMF_IMAGE_PACK", "")
+# scripts/normalize_images.py 출력 폴더(normalized/<version>). 설정되어 있으면 정규화된 이미지를 먼저 사용합니다.
+NORMALIZED_IMAGE_DIR = os.environ.get("M2SMF_NORMALIZED_DIR", "")
+# static_images.py로 이미지를 content-hash URL로 보내 browser cache를 씁니다. "/app/static/img"(Streamlit static serving)
+# 또는 scripts/serve_static_images.py 주소(http://host:8601). 비어 있으면 기존처럼 st.image에 bytes/경로를 넘깁니다.
+IMAGE_URL_BASE = os.environ.get("M2SMF_IMAGE_URL_BASE", "")
 
 # Streamlit page
 st.set_page_config(
@@ -80,6 +90,12 @@ SHEET_HEADERS = [
 ]
 
 
+@st.cache_resource
+def get_sheets_gateway():
+    # process당 하나: 모든 session이 분당 read/write 예산과 동일 read 합치기, 못 보낸 row queue를 공유합니다.
+    return SheetsGateway()
+
+
 def get_google_sheet(rater_id: str):
     """
     rater_id별 워크시트(탭)에 기록.
@@ -89,22 +105,22 @@ def get_google_sheet(rater_id: str):
             "https://www.googleapis.com/auth/spreadsheets",
             "https://www.googleapis.com/auth/drive"
         ]
-        if "gcp_service_account" not in st.secrets:
+        # gspread/oauth2client는 credentials가 있을 때만 import합니다 (cold start 단축).
+        # M2SMF_SHEETS_EMULATOR 또는 [sheets_emulator] secret이 있으면 local emulator(sheets_emulator.py)를 씁니다.
+        backend = sheets_backend(st.secrets, scope)
+        if backend is None:
             return None
-
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-
-        sh = client.open(SHEET_NAME)
+        authorize, worksheet_not_found = backend
         worksheet_name = RATER_CONFIG[rater_id]["worksheet_name"]
 
-        try:
-            ws = sh.worksheet(worksheet_name)
-        except gspread.exceptions.WorksheetNotFound:
-            ws = sh.add_worksheet(title=worksheet_name, rows=2000, cols=len(SHEET_HEADERS))
+        def open_worksheet():
+            sh = authorize().open(SHEET_NAME)
+            try:
+                return sh.worksheet(worksheet_name)
+            except worksheet_not_found:
+                return sh.add_worksheet(title=worksheet_name, rows=2000, cols=len(SHEET_HEADERS))
 
-        return ws
+        return get_sheets_gateway().worksheet((SHEET_NAME, worksheet_name), open_worksheet)
     except Exception as e:
         st.sidebar.error(b("Google Sheet 연결 실패", "Google Sheet connection failed") + f": {e}")
         return None
@@ -131,7 +147,6 @@ def load_processed_image_ids(sheet, rater_id: str):
     processed = set()
     if not sheet:
         return processed
-
     try:
         rows = sheet.get_all_values()
         if len(rows) <= 1:
@@ -174,6 +189,17 @@ def resolve_image_path(image_id: str) -> str:
     if not image_id:
         return image_id
 
+    if image_pack.is_pack_uri(image_id):
+        return image_id
+    if IMAGE_PACK_PATH and os.path.exists(IMAGE_PACK_PATH):
+        uri = image_pack.pack_uri(IMAGE_PACK_PATH, make_image_id(image_id))
+        if image_pack.exists(uri):
+            return uri
+    if NORMALIZED_IMAGE_DIR:
+        candidate = normalized_path(NORMALIZED_IMAGE_DIR, make_image_id(image_id))
+        if os.path.exists(candidate):
+            return candidate
+
     candidates = [image_id]
     for root in IMAGE_ROOT_CANDIDATES:
         candidates.append(os.path.join(root, image_id))
@@ -222,16 +248,20 @@ def get_example_image_path(question_key):
     return None
 
 
-@st.cache_data(ttl=3600)
+@st.cache_resource
+def get_static_publisher():
+    return StaticImagePublisher(IMAGE_URL_BASE)
+
+
+@st.cache_resource
+def get_image_cache():
+    # 모든 session이 공유하는 PNG byte cache (LRU, IMAGE_CACHE_MAX_MB 상한).
+    return ImageByteCache(max_bytes=IMAGE_CACHE_MAX_MB * 1024 * 1024)
+
+
 def resize_image_pil(image_path, target_height):
-    try:
-        img = Image.open(image_path)
-        aspect_ratio = img.width / img.height
-        new_width = int(target_height * aspect_ratio)
-        resized_img = img.resize((new_width, target_height), Image.LANCZOS)
-        return resized_img
-    except Exception:
-        return None
+    # Example thumbnail은 색/alpha를 유지하고 target_height에 맞춰 확대/축소합니다.
+    return get_image_cache().get(image_path, target_height, upscale=True, grayscale=False)
 
 
 def build_case_list_for_rater(rater_id: str):
@@ -420,7 +450,7 @@ def main():
         st.caption(f"Case ID: `{case_hash}`")
     st.divider()
 
-    if not os.path.exists(image_path):
+    if not image_pack.exists(image_path):
         st.error(
             b(
                 "이미지 파일을 찾지 못했습니다. manifest의 image_id 경로 또는 실행 위치를 확인해주세요.",
@@ -434,7 +464,8 @@ def main():
 
     with col_left:
         st.subheader(b("평가 대상 이미지", "Target Image"))
-        st.image(image_path, use_container_width=True)
+        image_url = get_static_publisher().url_for_source(image_path) if IMAGE_URL_BASE else None
+        st.image(image_url or image_pack.read_source(image_path), use_container_width=True)
 
     with col_right:
         st.subheader("📝 " + b("평가 입력 (QA 목적)", "Rating Form (QA purpose)"))
@@ -623,11 +654,16 @@ def main():
 
                 if sheet:
                     try:
-                        sheet.append_row(row)
+                        # 이 앱은 local 사본이 없으므로 queue에 미루지 않습니다 (defer=False): 실패하면 다시 제출하게 합니다.
+                        sheet.append_row_or_defer(row, tag=image_id, defer=False)
                         st.toast(b("✅ 저장 완료", "✅ Saved") + f" (Case {current_idx + 1}/{total_cases})")
                         st.rerun()
+                    except QuotaExhausted:
+                        st.error(b("Google Sheet 요청 한도 초과로 저장하지 못했습니다. 잠시 후 다시 저장해주세요.",
+                                   "Not saved: Google Sheet request limit reached. Please submit again in a moment."))
                     except Exception as e:
-                        st.error(b("구글 시트 저장 중 오류", "Error while saving to Google Sheet") + f": {e}")
+                        st.error(b("구글 시트 저장 중 오류. 저장되지 않았으니 다시 저장해주세요.",
+                                   "Error while saving to Google Sheet. Nothing was saved; please submit again.") + f": {e}")
                 else:
                     st.warning(b("⚠️ 구글 시트가 연결되지 않았습니다(테스트 모드).",
                                  "⚠️ Google Sheet not connected (test mode)."))
@@ -0,0 +1,93 @@
+"""
+Memory-bounded cache of encoded display images, shared by all sessions of a survey app.
+
+Streamlit's st.cache_data pickles a full PIL image per entry (about 3 MB for a 1024² RGB
+CXR) with no entry cap. This cache instead keeps PNG bytes, grayscale by default because
+every CXR in the study is effectively single-channel, and evicts least-recently-used
+entries once `max_bytes` is exceeded.
+
+Entries are keyed by path, file mtime/size (or the sha256 for image_pack URIs) and the
+requested size, so a replaced file is decoded again. Hit/miss/eviction counters are
+available through `stats()`.
+"""
+from __future__ import annotations
+
+import io
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import image_pack
+
+
+class ImageByteCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, image_path: str, height: int, upscale: bool = False, grayscale: bool = True) -> Optional[bytes]:
+        """
+        Return PNG bytes of the image (file path or pack URI) scaled to `height`
+        (only downscaled unless `upscale`), or None if it cannot be read or decoded.
+        """
+        fingerprint = image_pack.source_fingerprint(image_path)
+        if fingerprint is None:
+            return None
+        key = (image_path, fingerprint, height, upscale, grayscale)
+
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        # Decode outside the lock so one slow image does not block other sessions.
+        data = encode_display_png(image_path, height, upscale=upscale, grayscale=grayscale)
+        if data is None:
+            return None
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = data
+                self._bytes += len(data)
+            self._entries.move_to_end(key)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def encode_display_png(image_path: str, height: int, upscale: bool = False, grayscale: bool = True) -> Optional[bytes]:
+    from PIL import Image
+
+    try:
+        with image_pack.open_image(image_path) as img:
+            img = img.convert("L") if grayscale else img.copy()
+        if img.height > height or (upscale and img.height != height):
+            width = max(1, int(round(height * img.width / img.height)))
+            img = img.resize((width, height), Image.LANCZOS)
+        buf = io.BytesIO()
+        # compress_level=1: encode speed matters more than a few extra KB in memory.
+        img.save(buf, format="PNG", compress_level=1)
+        return buf.getvalue()
+    except Exception:
+        return None
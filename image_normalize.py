@@ -0,0 +1,153 @@
+"""
+Canonical image representation shared by the survey apps and the analysis scripts.
+
+The corpus mixes 1024² RGB PNGs (gpt, gemini, sana), 512² 3-channel JPEGs (roentgen sets)
+and 512² grayscale JPEGs (mimic_451). Normalization converts every image to:
+
+- single channel, 8 bit (16-bit sources are rescaled, not clipped),
+- `size` × `size`, longer side scaled to `size` with the given resampler, centered on black,
+- PNG without metadata.
+
+Output layout, one directory per spec version:
+
+    <output_dir>/<version>/spec.json
+    <output_dir>/<version>/provenance.csv      one row per normalized image
+    <output_dir>/<version>/<image_id stem>.png
+
+`normalized_path(version_dir, image_id)` is the single lookup used by the apps, so a
+manifest entry such as roentgen/P006.png finds the output of roentgen/P006.jpg.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+import os
+from typing import TYPE_CHECKING, Dict, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# numpy and PIL are imported inside the functions that decode images: the apps import this
+# module only for normalized_path and should not pay for them at start-up.
+NORMALIZATION_VERSION = "v1"
+# Resampler name -> PIL.Image filter attribute.
+RESAMPLERS = {
+    "lanczos": "LANCZOS",
+    "bicubic": "BICUBIC",
+    "bilinear": "BILINEAR",
+    "area": "BOX",
+    "nearest": "NEAREST",
+}
+PROVENANCE_FILE = "provenance.csv"
+PROVENANCE_HEADERS = [
+    "image_id", "source_path", "source_mtime_ns", "source_size", "source_sha256",
+    "source_format", "source_mode", "source_width", "source_height",
+    "output_relpath", "output_sha256", "scale", "pad_left", "pad_top",
+]
+
+
+class NormalizationSpec(NamedTuple):
+    size: int = 1024
+    resampler: str = "lanczos"
+    compress_level: int = 6
+
+    @property
+    def version(self) -> str:
+        return f"{NORMALIZATION_VERSION}-{self.size}-{self.resampler}-L8-png"
+
+
+def normalized_path(version_dir: str, image_id: str) -> str:
+    stem = os.path.splitext(image_id.replace("\\", "/").lstrip("/"))[0]
+    return os.path.join(version_dir, stem + ".png")
+
+
+def _to_8bit_gray(img: Image.Image) -> Image.Image:
+    import numpy as np
+    from PIL import Image
+
+    if img.mode in ("I", "I;16", "I;16B", "I;16L", "F"):
+        arr = np.asarray(img, dtype=np.float32)
+        lo, hi = float(arr.min()), float(arr.max())
+        arr = (arr - lo) * (255.0 / (hi - lo)) if hi > lo else np.zeros_like(arr)
+        return Image.fromarray(np.clip(arr + 0.5, 0, 255).astype(np.uint8), mode="L")
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        # Composite on black so transparent padding matches the canvas.
+        rgba = img.convert("RGBA")
+        canvas = Image.new("RGBA", rgba.size, (0, 0, 0, 255))
+        img = Image.alpha_composite(canvas, rgba)
+    return img.convert("L")
+
+
+def normalize_image(source_path: str, spec: NormalizationSpec):
+    """Return (png_bytes, details) for one source file."""
+    from PIL import Image
+
+    with open(source_path, "rb") as f:
+        data = f.read()
+    with Image.open(io.BytesIO(data)) as img:
+        details = {
+            "source_sha256": hashlib.sha256(data).hexdigest(),
+            "source_format": (img.format or "").lower(),
+            "source_mode": img.mode,
+            "source_width": img.width,
+            "source_height": img.height,
+        }
+        gray = _to_8bit_gray(img)
+
+    scale = spec.size / max(gray.width, gray.height)
+    width = max(1, int(round(gray.width * scale)))
+    height = max(1, int(round(gray.height * scale)))
+    if (width, height) != gray.size:
+        gray = gray.resize((width, height), getattr(Image, RESAMPLERS[spec.resampler]))
+    canvas = gray
+    pad_left = pad_top = 0
+    if (width, height) != (spec.size, spec.size):
+        canvas = Image.new("L", (spec.size, spec.size), 0)
+        pad_left, pad_top = (spec.size - width) // 2, (spec.size - height) // 2
+        canvas.paste(gray, (pad_left, pad_top))
+
+    buf = io.BytesIO()
+    canvas.save(buf, format="PNG", compress_level=spec.compress_level)
+    png = buf.getvalue()
+    details.update({
+        "output_sha256": hashlib.sha256(png).hexdigest(),
+        "scale": f"{scale:.6f}",
+        "pad_left": pad_left,
+        "pad_top": pad_top,
+    })
+    return png, details
+
+
+def write_spec(version_dir: str, spec: NormalizationSpec):
+    os.makedirs(version_dir, exist_ok=True)
+    path = os.path.join(version_dir, "spec.json")
+    payload = {"version": spec.version, **spec._asdict()}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+        if existing != payload:
+            raise RuntimeError(f"{path} was written with a different spec: {existing}")
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+
+
+def read_provenance(version_dir: str) -> Dict[str, dict]:
+    """image_id -> provenance row; later rows win, so a re-normalized image replaces its old row."""
+    path = os.path.join(version_dir, PROVENANCE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        # A row torn by a crash is missing trailing fields (None) and is treated as not done.
+        return {row["image_id"]: row for row in csv.DictReader(f) if row.get("pad_top") not in (None, "")}
+
+
+def is_current(row: Optional[dict], version_dir: str, mtime_ns: int, size: int) -> bool:
+    """True if a provenance row matches the source stat and its output file still exists."""
+    if row is None:
+        return False
+    if (str(mtime_ns), str(size)) != (row.get("source_mtime_ns"), row.get("source_size")):
+        return False
+    return os.path.exists(os.path.join(version_dir, row["output_relpath"]))
@@ -0,0 +1,273 @@
+"""
+Packed image archive: one data file plus a sorted offset index, read through mmap.
+
+    <name>.pack      encoded image files (PNG/JPEG bytes as on disk), concatenated
+    <name>.pack.idx  header line with the pack size, then tab-separated rows sorted by image_id:
+                     image_id, offset, length, sha256, width, height, format
+
+image_id is the forward-slash relative path used in the manifests (e.g. "gpt/P010.png").
+An image inside a pack is addressed by a pack URI:
+
+    pack://<path to .pack>#<image_id>
+
+`open_image`, `read_source`, `exists` and `source_fingerprint` accept either a pack URI
+or a plain file path, so the app loaders can take both. `ImagePack.read` returns a
+zero-copy memoryview into the mapped file.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import mmap
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+PACK_URI_PREFIX = "pack://"
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = "#m2smf-image-pack v1"
+REOPEN_RETRY_SECONDS = 0.05
+
+
+class PackEntry(NamedTuple):
+    image_id: str
+    offset: int
+    length: int
+    sha256: str
+    width: int
+    height: int
+    format: str
+
+
+def pack_uri(pack_path: str, image_id: str) -> str:
+    return f"{PACK_URI_PREFIX}{pack_path}#{image_id}"
+
+
+def is_pack_uri(path) -> bool:
+    return isinstance(path, str) and path.startswith(PACK_URI_PREFIX)
+
+
+def parse_pack_uri(uri: str) -> Tuple[str, str]:
+    pack_path, sep, image_id = uri[len(PACK_URI_PREFIX):].partition("#")
+    if not sep or not image_id:
+        raise ValueError(f"Invalid pack URI: {uri!r}")
+    return pack_path, image_id
+
+
+class _SliceReader(io.RawIOBase):
+    """Seekable read-only file object over a memoryview, so PIL decodes straight from the mmap."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buf):
+        n = min(len(buf), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        buf[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+class ImagePack:
+    def __init__(self, pack_path: str):
+        self.pack_path = pack_path
+        self.entries: Dict[str, PackEntry] = {}
+        with open(pack_path + INDEX_SUFFIX, "r", encoding="utf-8") as f:
+            magic, _, total = f.readline().rstrip("\n").partition("\t")
+            if magic != INDEX_MAGIC:
+                raise RuntimeError(f"{pack_path}{INDEX_SUFFIX} is not an image pack index (header {magic!r}).")
+            for line in f:
+                image_id, offset, length, sha256, width, height, fmt = line.rstrip("\n").split("\t")
+                self.entries[image_id] = PackEntry(image_id, int(offset), int(length), sha256, int(width), int(height), fmt)
+        self._file = open(pack_path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size != int(total or 0):
+            self._file.close()
+            raise RuntimeError(f"{pack_path} is {size} bytes but its index expects {total}; rebuild the pack.")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b"")
+
+    def __contains__(self, image_id: str) -> bool:
+        return image_id in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def entry(self, image_id: str) -> Optional[PackEntry]:
+        return self.entries.get(image_id)
+
+    def read(self, image_id: str) -> memoryview:
+        entry = self.entries[image_id]
+        return self._view[entry.offset:entry.offset + entry.length]
+
+    def open_image(self, image_id: str) -> Image.Image:
+        from PIL import Image
+
+        return Image.open(_SliceReader(self.read(image_id)))
+
+    def verify(self, image_id: str) -> bool:
+        return hashlib.sha256(self.read(image_id)).hexdigest() == self.entries[image_id].sha256
+
+    def close(self):
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+
+_packs: Dict[str, Tuple[int, ImagePack]] = {}
+_packs_lock = threading.Lock()
+
+
+def open_pack(pack_path: str) -> ImagePack:
+    """Process-wide shared ImagePack per path; reopened if the pack file was rebuilt."""
+    mtime_ns = os.stat(pack_path).st_mtime_ns
+    with _packs_lock:
+        cached = _packs.get(pack_path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        # The previous mapping is left to the garbage collector: other sessions may still
+        # hold memoryviews into it.
+        pack = ImagePack(pack_path)
+        _packs[pack_path] = (mtime_ns, pack)
+        return pack
+
+
+def lookup(uri: str) -> Tuple[Optional[ImagePack], Optional[PackEntry]]:
+    pack_path, image_id = parse_pack_uri(uri)
+    for attempt in range(2):
+        try:
+            pack = open_pack(pack_path)
+            break
+        except (OSError, RuntimeError):
+            # build_pack replaces the index and then the pack; a reader that lands between the
+            # two renames sees a size mismatch. Retry once before reporting the image missing.
+            if attempt:
+                return None, None
+            time.sleep(REOPEN_RETRY_SECONDS)
+    return pack, pack.entry(image_id)
+
+
+def exists(path: str) -> bool:
+    if is_pack_uri(path):
+        return lookup(path)[1] is not None
+    return bool(path) and os.path.exists(path)
+
+
+def source_fingerprint(path: str) -> Optional[tuple]:
+    """Identity of the image content for cache keys: pack sha256, or file mtime/size."""
+    if is_pack_uri(path):
+        entry = lookup(path)[1]
+        return ("sha256", entry.sha256) if entry is not None else None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def open_image(path: str) -> Image.Image:
+    # PIL is imported on first image use, not at app start-up.
+    from PIL import Image
+
+    if is_pack_uri(path):
+        pack, entry = lookup(path)
+        if entry is None:
+            raise FileNotFoundError(path)
+        return pack.open_image(entry.image_id)
+    return Image.open(path)
+
+
+def read_source(path: str) -> Union[str, bytes]:
+    """Argument for st.image: plain paths unchanged, pack URIs as encoded bytes."""
+    if is_pack_uri(path):
+        pack, entry = lookup(path)
+        if entry is None:
+            raise FileNotFoundError(path)
+        return bytes(pack.read(entry.image_id))
+    return path
+
+
+def _describe(item: Tuple[str, str]) -> Tuple[str, bytes, str, int, int, str]:
+    from PIL import Image
+
+    image_id, file_path = item
+    with open(file_path, "rb") as f:
+        data = f.read()
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+        fmt = (img.format or "").lower()
+    return image_id, data, hashlib.sha256(data).hexdigest(), width, height, fmt
+
+
+def build_pack(items: Iterable[Tuple[str, str]], pack_path: str, workers: int = 8) -> List[PackEntry]:
+    """
+    Write (image_id, file_path) items into `pack_path` and its sorted index.
+    Files are read, hashed and probed in parallel, with at most 2 * workers files in memory;
+    the pack is written in image_id order to temporary files that replace the old pack only
+    when complete.
+    """
+    items = sorted(dict(items).items())
+    tmp_pack = f"{pack_path}.tmp-{os.getpid()}"
+    tmp_index = f"{pack_path}{INDEX_SUFFIX}.tmp-{os.getpid()}"
+    folder = os.path.dirname(pack_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    entries: List[PackEntry] = []
+    offset = 0
+    workers = max(1, workers)
+    pending = deque()
+    todo = iter(items)
+    with open(tmp_pack, "wb") as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        # Sliding window instead of pool.map, which submits every file up front and keeps
+        # all of their bytes alive until they are written.
+        for item in todo:
+            pending.append(pool.submit(_describe, item))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            image_id, data, sha256, width, height, fmt = pending.popleft().result()
+            for item in todo:
+                pending.append(pool.submit(_describe, item))
+                break
+            f.write(data)
+            entries.append(PackEntry(image_id, offset, len(data), sha256, width, height, fmt))
+            offset += len(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    with open(tmp_index, "w", encoding="utf-8", newline="\n") as f:
+        f.write(f"{INDEX_MAGIC}\t{offset}\n")
+        for e in entries:
+            f.write("\t".join([e.image_id, str(e.offset), str(e.length), e.sha256, str(e.width), str(e.height), e.format]) + "\n")
+
+    # Index first; a reader that catches the old pack with the new index fails the size check.
+    os.replace(tmp_index, pack_path + INDEX_SUFFIX)
+    os.replace(tmp_pack, pack_path)
+    return entries
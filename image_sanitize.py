@@ -0,0 +1,209 @@
+"""
+Metadata-stripping lossless re-encode for reader-facing images.
+
+Generator outputs can carry PNG text chunks (prompts, software names), ICC profiles, EXIF
+and similar non-pixel data that both bloat the files and can reveal the generator.
+`sanitize_image` decodes the pixels and writes a fresh PNG that carries nothing else:
+
+- every img.info entry except palette transparency is dropped,
+- RGB images whose three channels are identical (grayscale CXRs saved as RGB) are stored
+  as single-channel L, which is lossless for such images,
+- the PNG is written with optimize=True.
+
+The output is decoded again and compared with the source by `pixel_digest`; a mismatch
+raises instead of writing a file that differs from what the generator produced.
+
+`recompress_lossless` is the archival variant: it tries optimized PNG and lossless WebP,
+verifies each candidate the same way and keeps the smallest (or the original file when
+nothing beats it). Unlike `sanitize_image` it keeps non-pixel data unless strip_metadata is
+set:
+
+- files with a C2PA provenance manifest (PNG caBX chunk) are kept byte-for-byte, because the
+  manifest's hash binding covers the encoded bytes and any re-encode would invalidate it,
+- other PNG ancillary chunks (iCCP, tEXt/zTXt/iTXt, eXIf, pHYs, ...) are copied verbatim
+  into the PNG candidate, in their original position relative to PLTE and IDAT, and the
+  WebP candidate is not tried because it cannot carry them,
+- for other lossless sources the ICC profile and EXIF block are passed to the encoder.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import struct
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+# PNG/JPEG info keys that are part of the pixel data rather than metadata.
+PIXEL_INFO_KEYS = {"transparency"}
+# Source formats whose pixels can be re-encoded bit-identically. JPEG is left alone: a
+# lossless copy of decoded JPEG pixels is always larger than the JPEG itself.
+LOSSLESS_SOURCE_FORMATS = {"png", "webp", "bmp", "tiff"}
+# Modes lossless WebP round-trips exactly (decoded as RGB/RGBA).
+WEBP_MODES = {"L", "RGB", "RGBA"}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Chunks the encoder writes itself; everything else in a source PNG is ancillary data.
+PNG_CRITICAL_CHUNKS = {b"IHDR", b"PLTE", b"IDAT", b"IEND"}
+# C2PA manifest store chunk (JUMBF); its hard binding hashes the encoded file bytes.
+PNG_PROVENANCE_CHUNKS = {b"caBX"}
+
+
+def pixel_digest(img: Image.Image) -> str:
+    """sha256 over mode, size and raw pixel bytes."""
+    h = hashlib.sha256(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode())
+    h.update(img.tobytes())
+    return h.hexdigest()
+
+
+def _is_gray_rgb(img: Image.Image) -> bool:
+    if img.mode != "RGB":
+        return False
+    r, g, b = img.split()
+    return ImageChops.difference(r, g).getbbox() is None and ImageChops.difference(r, b).getbbox() is None
+
+
+def sanitize_image(data: bytes, collapse_gray: bool = True, compress_level: int = 9) -> Tuple[bytes, dict]:
+    """
+    Return (png_bytes, details) for encoded image bytes. details holds the source format,
+    the metadata keys removed, whether RGB was collapsed to L, and the pixel digest.
+    """
+    with Image.open(io.BytesIO(data)) as src:
+        src.load()
+        source_format = (src.format or "").lower()
+        removed = sorted(k for k in src.info if k not in PIXEL_INFO_KEYS)
+        pixels = src.copy()
+    pixels.info = {}
+    source_digest = pixel_digest(pixels)
+
+    collapsed = collapse_gray and _is_gray_rgb(pixels)
+    out_img = pixels.getchannel(0) if collapsed else pixels
+    save_kwargs = {"format": "PNG", "optimize": True, "compress_level": compress_level}
+    if pixels.mode == "P" and "transparency" in src.info:
+        save_kwargs["transparency"] = src.info["transparency"]
+    buf = io.BytesIO()
+    out_img.save(buf, **save_kwargs)
+    png = buf.getvalue()
+
+    with Image.open(io.BytesIO(png)) as check:
+        check.load()
+        restored = check.convert(pixels.mode) if collapsed else check
+        if pixel_digest(restored) != source_digest:
+            raise RuntimeError("Re-encoded pixels differ from the source.")
+
+    return png, {
+        "source_format": source_format,
+        "removed_metadata": ";".join(removed),
+        "collapsed_to_gray": collapsed,
+        "pixel_sha256": source_digest,
+    }
+
+
+def _decodes_to(candidate: bytes, pixels: Image.Image, digest: str) -> bool:
+    with Image.open(io.BytesIO(candidate)) as check:
+        check.load()
+        restored = check if check.mode == pixels.mode else check.convert(pixels.mode)
+        return pixel_digest(restored) == digest
+
+
+def png_chunks(data: bytes) -> List[Tuple[bytes, bytes]]:
+    """[(chunk type, raw chunk bytes incl. length and CRC)] of a PNG file, in file order."""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("not a PNG file")
+    chunks, pos = [], len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        (length,) = struct.unpack(">I", data[pos:pos + 4])
+        end = pos + 12 + length
+        chunks.append((data[pos + 4:pos + 8], data[pos:end]))
+        pos = end
+    return chunks
+
+
+def _ancillary_chunks(chunks: List[Tuple[bytes, bytes]]) -> dict:
+    """Ancillary chunks grouped by position: "head" (before PLTE), "pre_idat", "tail"."""
+    groups = {"head": [], "pre_idat": [], "tail": []}
+    where = "head"
+    for ctype, raw in chunks:
+        if ctype == b"PLTE":
+            where = "pre_idat"
+        elif ctype == b"IDAT":
+            where = "tail"
+        elif ctype not in PNG_CRITICAL_CHUNKS:
+            groups[where].append(raw)
+    if not any(ctype == b"PLTE" for ctype, _ in chunks):
+        groups["head"] += groups.pop("pre_idat")
+        groups["pre_idat"] = []
+    return groups
+
+
+def _with_chunks(png: bytes, groups: dict) -> bytes:
+    """Insert grouped ancillary chunks into an encoder-written PNG that has none of its own."""
+    out = [PNG_SIGNATURE]
+    seen_idat = False
+    for ctype, raw in png_chunks(png):
+        if ctype == b"IDAT" and not seen_idat:
+            out += groups["pre_idat"]
+            seen_idat = True
+        elif ctype == b"IEND":
+            out += groups["tail"]
+        out.append(raw)
+        if ctype == b"IHDR":
+            out += groups["head"]
+    return b"".join(out)
+
+
+def recompress_lossless(
+    data: bytes, compress_level: int = 9, webp_method: Optional[int] = 4, strip_metadata: bool = False
+) -> Tuple[bytes, str, dict]:
+    """
+    Return (best_bytes, extension, details). extension is "" when the original bytes are
+    kept. Every candidate is decoded and must match the source pixel digest exactly.
+    Non-pixel data is kept (see the module docstring) unless strip_metadata is set.
+    """
+    with Image.open(io.BytesIO(data)) as src:
+        src.load()
+        source_format = (src.format or "").lower()
+        source_info = dict(src.info)
+        pixels = src.copy()
+    pixels.info = {}
+    digest = pixel_digest(pixels)
+    details = {"source_format": source_format, "pixel_sha256": digest, "source_bytes": len(data)}
+
+    chunk_groups, save_kwargs, skip_reason = None, {}, ""
+    if not strip_metadata and source_format == "png":
+        chunks = png_chunks(data)
+        if any(ctype in PNG_PROVENANCE_CHUNKS for ctype, _ in chunks):
+            skip_reason = "c2pa_provenance"
+        else:
+            chunk_groups = _ancillary_chunks(chunks)
+            if not any(chunk_groups.values()):
+                chunk_groups = None
+    elif not strip_metadata:
+        save_kwargs = {k: source_info[k] for k in ("icc_profile", "exif") if source_info.get(k)}
+    details["kept_metadata"] = "" if strip_metadata else ";".join(
+        sorted({raw[4:8].decode("latin-1") for group in (chunk_groups or {}).values() for raw in group} | set(save_kwargs))
+    )
+
+    best, best_ext = data, ""
+    if source_format in LOSSLESS_SOURCE_FORMATS and not skip_reason:
+        candidates = []
+        buf = io.BytesIO()
+        pixels.save(buf, format="PNG", optimize=True, compress_level=compress_level, **save_kwargs)
+        png = buf.getvalue()
+        candidates.append((_with_chunks(png, chunk_groups) if chunk_groups else png, ".png"))
+        if webp_method is not None and pixels.mode in WEBP_MODES and chunk_groups is None:
+            buf = io.BytesIO()
+            pixels.save(buf, format="WEBP", lossless=True, quality=100, method=webp_method, **save_kwargs)
+            candidates.append((buf.getvalue(), ".webp"))
+        for candidate, ext in sorted(candidates, key=lambda c: len(c[0])):
+            if len(candidate) >= len(best):
+                break
+            if _decodes_to(candidate, pixels, digest):
+                best, best_ext = candidate, ext
+                break
+
+    details.update({
+        "output_format": best_ext.lstrip(".") or source_format,
+        "output_bytes": len(best),
+        "kept_original_reason": skip_reason,
+    })
+    return best, best_ext, details
@@ -0,0 +1,40 @@
+"""
+Browser-side CXR viewer (frontend/cxr_viewer/index.html) for the survey apps.
+
+Window/level, invert, zoom and pan run on a canvas in the browser, so adjusting the image
+costs no server round trip. The component returns only an aggregate telemetry dict:
+
+    wl_changes, zoom_changes, pan_changes, invert_toggles, resets,
+    max_zoom, active_ms, and the final window, level, inverted and zoom.
+
+Place it inside the rating st.form: component values in a form are sent with the submit,
+so interactions never rerun the script. The value is None until the reader touches the
+image.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import os
+from typing import Optional
+
+import streamlit.components.v1 as components
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "cxr_viewer")
+_component = components.declare_component("cxr_viewer", path=_FRONTEND_DIR)
+
+
+def png_data_uri(data: bytes) -> str:
+    return "data:image/png;base64," + base64.b64encode(data).decode("ascii")
+
+
+def cxr_viewer(src: str, key: str, max_height: int = 1050) -> Optional[dict]:
+    """src is an image URL or data URI. Returns the telemetry dict or None."""
+    return _component(src=src, max_height=max_height, key=key, default=None)
+
+
+def telemetry_json(value: Optional[dict]) -> str:
+    """Compact JSON for the result row; empty when the viewer was not used."""
+    if not value:
+        return ""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
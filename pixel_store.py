@@ -0,0 +1,218 @@
+"""
+Downsampled grayscale pixel store for corpus-level analysis.
+
+Every image is decoded once into a fixed-size uint8 tensor and stored as one row of
+
+    <store>/pixels.npy      shape (n_images, height, width), dtype uint8, opened with mmap
+    <store>/index.parquet   one row per tensor row: row, image_id, folder, generator,
+                            generated_image_id, prompt_id, reader_folder, readers,
+                            orig_width, orig_height, mtime_ns, size
+
+image_id is the forward-slash path relative to the study root (e.g. "gpt/P010.png",
+"Lee/HQ/demo0049_0.jpg"). `update_pixel_store` re-decodes only files that are new or whose
+mtime/size changed and copies the other rows over from the previous store.
+"""
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from study_index import StudyIndex
+
+PIXELS_FILE = "pixels.npy"
+INDEX_FILE = "index.parquet"
+VALID_EXTS = {".png", ".jpg", ".jpeg", ".webp"}
+DEFAULT_FOLDERS = [
+    "gpt", "gemini", "sana", "roentgen", "roentgen_10_440", "roentgen_75_440", "mimic_451",
+    "Lee", "Song", "Jin", "Yang_extra",
+]
+# app_survey rater-set folders; files below them get reader_folder set.
+READER_FOLDERS = {"Lee", "Song", "Jin", "Yang_extra"}
+
+
+def scan_corpus(root: str, folders: Iterable[str]) -> List[dict]:
+    """List image files under root/<folder> with the stat fields used for change detection."""
+    files = []
+    for folder in folders:
+        top = os.path.join(root, folder)
+        if not os.path.isdir(top):
+            continue
+        for dirpath, _, filenames in os.walk(top):
+            for fname in filenames:
+                if os.path.splitext(fname)[1].lower() not in VALID_EXTS:
+                    continue
+                path = os.path.join(dirpath, fname)
+                st = os.stat(path)
+                image_id = os.path.relpath(path, root).replace("\\", "/")
+                files.append({"image_id": image_id, "path": path, "mtime_ns": st.st_mtime_ns, "size": st.st_size})
+    files.sort(key=lambda f: f["image_id"])
+    return files
+
+
+def study_metadata(study_index_path: Optional[str]) -> Tuple[Dict[str, dict], Dict[str, str], Dict[tuple, str]]:
+    """
+    From the study index: image_key -> images row, image_key -> comma-joined reader_ids, and
+    (rater-set folder, file name) -> source image_key of the copied file.
+    """
+    if not study_index_path or not os.path.exists(study_index_path):
+        return {}, {}, {}
+    index = StudyIndex(study_index_path)
+    try:
+        images = {row["image_key"]: row for row in index.query("SELECT * FROM images")}
+        for key, row in list(images.items()):
+            images.setdefault(os.path.splitext(key)[0], row)
+        readers = {
+            row["image_key"]: row["readers"]
+            for row in index.query(
+                "SELECT image_key, group_concat(DISTINCT reader_id) AS readers FROM reader_images GROUP BY image_key"
+            )
+        }
+        copies = {
+            (row["reader_id"], row["image_key"].rsplit("/", 1)[-1]): row["image_key"]
+            for row in index.query("SELECT reader_id, image_key FROM reader_images WHERE source = 'rater_set'")
+        }
+    finally:
+        index.close()
+    return images, readers, copies
+
+
+def _describe(image_id: str, images: Dict[str, dict], readers: Dict[str, str], copies: Dict[tuple, str]) -> dict:
+    parts = image_id.split("/")
+    folder = parts[0]
+    reader_folder = folder if folder in READER_FOLDERS else ""
+    # Rater-set files are copies of e.g. roentgen_10_440/<name>; describe them by their source.
+    key = copies.get((reader_folder, parts[-1]), image_id) if reader_folder else image_id
+    # Manifests may name roentgen/P006.png while the file on disk is roentgen/P006.jpg.
+    meta = images.get(key) or images.get(os.path.splitext(key)[0], {})
+    return {
+        "folder": folder,
+        "generator": meta.get("model_key") or key.split("/")[0],
+        "generated_image_id": meta.get("generated_image_id") or "",
+        "prompt_id": meta.get("prompt_id") or "",
+        "reader_folder": reader_folder,
+        "readers": readers.get(key, ""),
+    }
+
+
+def decode_tensor(task: Tuple[str, int, int]) -> Tuple[Optional[bytes], int, int]:
+    """Decode one image to a (height, width) uint8 grayscale tensor. Runs in worker processes."""
+    path, height, width = task
+    try:
+        with Image.open(path) as img:
+            orig_w, orig_h = img.size
+            # JPEG: let the decoder downscale by 1/2, 1/4 or 1/8 before the resize.
+            img.draft("L", (width, height))
+            img = img.convert("L").resize((width, height), Image.BILINEAR)
+        return np.asarray(img, dtype=np.uint8).tobytes(), orig_w, orig_h
+    except Exception:
+        return None, 0, 0
+
+
+def open_pixel_store(store_dir: str, mmap_mode: str = "r") -> Tuple[np.ndarray, pd.DataFrame]:
+    """Return (pixels memmap, index DataFrame). pixels[index.row[i]] is the tensor of index.image_id[i]."""
+    pixels = np.load(os.path.join(store_dir, PIXELS_FILE), mmap_mode=mmap_mode)
+    index = pd.read_parquet(os.path.join(store_dir, INDEX_FILE))
+    return pixels, index
+
+
+def update_pixel_store(
+    root: str,
+    store_dir: str,
+    size: Tuple[int, int] = (256, 256),
+    folders: Iterable[str] = DEFAULT_FOLDERS,
+    study_index_path: Optional[str] = None,
+    workers: Optional[int] = None,
+    full: bool = False,
+) -> dict:
+    """
+    Build or incrementally update the store. Returns counts of reused/decoded/failed/removed files.
+    The new pixels.npy and index.parquet are written to temporary files and then renamed.
+    """
+    height, width = size
+    os.makedirs(store_dir, exist_ok=True)
+    pixels_path = os.path.join(store_dir, PIXELS_FILE)
+    index_path = os.path.join(store_dir, INDEX_FILE)
+
+    files = scan_corpus(root, folders)
+    images, readers, copies = study_metadata(study_index_path)
+
+    old_pixels, old_rows = None, {}
+    if not full and os.path.exists(pixels_path) and os.path.exists(index_path):
+        old_pixels, old_index = open_pixel_store(store_dir)
+        if old_pixels.shape[1:] == (height, width):
+            old_rows = {r.image_id: r for r in old_index.itertuples(index=False)}
+        else:
+            old_pixels = None
+
+    reuse, decode = [], []
+    for i, f in enumerate(files):
+        old = old_rows.get(f["image_id"])
+        if old is not None and (old.mtime_ns, old.size) == (f["mtime_ns"], f["size"]):
+            reuse.append((i, old))
+        else:
+            decode.append(i)
+
+    tmp_pixels = f"{pixels_path}.tmp-{os.getpid()}.npy"
+    tmp_index = f"{index_path}.tmp-{os.getpid()}"
+    out = np.lib.format.open_memmap(tmp_pixels, mode="w+", dtype=np.uint8, shape=(len(files), height, width))
+    dims = {}
+    for i, old in reuse:
+        out[i] = old_pixels[old.row]
+        dims[i] = (old.orig_width, old.orig_height)
+
+    failed = []
+    if decode:
+        tasks = [(files[i]["path"], height, width) for i in decode]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for i, (data, orig_w, orig_h) in zip(decode, pool.map(decode_tensor, tasks, chunksize=16)):
+                if data is None:
+                    failed.append(files[i]["image_id"])
+                    continue
+                out[i] = np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+                dims[i] = (orig_w, orig_h)
+
+    # Rows that failed to decode are dropped; compact the array so row == position.
+    keep = [i for i in range(len(files)) if i in dims]
+    if len(keep) != len(files):
+        compacted = np.lib.format.open_memmap(
+            tmp_pixels + ".compact.npy", mode="w+", dtype=np.uint8, shape=(len(keep), height, width)
+        )
+        for new_row, i in enumerate(keep):
+            compacted[new_row] = out[i]
+        compacted.flush()
+        del out, compacted
+        os.replace(tmp_pixels + ".compact.npy", tmp_pixels)
+    else:
+        out.flush()
+        del out
+
+    index = pd.DataFrame([
+        {
+            "row": new_row,
+            "image_id": files[i]["image_id"],
+            **_describe(files[i]["image_id"], images, readers, copies),
+            "orig_width": int(dims[i][0]),
+            "orig_height": int(dims[i][1]),
+            "mtime_ns": files[i]["mtime_ns"],
+            "size": files[i]["size"],
+        }
+        for new_row, i in enumerate(keep)
+    ])
+    index.to_parquet(tmp_index, index=False)
+
+    del old_pixels
+    os.replace(tmp_pixels, pixels_path)
+    os.replace(tmp_index, index_path)
+    current = {f["image_id"] for f in files}
+    return {
+        "images": len(keep),
+        "reused": len(reuse),
+        "decoded": len(decode) - len(failed),
+        "failed": failed,
+        "removed": len([k for k in old_rows if k not in current]),
+    }
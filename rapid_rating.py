@@ -0,0 +1,38 @@
+"""
+Keyboard rapid-entry checklist (frontend/rapid_rating/index.html) for app.py.
+
+All eight X/O/N/A answers are collected in the browser: 1-8 or Up/Down select an item,
+x / o / n answer it and advance, a marks every unanswered item X, Backspace clears one.
+The component returns {artifact_key: "X" | "O" | "N/A"} for the answered items, the same
+stored values as the radio checklist, so the app's validation is unchanged.
+
+Place it inside the rating st.form so the answers travel with the submit.
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, List
+
+import streamlit.components.v1 as components
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "rapid_rating")
+_component = components.declare_component("rapid_rating", path=_FRONTEND_DIR)
+
+VALID_VALUES = {"X", "O", "N/A"}
+
+
+def rapid_rating(items: List[dict], choice_labels: Dict[str, str], case_key: str, help_text: str = "") -> Dict[str, str]:
+    """
+    items: [{"key", "label", "description"}, ...] in display order.
+    choice_labels: stored value ("X", "O", "N/A") -> button label.
+    Returns artifact key -> stored value; unanswered items are "".
+    """
+    value = _component(
+        items=items,
+        choice_labels=choice_labels,
+        case_key=case_key,
+        help=help_text,
+        key=f"rapid_rating_{case_key}",
+        default=None,
+    ) or {}
+    return {item["key"]: value.get(item["key"], "") if value.get(item["key"]) in VALID_VALUES else "" for item in items}
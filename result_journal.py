@@ -0,0 +1,219 @@
+"""
+Crash-safe append-only result journal used by app.py for local result storage.
+
+Each submit is one newline-delimited JSON record:
+
+    {"token": "<idempotency token>", "written_at": "...", "row": {"<header>": "<value>", ...}}
+
+- One file descriptor per journal path is kept open for the life of the process,
+  so a submit costs a single write() instead of open/stat/close.
+- Writes take an exclusive flock (POSIX), so several server processes can share a file
+  without interleaving partial lines.
+- fsync is group-committed: a background thread syncs dirty journals every
+  `fsync_interval` seconds. `append(..., durable=True)` syncs immediately.
+- A torn last line left by a crash is isolated on reopen and skipped by `read_journal`.
+- `compact_journal` drops repeated tokens in place; `export_csv` writes the CSV format
+  app.py used before the journal existed.
+"""
+from __future__ import annotations
+
+import atexit
+import csv
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only.
+    fcntl = None
+
+
+def _lock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+def _unlock_fd(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        n = os.write(fd, view)
+        view = view[n:]
+
+
+def _same_file(fd: int, path: str) -> bool:
+    try:
+        st_path = os.stat(path)
+    except FileNotFoundError:
+        return False
+    st_fd = os.fstat(fd)
+    return (st_fd.st_dev, st_fd.st_ino) == (st_path.st_dev, st_path.st_ino)
+
+
+class ResultJournal:
+    def __init__(self, fsync_interval: float = 1.0):
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fds: Dict[str, int] = {}
+        self._dirty: set = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sync_loop, name="result-journal-fsync", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, path: str, record: dict, durable: bool = False):
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            fd = self._locked_fd(path)
+            try:
+                _write_all(fd, line)
+                if durable:
+                    os.fsync(fd)
+            finally:
+                _unlock_fd(fd)
+            if durable:
+                self._dirty.discard(path)
+            else:
+                self._dirty.add(path)
+
+    def sync(self):
+        with self._lock:
+            for path in list(self._dirty):
+                fd = self._fds.get(path)
+                if fd is not None:
+                    os.fsync(fd)
+            self._dirty.clear()
+
+    def close(self):
+        self._stop.set()
+        self.sync()
+        with self._lock:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except OSError:
+                pass
+
+    def _open(self, path: str) -> int:
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        return os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _locked_fd(self, path: str) -> int:
+        """Return a locked fd for path, reopening it if compaction replaced the file."""
+        fd = self._fds.get(path)
+        fresh = fd is None
+        if fresh:
+            fd = self._open(path)
+        while True:
+            _lock_fd(fd)
+            if _same_file(fd, path):
+                break
+            _unlock_fd(fd)
+            os.close(fd)
+            fd = self._open(path)
+            fresh = True
+        self._fds[path] = fd
+        if fresh:
+            self._terminate_torn_tail(path, fd)
+        return fd
+
+    @staticmethod
+    def _terminate_torn_tail(path: str, fd: int):
+        # A crash mid-write leaves a line without "\n"; close it off so the next
+        # record starts on its own line and the fragment is skipped on read.
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return
+        with open(path, "rb") as f:
+            f.seek(size - 1)
+            if f.read(1) != b"\n":
+                _write_all(fd, b"\n")
+
+
+def read_journal(path: str) -> Iterator[dict]:
+    """Yield valid records in write order, skipping torn or corrupt lines."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and isinstance(record.get("row"), dict):
+                yield record
+
+
+def _unique_records(records) -> List[dict]:
+    seen = set()
+    unique = []
+    for record in records:
+        token = record.get("token")
+        if token:
+            if token in seen:
+                continue
+            seen.add(token)
+        unique.append(record)
+    return unique
+
+
+def compact_journal(path: str) -> Tuple[int, int]:
+    """Rewrite a journal without repeated tokens or torn lines. Returns (records_in, records_out)."""
+    fd = os.open(path, os.O_RDWR)
+    try:
+        _lock_fd(fd)
+        records = list(read_journal(path))
+        unique = _unique_records(records)
+        tmp_path = f"{path}.compact-{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            for record in unique:
+                f.write((json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        _unlock_fd(fd)
+        os.close(fd)
+    return len(records), len(unique)
+
+
+def export_csv(records, csv_path: str) -> int:
+    """Write journal records as the app's local result CSV (utf-8-sig, header row first)."""
+    unique = _unique_records(records)
+    header: List[str] = []
+    for record in unique:
+        for col in record["row"]:
+            if col not in header:
+                header.append(col)
+    tmp_path = f"{csv_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for record in unique:
+            writer.writerow([record["row"].get(col, "") for col in header])
+    os.replace(tmp_path, csv_path)
+    return len(unique)
+
+
+def make_record(token: str, headers: List[str], row: List[str]) -> dict:
+    return {
+        "token": token,
+        "written_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "row": dict(zip(headers, row)),
+    }
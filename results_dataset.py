@@ -0,0 +1,129 @@
+"""
+Typed, partitioned Parquet dataset of survey results (app.py rows from every reader).
+
+Layout (hive partitioning, readable with pd.read_parquet(<dir>) or pyarrow.dataset):
+
+    <dir>/study_id=<study>/reader_id=<reader>/part-<utc stamp>-<n>.parquet
+
+Every part file has the same schema (RESULT_SCHEMA, without the two partition columns):
+full and compact rows, and rows with or without viewer_telemetry, are stored with the same
+columns, missing ones as null. Values are normalized on the way in:
+
+- artifact *_OXN columns: "X" / "O" / "N/A" as a dictionary column (labels such as
+  "O(있음)" or "N/A(Unable to judge)" are reduced to their code; anything else is null),
+- time_spent_sec: float64, reader_sequence: int16, is_cross_validation_duplicate: int8,
+- timestamp: timestamp[s] (the app writes "%Y-%m-%d %H:%M:%S" local time),
+- everything else: string.
+
+`append_results(df, dir)` writes only rows whose (study_id, reader_id, assignment_id) is not
+in the dataset yet, one new part file per touched partition, so a re-export costs the
+fetch plus a small write. Part files are written under a "."-prefixed temporary name and
+renamed, so a crash leaves nothing that dataset discovery would pick up.
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import List, Set, Tuple
+
+import pandas as pd
+
+KEY_COLS = ["study_id", "reader_id", "assignment_id"]
+PARTITION_COLS = ["study_id", "reader_id"]
+OXN_CODES = ["X", "O", "N/A"]
+# Must match ARTIFACTS[*]["sheet_col"] in app.py.
+ARTIFACT_COLS = [
+    "artifact_marker_OXN",
+    "artifact_density_OXN",
+    "artifact_gas_lucency_OXN",
+    "artifact_boundaries_OXN",
+    "artifact_anterior_ribs_OXN",
+    "artifact_wavy_clavicle_OXN",
+    "artifact_organ_shape_OXN",
+    "artifact_global_quality_fov_crop_OXN",
+]
+# Must match SHEET_HEADERS in app.py (with the optional viewer column).
+RESULT_COLUMNS = [
+    "timestamp", "study_id", "app_version", "reader_id", "assignment_id", "reader_sequence",
+    "blinded_image_id", "blinded_filename", "case_hash",
+    "source_image_folder", "source_image_filename", "source_image_relpath", "source_image_path",
+    "generated_image_id", "prompt_id", "model_key", "generator_name", "cv_role",
+    "is_cross_validation_duplicate",
+] + ARTIFACT_COLS + ["time_spent_sec", "viewer_telemetry"]
+INT_COLS = {"reader_sequence": "Int16", "is_cross_validation_duplicate": "Int8"}
+FLOAT_COLS = ["time_spent_sec"]
+TIMESTAMP_COLS = ["timestamp"]
+
+
+def oxn_code(value) -> object:
+    s = "" if value is None else str(value).strip()
+    if s.startswith("N/A") or "Unable" in s:
+        return "N/A"
+    if s.startswith("O") or "Present" in s:
+        return "O"
+    if s.startswith("X") or "None" in s:
+        return "X"
+    return None
+
+
+def normalize_results(df: pd.DataFrame) -> pd.DataFrame:
+    """Raw string rows (sheet/journal/CSV) -> RESULT_COLUMNS with the dataset dtypes."""
+    unknown = [c for c in df.columns if c not in RESULT_COLUMNS]
+    if unknown:
+        print(f"WARNING: dropping columns not in the results schema: {unknown}")
+    out = pd.DataFrame(index=df.index)
+    for col in RESULT_COLUMNS:
+        raw = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype="object")
+        text = raw.astype("string").str.strip().replace("", pd.NA)
+        if col in ARTIFACT_COLS:
+            out[col] = pd.Categorical(text.map(oxn_code, na_action="ignore"), categories=OXN_CODES)
+        elif col in INT_COLS:
+            out[col] = pd.to_numeric(text, errors="coerce").round().astype(INT_COLS[col])
+        elif col in FLOAT_COLS:
+            out[col] = pd.to_numeric(text, errors="coerce").astype("float64")
+        elif col in TIMESTAMP_COLS:
+            out[col] = pd.to_datetime(text, errors="coerce", format="%Y-%m-%d %H:%M:%S").astype("datetime64[s]")
+        else:
+            out[col] = text
+    return out.reset_index(drop=True)
+
+
+def existing_keys(dataset_dir: str) -> Set[Tuple[str, str, str]]:
+    if not os.path.isdir(dataset_dir) or not any(
+        f.endswith(".parquet") and not f.startswith((".", "_")) for _, _, fs in os.walk(dataset_dir) for f in fs
+    ):
+        return set()
+    keys = pd.read_parquet(dataset_dir, columns=KEY_COLS)
+    return set(zip(keys["study_id"].astype(str), keys["reader_id"].astype(str), keys["assignment_id"].astype(str)))
+
+
+def _partition_dir(dataset_dir: str, study_id: str, reader_id: str) -> str:
+    for value in (study_id, reader_id):
+        if not value or "/" in value or os.sep in value or value.startswith("."):
+            raise ValueError(f"invalid partition value: {value!r}")
+    return os.path.join(dataset_dir, f"study_id={study_id}", f"reader_id={reader_id}")
+
+
+def append_results(df: pd.DataFrame, dataset_dir: str) -> List[Tuple[str, int]]:
+    """
+    Append normalized rows whose key is new. Rows without a key are skipped and a key seen
+    twice keeps its first row. Returns [(part file, rows)] for the files written.
+    """
+    df = df.dropna(subset=KEY_COLS).drop_duplicates(subset=KEY_COLS, keep="first")
+    seen = existing_keys(dataset_dir)
+    if seen:
+        keys = list(zip(df["study_id"], df["reader_id"], df["assignment_id"]))
+        df = df[[k not in seen for k in keys]]
+    written = []
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    for (study_id, reader_id), part in df.groupby(PARTITION_COLS, sort=True):
+        part_dir = _partition_dir(dataset_dir, str(study_id), str(reader_id))
+        os.makedirs(part_dir, exist_ok=True)
+        n = sum(1 for f in os.listdir(part_dir) if f.endswith(".parquet") and not f.startswith((".", "_")))
+        path = os.path.join(part_dir, f"part-{stamp}-{n:04d}.parquet")
+        # Leading "." so pyarrow dataset discovery skips a temp file left behind by a crash.
+        tmp_path = os.path.join(part_dir, f".part-{stamp}-{n:04d}.parquet.tmp-{os.getpid()}")
+        part.drop(columns=PARTITION_COLS).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        written.append((path, len(part)))
+    return written
@@ -1,5 +1,16 @@
 #!/usr/bin/env python3
-"""Analyze inter-reader/cross-validation agreement for the external synthetic CXR QA survey."""
+"""
+Analyze inter-reader/cross-validation agreement for the external synthetic CXR QA survey.
+
+Survey results and the hidden assignment can be CSV, Parquet (a file or a partitioned
+dataset directory such as scripts/export_results_parquet.py writes) or Arrow IPC/Feather.
+Only the columns the metrics use are read: artifact ratings become Int8 codes (X=0, O=1,
+N/A=2), reader/generator/category columns become categoricals, and CSV cells are read as
+strings with keep_default_na=False so the literal "N/A" rating is not turned into NaN.
+Blank key and metadata cells (compact rows, hand-edited sheets) are NA instead, and blank
+metadata is filled from the hidden assignment before pairing, so unlabeled rows are never
+grouped together as one generated image. The merged and pair tables are written as Parquet.
+"""
 from __future__ import annotations
 
 import argparse
@@ -10,7 +21,6 @@ from typing import Dict, List
 
 import numpy as np
 import pandas as pd
-from sklearn.metrics import cohen_kappa_score
 
 BINARY_COLS = [
     "is_frontal_cxr_like_yesno",
@@ -29,6 +39,12 @@ ARTIFACT_COLS = [
     "artifact_global_quality_fov_crop_OXN",
 ]
 SCORE_COL = "quality_score_1to5"
+OXN_CODES = {"X": 0, "O": 1, "N/A": 2}
+KEY_COLS = ["study_id", "reader_id", "assignment_id"]
+META_COLS = ["generated_image_id", "generator_name", "model_key", "prompt_id", "category"]
+SURVEY_COLS = KEY_COLS + META_COLS + [SCORE_COL] + BINARY_COLS + ARTIFACT_COLS
+HIDDEN_COLS = ["assignment_id"] + META_COLS
+CATEGORY_COLS = ["study_id", "reader_id", "generator_name", "model_key", "category"]
 
 
 def normalize_binary(x):
@@ -53,6 +69,40 @@ def normalize_oxn(x):
     return np.nan
 
 
+def oxn_codes(values: pd.Series) -> pd.Series:
+    """OXN labels ("O", "X(None)", "N/A(Unable...)") -> Int8 codes (OXN_CODES); unknown -> <NA>."""
+    return values.astype("object").map(normalize_oxn).map(OXN_CODES).astype("Int8")
+
+
+def read_columns(path: str, wanted: List[str]) -> pd.DataFrame:
+    """Read only the `wanted` columns that exist in a CSV, Parquet file/dataset or Arrow IPC file."""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return pd.read_csv(path, usecols=lambda c: c in wanted, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="ipc" if suffix in (".arrow", ".feather", ".ipc") else "parquet", partitioning="hive")
+    return dataset.to_table(columns=[c for c in wanted if c in dataset.schema.names]).to_pandas()
+
+
+def blank_to_na(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    """Empty / whitespace-only cells in `cols` -> NA (keep_default_na=False keeps them as "")."""
+    for c in cols:
+        if c in df.columns:
+            df[c] = df[c].astype("string").str.strip().replace("", pd.NA)
+    return df
+
+
+def fill_from_hidden(merged: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    """Fill NA survey metadata from the `<col>_hidden` columns of the merge, then drop those."""
+    for c in cols:
+        hidden_col = f"{c}_hidden"
+        if hidden_col in merged.columns:
+            merged[c] = merged[c].fillna(merged[hidden_col])
+            merged = merged.drop(columns=hidden_col)
+    return merged
+
+
 def percent_agreement(a: List, b: List) -> float:
     a = pd.Series(a)
     b = pd.Series(b)
@@ -68,6 +118,9 @@ def safe_kappa(a: List, b: List, weights=None) -> float:
     mask = a.notna() & b.notna()
     if mask.sum() == 0:
         return np.nan
+    # sklearn is only needed here; importing it lazily keeps it off the start-up path.
+    from sklearn.metrics import cohen_kappa_score
+
     try:
         return float(cohen_kappa_score(a[mask], b[mask], weights=weights))
     except Exception:
@@ -94,7 +147,12 @@ def to_pairs(df: pd.DataFrame) -> pd.DataFrame:
                 **{f"{c}_1": r1.get(c) for c in [SCORE_COL] + BINARY_COLS + ARTIFACT_COLS},
                 **{f"{c}_2": r2.get(c) for c in [SCORE_COL] + BINARY_COLS + ARTIFACT_COLS},
             })
-    return pd.DataFrame(pair_rows)
+    pairs = pd.DataFrame(pair_rows)
+    for c in ARTIFACT_COLS:
+        for k in (1, 2):
+            if f"{c}_{k}" in pairs.columns:
+                pairs[f"{c}_{k}"] = pairs[f"{c}_{k}"].astype("Int8")
+    return pairs
 
 
 def summarize_pairs(pairs: pd.DataFrame, group_cols=None) -> pd.DataFrame:
@@ -129,13 +187,14 @@ def summarize_pairs(pairs: pd.DataFrame, group_cols=None) -> pd.DataFrame:
             row[f"{c}_kappa"] = safe_kappa(a, b)
 
         for c in ARTIFACT_COLS:
-            a = g[f"{c}_1"].map(normalize_oxn)
-            b = g[f"{c}_2"].map(normalize_oxn)
+            # Int8 codes from oxn_codes(); <NA> is an unrated/unknown cell.
+            a = g[f"{c}_1"]
+            b = g[f"{c}_2"]
             row[f"{c}_oxn_agreement"] = percent_agreement(a, b)
             row[f"{c}_oxn_kappa"] = safe_kappa(a, b)
             # O vs non-O agreement, useful for clinical artifact presence.
-            ao = a.map(lambda x: "O" if x == "O" else ("not_O" if pd.notna(x) else np.nan))
-            bo = b.map(lambda x: "O" if x == "O" else ("not_O" if pd.notna(x) else np.nan))
+            ao = a.eq(OXN_CODES["O"])
+            bo = b.eq(OXN_CODES["O"])
             row[f"{c}_present_agreement"] = percent_agreement(ao, bo)
             row[f"{c}_present_kappa"] = safe_kappa(ao, bo)
         rows.append(row)
@@ -144,8 +203,14 @@ def summarize_pairs(pairs: pd.DataFrame, group_cols=None) -> pd.DataFrame:
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--survey_results_csv", nargs="+", required=True, help="One or more exported Google Sheet/local CSV files.")
-    parser.add_argument("--hidden_assignment_csv", default="survey_manifests/M2SMF_external_QA_hidden_assignment.csv")
+    parser.add_argument(
+        "--survey_results", "--survey_results_csv", dest="survey_results", nargs="+", required=True,
+        help="Exported Google Sheet/local CSV files, Parquet files/datasets or Arrow files.",
+    )
+    parser.add_argument(
+        "--hidden_assignment", "--hidden_assignment_csv", dest="hidden_assignment",
+        default="survey_manifests/M2SMF_external_QA_hidden_assignment.csv",
+    )
     parser.add_argument("--output_dir", default="outputs/external_survey_agreement")
     args = parser.parse_args()
 
@@ -153,17 +218,34 @@ def main():
     out_dir.mkdir(parents=True, exist_ok=True)
 
     results = []
-    for p in args.survey_results_csv:
-        results.append(pd.read_csv(p))
+    for p in args.survey_results:
+        df = blank_to_na(read_columns(p, SURVEY_COLS), KEY_COLS + META_COLS)
+        for c in ARTIFACT_COLS:
+            if c in df.columns:
+                df[c] = oxn_codes(df[c])
+        if SCORE_COL in df.columns:
+            df[SCORE_COL] = pd.to_numeric(df[SCORE_COL], errors="coerce").astype("float32")
+        results.append(df)
     survey = pd.concat(results, ignore_index=True)
-    hidden = pd.read_csv(args.hidden_assignment_csv)
+    # Retries or a second browser tab can store the same assignment twice; count each rating once.
+    key_cols = [c for c in KEY_COLS if c in survey.columns]
+    n_raw = len(survey)
+    # Rows with a blank key cannot be told apart, so only complete keys are deduplicated.
+    duplicated = survey.duplicated(subset=key_cols, keep="first") & survey[key_cols].notna().all(axis=1)
+    survey = survey[~duplicated].reset_index(drop=True)
+    hidden = blank_to_na(read_columns(args.hidden_assignment, HIDDEN_COLS), HIDDEN_COLS)
+    hidden = hidden.dropna(subset=["assignment_id"]).drop_duplicates(subset=["assignment_id"], keep="first")
 
     merged = survey.merge(hidden, on="assignment_id", how="left", suffixes=("", "_hidden"))
-    merged.to_csv(out_dir / "survey_results_merged_with_hidden_assignment.csv", index=False, encoding="utf-8-sig")
+    merged = fill_from_hidden(merged, META_COLS)
+    for c in CATEGORY_COLS:
+        if c in merged.columns:
+            merged[c] = merged[c].astype("category")
+    merged.to_parquet(out_dir / "survey_results_merged_with_hidden_assignment.parquet", index=False)
 
     # Cross-validation pairs are generated_image_id with >=2 ratings.
     pairs = to_pairs(merged)
-    pairs.to_csv(out_dir / "cross_validation_rating_pairs.csv", index=False, encoding="utf-8-sig")
+    pairs.to_parquet(out_dir / "cross_validation_rating_pairs.parquet", index=False)
 
     overall = summarize_pairs(pairs)
     by_generator = summarize_pairs(pairs, ["generator_name"])
@@ -177,8 +259,10 @@ def main():
 
     summary = {
         "n_total_ratings": int(len(survey)),
+        "n_duplicate_rows_dropped": int(n_raw - len(survey)),
         "n_unique_assignments": int(survey["assignment_id"].nunique()),
         "n_unique_generated_images_rated": int(merged["generated_image_id"].nunique()),
+        "n_ratings_without_generated_image_id": int(merged["generated_image_id"].isna().sum()),
         "n_cross_validation_pairs": int(len(pairs)),
     }
     if len(overall):
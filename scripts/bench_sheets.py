@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the survey save path against the local Sheets emulator.
+
+Each simulated reader runs app.py's per-case sheet traffic through one shared
+sheets_client.SheetsGateway, the way the Streamlit sessions of one process do:
+get_all_values (resume position) and then append_row_or_defer (save), --cases times, with
+--think_ms between cases. The emulator (sheets_emulator.py) adds latency, injected 503s and
+a per-minute quota, so runs are repeatable with --seed and need no network or credentials.
+
+Reported: wall time, saves per second, save latency p50/p95/max, rows deferred by the
+gateway, the gateway and emulator counters, and whether every row reached the sheet after a
+final flush.
+
+    python scripts/bench_sheets.py --readers 4 --cases 25 --latency_ms 150 --quota_per_minute 60
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sheets_client import SheetsGateway  # noqa: E402
+from sheets_emulator import EmulatorSettings, connect  # noqa: E402
+
+HEADER = ["timestamp", "study_id", "reader_id", "assignment_id", "artifact_marker_OXN", "time_spent_sec"]
+
+
+def run_reader(gateway: SheetsGateway, ws, reader_id: str, cases: int, think_s: float, latencies: list, lock: threading.Lock):
+    for i in range(cases):
+        ws.get_all_values()
+        t0 = time.perf_counter()
+        assignment_id = f"{reader_id}_{i + 1:03d}"
+        ws.append_row_or_defer([time.strftime("%Y-%m-%d %H:%M:%S"), "bench", reader_id, assignment_id, "X", "1.00"], tag=assignment_id)
+        with lock:
+            latencies.append(time.perf_counter() - t0)
+        time.sleep(think_s)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--cases", type=int, default=25)
+    parser.add_argument("--think_ms", type=float, default=0.0, help="Pause between cases per reader.")
+    parser.add_argument("--latency_ms", type=float, default=100.0)
+    parser.add_argument("--jitter_ms", type=float, default=50.0)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--quota_per_minute", type=int, default=60, help="Emulated read and write limit; 0 disables it.")
+    parser.add_argument("--budget_per_minute", type=int, default=50, help="Gateway read and write budget.")
+    parser.add_argument("--max_wait", type=float, default=3.0, help="Gateway wait for a budget slot before deferring.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", default=":memory:", help="Emulator store; a file keeps the rows for inspection.")
+    parser.add_argument("--flush_timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    client = connect(EmulatorSettings(
+        path=args.db,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        reads_per_minute=args.quota_per_minute,
+        writes_per_minute=args.quota_per_minute,
+        seed=args.seed,
+    ))
+    gateway = SheetsGateway(
+        reads_per_minute=args.budget_per_minute, writes_per_minute=args.budget_per_minute, max_wait=args.max_wait
+    )
+    # Setup goes through the gateway too, so injected errors and the quota are retried here as well.
+    spreadsheet = gateway.call("read", client.open, f"bench_{args.seed}")
+    worksheets = {}
+    for r in range(args.readers):
+        reader_id = f"reader_{r + 1}"
+        raw = gateway.call("write", spreadsheet.add_worksheet, title=f"{reader_id}_{time.time_ns()}", rows=1000, cols=len(HEADER))
+        gateway.call("write", raw.append_row, HEADER)
+        worksheets[reader_id] = gateway.worksheet(raw.title, lambda raw=raw: raw)
+
+    latencies, lock = [], threading.Lock()
+    t0 = time.perf_counter()
+    threads = [
+        threading.Thread(target=run_reader, args=(gateway, ws, reader_id, args.cases, args.think_ms / 1000.0, latencies, lock))
+        for reader_id, ws in worksheets.items()
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    deadline = time.monotonic() + args.flush_timeout
+    while gateway.stats()["pending_rows"] and time.monotonic() < deadline:
+        gateway.flush_deferred()
+        time.sleep(0.5)
+    drained = time.perf_counter() - t0
+
+    expected = args.cases
+    complete = all(len(ws.worksheet._values()) - 1 == expected for ws in worksheets.values())
+    latencies.sort()
+    saves = len(latencies)
+    print(f"readers={args.readers} cases={args.cases} saves={saves} wall={wall:.2f}s ({saves / wall:.2f} saves/s)")
+    print(
+        f"save latency p50={statistics.median(latencies) * 1000:.0f}ms "
+        f"p95={latencies[int(0.95 * (saves - 1))] * 1000:.0f}ms max={latencies[-1] * 1000:.0f}ms"
+    )
+    print(f"all rows in sheet: {complete} (drained after {drained:.2f}s)")
+    print("gateway:", json.dumps(gateway.stats()))
+    print("emulator:", json.dumps(client.stats()))
+    sys.exit(0 if complete else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Build the reader-facing blinded image bundles from survey_manifests/professor_N_image_copy_plan.csv.
+
+Every source image is sanitized once (image_sanitize.py: metadata stripped, lossless PNG
+re-encode, pixel identity verified) in a process pool and written to
+<output_dir>/<reader_id>/<blinded_filename>. Images shared by two readers
+(cross-validation duplicates) are encoded once and written to both bundles.
+
+Two coordinator-only reports are written next to the manifests, never into a bundle,
+because they map blinded filenames back to generator folders:
+- <report_prefix>_files.csv       one row per bundle file
+- <report_prefix>_by_folder.csv   size savings and metadata found per generator folder
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from image_sanitize import sanitize_image  # noqa: E402
+
+VALID_EXTS = {".png", ".jpg", ".jpeg", ".webp"}
+
+
+def find_source(root: str, relpath: str):
+    """Exact path, then same stem with another extension / letter case (P006.png vs P006.jpg)."""
+    path = os.path.join(root, relpath)
+    if os.path.isfile(path):
+        return path
+    folder, name = os.path.split(path)
+    if not os.path.isdir(folder):
+        return None
+    stem = os.path.splitext(name)[0].lower()
+    for f in sorted(os.listdir(folder)):
+        fstem, fext = os.path.splitext(f)
+        if fstem.lower() == stem and fext.lower() in VALID_EXTS:
+            return os.path.join(folder, f)
+    return None
+
+
+def sanitize_to(task):
+    """Worker: sanitize one source and write it to every bundle path that uses it."""
+    source_path, out_paths, compress_level = task
+    try:
+        with open(source_path, "rb") as f:
+            data = f.read()
+        png, details = sanitize_image(data, compress_level=compress_level)
+    except Exception as e:
+        return source_path, None, str(e)
+    for out_path in out_paths:
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        tmp_path = f"{out_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, out_path)
+    details.update({"source_bytes": len(data), "output_bytes": len(png)})
+    return source_path, details, ""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=".", help="Image root that image_relpath in the copy plans is relative to.")
+    parser.add_argument("--manifest_dir", default="survey_manifests")
+    parser.add_argument("--output_dir", default="blinded_bundles")
+    parser.add_argument("--report_prefix", default="survey_manifests/blinded_bundle_report")
+    parser.add_argument("--compress_level", type=int, default=9)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    plans = sorted(glob.glob(os.path.join(args.manifest_dir, "*_image_copy_plan.csv")))
+    if not plans:
+        raise FileNotFoundError(f"No *_image_copy_plan.csv found in {args.manifest_dir}")
+
+    rows = []
+    for plan in plans:
+        reader_id = os.path.basename(plan).replace("_image_copy_plan.csv", "")
+        df = pd.read_csv(plan, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        for r in df.to_dict("records"):
+            relpath = (r.get("image_relpath") or r.get("image_path") or "").replace("\\", "/")
+            rows.append({
+                "reader_id": reader_id,
+                "assignment_id": r.get("assignment_id", ""),
+                "blinded_filename": r["blinded_filename"],
+                "image_relpath": relpath,
+                "folder": relpath.split("/")[0] if "/" in relpath else "",
+                "source_path": find_source(args.root, relpath) or "",
+                "bundle_path": os.path.join(args.output_dir, reader_id, r["blinded_filename"]),
+            })
+
+    missing = [r for r in rows if not r["source_path"]]
+    targets = {}
+    for r in rows:
+        if r["source_path"]:
+            targets.setdefault(r["source_path"], []).append(r["bundle_path"])
+    tasks = [(src, outs, args.compress_level) for src, outs in targets.items()]
+    print(f"{len(rows)} bundle files from {len(plans)} copy plans; {len(tasks)} unique sources; {len(missing)} missing")
+
+    t0 = time.perf_counter()
+    details, failed = {}, []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for src, info, error in pool.map(sanitize_to, tasks, chunksize=4):
+            if info is None:
+                failed.append((src, error))
+            else:
+                details[src] = info
+
+    files = pd.DataFrame([{**r, **details.get(r["source_path"], {})} for r in rows])
+    files["status"] = "ok"
+    files.loc[files["source_path"] == "", "status"] = "missing_source"
+    files.loc[files["source_path"].isin([src for src, _ in failed]), "status"] = "failed"
+
+    ok = files[files["status"] == "ok"].drop_duplicates("source_path")
+    by_folder = ok.groupby("folder").agg(
+        n_images=("source_path", "size"),
+        source_mb=("source_bytes", lambda s: s.sum() / 1e6),
+        output_mb=("output_bytes", lambda s: s.sum() / 1e6),
+        n_with_metadata=("removed_metadata", lambda s: int((s != "").sum())),
+        n_collapsed_to_gray=("collapsed_to_gray", "sum"),
+    ).reset_index()
+    by_folder["saved_pct"] = 100.0 * (1.0 - by_folder["output_mb"] / by_folder["source_mb"])
+
+    Path(args.report_prefix).parent.mkdir(parents=True, exist_ok=True)
+    files.to_csv(f"{args.report_prefix}_files.csv", index=False, encoding="utf-8-sig")
+    by_folder.to_csv(f"{args.report_prefix}_by_folder.csv", index=False, encoding="utf-8-sig")
+
+    print(f"Sanitized {len(details)} sources into {args.output_dir} in {time.perf_counter() - t0:.1f}s")
+    print(by_folder.round(2).to_string(index=False))
+    for src, error in failed[:10]:
+        print(f"WARNING: {src}: {error}")
+    for r in missing[:10]:
+        print(f"WARNING: source not found for {r['reader_id']}/{r['blinded_filename']} ({r['image_relpath']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Build an image pack (image_pack.py) from the study manifests.
+
+Image IDs are taken from the study index (scripts/build_study_index.py): every generated
+image, rater-set image and cross-eval image. --include_dirs adds whole folders (e.g.
+mimic_451, images) by relative path. Manifest paths that point to a .png while the file on
+disk is .jpg (or differs in case) are packed under the manifest ID.
+
+Deploy by copying the .pack and .pack.idx files and setting M2SMF_IMAGE_PACK to the .pack
+path for app.py / app_survey2.py.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from image_pack import build_pack  # noqa: E402
+from study_index import StudyIndex, image_key  # noqa: E402
+
+VALID_EXTS = {".png", ".jpg", ".jpeg", ".webp"}
+
+
+def find_file(root: str, key: str):
+    """Exact path, then same stem with another extension / letter case in the same folder."""
+    path = os.path.join(root, key)
+    if os.path.isfile(path):
+        return path
+    folder, name = os.path.split(path)
+    if not os.path.isdir(folder):
+        return None
+    stem = os.path.splitext(name)[0].lower()
+    for f in sorted(os.listdir(folder)):
+        fstem, fext = os.path.splitext(f)
+        if fstem.lower() == stem and fext.lower() in VALID_EXTS:
+            return os.path.join(folder, f)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--study_index", default="study_index.sqlite")
+    parser.add_argument("--include_dirs", nargs="*", default=[], help="Extra folders (relative to --root) to pack entirely.")
+    parser.add_argument("--output", default="image_packs/study.pack")
+    parser.add_argument("--workers", type=int, default=min(16, (os.cpu_count() or 4) * 2))
+    args = parser.parse_args()
+
+    if not os.path.exists(args.study_index):
+        raise FileNotFoundError(f"{args.study_index} not found. Run scripts/build_study_index.py first.")
+    index = StudyIndex(args.study_index)
+    keys = [row["image_key"] for row in index.query("SELECT image_key FROM images WHERE image_key != ''")]
+    index.close()
+
+    for folder in args.include_dirs:
+        for dirpath, _, filenames in os.walk(os.path.join(args.root, folder)):
+            for fname in filenames:
+                if os.path.splitext(fname)[1].lower() in VALID_EXTS:
+                    keys.append(image_key(os.path.relpath(os.path.join(dirpath, fname), args.root)))
+
+    items = []
+    missing = []
+    for key in sorted(set(keys)):
+        path = find_file(args.root, key)
+        if path is None:
+            missing.append(key)
+        else:
+            items.append((key, path))
+
+    t0 = time.perf_counter()
+    entries = build_pack(items, args.output, workers=args.workers)
+    elapsed = time.perf_counter() - t0
+    total = sum(e.length for e in entries)
+
+    print(f"Packed {len(entries)} images ({total / 1e6:.1f} MB) into {args.output} in {elapsed:.1f}s")
+    if missing:
+        print(f"WARNING: {len(missing)} manifest images not found, e.g. {missing[:5]}")
+
+
+if __name__ == "__main__":
+    main()
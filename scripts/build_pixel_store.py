@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Build or incrementally update the downsampled pixel store (pixel_store.py) used by the
+corpus-level analysis scripts.
+
+Only new or changed files (by mtime/size) are decoded; run it again after adding images.
+Example:
+
+    python scripts/build_pixel_store.py --size 256 --study_index study_index.sqlite
+
+    from pixel_store import open_pixel_store
+    pixels, index = open_pixel_store("pixel_store")
+    gpt_mean = pixels[index.loc[index.generator == "gpt", "row"].to_numpy()].mean()
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pixel_store import DEFAULT_FOLDERS, update_pixel_store  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--store_dir", default="pixel_store")
+    parser.add_argument("--size", type=int, default=256, help="Tensor height and width in pixels.")
+    parser.add_argument("--folders", nargs="+", default=DEFAULT_FOLDERS)
+    parser.add_argument("--study_index", default="study_index.sqlite", help="Used for generator/prompt_id/readers columns if present.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--full", action="store_true", help="Decode every image again instead of reusing unchanged rows.")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    report = update_pixel_store(
+        args.root,
+        args.store_dir,
+        size=(args.size, args.size),
+        folders=args.folders,
+        study_index_path=args.study_index,
+        workers=args.workers,
+        full=args.full,
+    )
+    print(f"Pixel store {args.store_dir}: {report['images']} images "
+          f"({report['decoded']} decoded, {report['reused']} reused, {report['removed']} removed) "
+          f"in {time.perf_counter() - t0:.1f}s")
+    if report["failed"]:
+        print(f"WARNING: {len(report['failed'])} files could not be decoded, e.g. {report['failed'][:5]}")
+
+
+if __name__ == "__main__":
+    main()
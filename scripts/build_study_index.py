@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Compile the study CSVs (prompt input, generation manifest, hidden assignment, copy plans,
+worklists, rater-set manifests and the Yang cross-eval manifest) into one SQLite index.
+
+app.py reads its assignment from the index when it exists and is up to date with the
+CSVs; otherwise it falls back to the hidden assignment CSV. Rebuild after any manifest
+changes. Query it with study_index.StudyIndex or plain sqlite3, e.g.
+
+    sqlite3 study_index.sqlite "SELECT model_key, COUNT(*) FROM assignment_rows GROUP BY model_key"
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from study_index import build_study_index  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=".", help="Study root containing the manifests and image folders.")
+    parser.add_argument("--db_path", default="study_index.sqlite")
+    args = parser.parse_args()
+
+    report = build_study_index(args.root, args.db_path)
+    print("Wrote study index to:", args.db_path)
+    for table, n in report["counts"].items():
+        print(f"  {table}: {n}")
+    for warning in report["warnings"]:
+        print("WARNING:", warning)
+
+
+if __name__ == "__main__":
+    main()
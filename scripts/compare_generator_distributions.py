@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Distribution distances between each generator folder and the real mimic_451 set.
+
+Images are streamed in batches from the pixel store (scripts/build_pixel_store.py). Each
+image is reduced to three CPU-only descriptor families:
+- hist       32-bin intensity histogram
+- spectrum   radially averaged log power spectrum (32 radial bins)
+- gradient   16-bin gradient-orientation histogram, magnitude weighted
+
+For every group and family (and all families concatenated), the report gives a Fréchet
+distance (Gaussian fit, as in FID) and an RBF-kernel MMD², each with a bootstrap 95% CI.
+Descriptors are standardized with the reference set's mean/std first (near-constant
+reference bins get a floored std). MMD² replicates leave out pairs that resample the same
+image twice, as the unbiased estimate leaves out the diagonal; otherwise duplicates would
+enter as k=1 self-pairs and push the CI upward.
+
+Format confound: the store's tensors come from 1024² PNGs (gpt, gemini, sana) and 512²
+JPEGs (roentgen sets, mimic_451) through different downsampling paths, so spectrum and
+gradient descriptors partly separate file format and source size rather than the images.
+The report's source_format / reference_source_format columns record the sources, and
+format_confounded flags groups whose sources differ from the reference. For comparable
+numbers, build the store from normalized images (scripts/normalize_images.py, then
+scripts/build_pixel_store.py --root <normalized version dir>) and pass it as --store_dir.
+
+Groups run in parallel, one process each. Descriptors are cached per group under
+--cache_dir, keyed by a hash of the group's pixel rows, so adding or changing one generator
+folder recomputes only that folder.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pixel_store import PIXELS_FILE, open_pixel_store  # noqa: E402
+
+DESCRIPTOR_VERSION = "v1"
+HIST_BINS = 32
+SPECTRUM_BINS = 32
+ORIENTATION_BINS = 16
+FAMILIES = {
+    "hist": slice(0, HIST_BINS),
+    "spectrum": slice(HIST_BINS, HIST_BINS + SPECTRUM_BINS),
+    "gradient": slice(HIST_BINS + SPECTRUM_BINS, HIST_BINS + SPECTRUM_BINS + ORIENTATION_BINS),
+    "all": slice(0, HIST_BINS + SPECTRUM_BINS + ORIENTATION_BINS),
+}
+
+
+def batch_descriptors(pixels: np.ndarray) -> np.ndarray:
+    """(batch, height, width) uint8 -> (batch, HIST_BINS + SPECTRUM_BINS + ORIENTATION_BINS) float64."""
+    x = pixels.astype(np.float32) / 255.0
+    b, h, w = x.shape
+
+    idx = np.minimum((x.reshape(b, -1) * HIST_BINS).astype(np.int64), HIST_BINS - 1)
+    hist = np.zeros((b, HIST_BINS))
+    np.add.at(hist, (np.repeat(np.arange(b), h * w), idx.ravel()), 1.0)
+    hist /= h * w
+
+    power = np.abs(np.fft.rfft2(x - x.mean(axis=(1, 2), keepdims=True))) ** 2
+    fy = np.fft.fftfreq(h)[:, None]
+    fx = np.fft.rfftfreq(w)[None, :]
+    radius = np.sqrt(fx ** 2 + fy ** 2) / 0.5
+    ring = np.minimum((radius * SPECTRUM_BINS).astype(np.int64), SPECTRUM_BINS - 1).ravel()
+    counts = np.bincount(ring, minlength=SPECTRUM_BINS)
+    spectrum = np.stack([np.bincount(ring, weights=p, minlength=SPECTRUM_BINS) for p in power.reshape(b, -1)])
+    spectrum = np.log1p(spectrum / np.maximum(counts, 1))
+
+    gy = x[:, 2:, 1:-1] - x[:, :-2, 1:-1]
+    gx = x[:, 1:-1, 2:] - x[:, 1:-1, :-2]
+    magnitude = np.sqrt(gx ** 2 + gy ** 2).reshape(b, -1)
+    # Unsigned orientation in [0, pi): edges of opposite polarity share a bin.
+    angle = np.mod(np.arctan2(gy, gx), np.pi).reshape(b, -1)
+    obin = np.minimum((angle / np.pi * ORIENTATION_BINS).astype(np.int64), ORIENTATION_BINS - 1)
+    orient = np.zeros((b, ORIENTATION_BINS))
+    np.add.at(orient, (np.repeat(np.arange(b), obin.shape[1]), obin.ravel()), magnitude.ravel())
+    orient /= np.maximum(orient.sum(axis=1, keepdims=True), 1e-12)
+
+    return np.concatenate([hist, spectrum, orient], axis=1)
+
+
+def group_hash(pixels: np.ndarray, rows: np.ndarray) -> str:
+    h = hashlib.sha1(f"{DESCRIPTOR_VERSION}:{pixels.shape[1:]}".encode())
+    for r in rows:
+        h.update(pixels[r].tobytes())
+    return h.hexdigest()[:16]
+
+
+def group_descriptors(store_dir: str, name: str, rows: np.ndarray, cache_dir: str, batch_size: int) -> np.ndarray:
+    pixels = np.load(os.path.join(store_dir, PIXELS_FILE), mmap_mode="r")
+    cache_path = os.path.join(cache_dir, f"{name}_{group_hash(pixels, rows)}.npy")
+    if os.path.exists(cache_path):
+        return np.load(cache_path)
+    parts = [batch_descriptors(np.asarray(pixels[rows[i:i + batch_size]])) for i in range(0, len(rows), batch_size)]
+    desc = np.concatenate(parts) if parts else np.zeros((0, FAMILIES["all"].stop))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp-{os.getpid()}.npy"
+    np.save(tmp_path, desc)
+    os.replace(tmp_path, cache_path)
+    return desc
+
+
+def _sqrt_psd(m: np.ndarray) -> np.ndarray:
+    vals, vecs = np.linalg.eigh((m + m.T) / 2.0)
+    return (vecs * np.sqrt(np.clip(vals, 0.0, None))) @ vecs.T
+
+
+def frechet_distance(a: np.ndarray, b: np.ndarray) -> float:
+    mu_a, mu_b = a.mean(axis=0), b.mean(axis=0)
+    cov_a = np.atleast_2d(np.cov(a, rowvar=False))
+    cov_b = np.atleast_2d(np.cov(b, rowvar=False))
+    # Tr(sqrt(A B)) = Tr(sqrt(sqrt(A) B sqrt(A))) for PSD A, B.
+    root_a = _sqrt_psd(cov_a)
+    cross = np.trace(_sqrt_psd(root_a @ cov_b @ root_a))
+    return float(np.sum((mu_a - mu_b) ** 2) + np.trace(cov_a) + np.trace(cov_b) - 2.0 * cross)
+
+
+def rbf_kernel(x: np.ndarray, y: np.ndarray, gamma: float) -> np.ndarray:
+    d = (x * x).sum(1)[:, None] + (y * y).sum(1)[None, :] - 2.0 * x @ y.T
+    return np.exp(-gamma * np.maximum(d, 0.0))
+
+
+def _within_mean(k: np.ndarray, idx: np.ndarray) -> float:
+    """Mean of k over pairs of idx that are different images (not just different positions)."""
+    distinct = idx[:, None] != idx[None, :]
+    return float(k[np.ix_(idx, idx)][distinct].sum() / max(distinct.sum(), 1))
+
+
+def mmd2(
+    kaa: np.ndarray, kbb: np.ndarray, kab: np.ndarray, ia: Optional[np.ndarray] = None, ib: Optional[np.ndarray] = None
+) -> float:
+    """
+    Unbiased RBF-kernel MMD² from precomputed kernel matrices, on all rows or on (bootstrap)
+    row indices ia / ib.
+    """
+    ia = np.arange(len(kaa)) if ia is None else ia
+    ib = np.arange(len(kbb)) if ib is None else ib
+    return _within_mean(kaa, ia) + _within_mean(kbb, ib) - 2.0 * float(kab[np.ix_(ia, ib)].mean())
+
+
+def median_gamma(ref: np.ndarray) -> float:
+    d = (ref * ref).sum(1)[:, None] + (ref * ref).sum(1)[None, :] - 2.0 * ref @ ref.T
+    med = np.median(d[np.triu_indices(len(ref), k=1)])
+    return 1.0 / max(med, 1e-12)
+
+
+def compare_group(task: Tuple) -> List[dict]:
+    store_dir, name, rows, ref_desc, cache_dir, batch_size, n_boot, seed, formats = task
+    desc = group_descriptors(store_dir, name, rows, cache_dir, batch_size)
+    mean = ref_desc.mean(axis=0)
+    std = ref_desc.std(axis=0)
+    # Bins that are (almost) constant in the reference, e.g. empty histogram bins, would
+    # otherwise blow up; floor them at a tenth of the typical reference spread.
+    std = np.maximum(std, 0.1 * np.median(std) + 1e-12)
+    g, r = (desc - mean) / std, (ref_desc - mean) / std
+    rng = np.random.default_rng(seed)
+    boots = [(rng.integers(0, len(g), len(g)), rng.integers(0, len(r), len(r))) for _ in range(n_boot)]
+
+    out = []
+    for family, cols in FAMILIES.items():
+        gf, rf = g[:, cols], r[:, cols]
+        gamma = median_gamma(rf)
+        kernels = rbf_kernel(gf, gf, gamma), rbf_kernel(rf, rf, gamma), rbf_kernel(gf, rf, gamma)
+        row = {"group": name, "n_images": len(gf), "n_reference": len(rf), "descriptor": family, **formats}
+        metrics = (
+            ("frechet", frechet_distance(gf, rf), [frechet_distance(gf[bi], rf[bj]) for bi, bj in boots]),
+            ("mmd2", mmd2(*kernels), [mmd2(*kernels, bi, bj) for bi, bj in boots]),
+        )
+        for metric, value, samples in metrics:
+            row[metric] = value
+            row[f"{metric}_ci_low"], row[f"{metric}_ci_high"] = (
+                np.percentile(samples, [2.5, 97.5]) if samples else (np.nan, np.nan)
+            )
+        out.append(row)
+    return out
+
+
+def source_formats(index: pd.DataFrame) -> str:
+    """E.g. "jpg 512x512" or "png 1024x1024", several joined by "; " for mixed groups."""
+    ext = index["image_id"].str.rsplit(".", n=1).str[-1].str.lower()
+    fmt = ext + " " + index["orig_width"].astype(str) + "x" + index["orig_height"].astype(str)
+    return "; ".join(sorted(fmt.unique()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store_dir", default="pixel_store")
+    parser.add_argument("--reference", default="mimic_451")
+    parser.add_argument("--groups", nargs="*", default=None, help="Generator values to compare (default: all except the reference).")
+    parser.add_argument("--cache_dir", default="outputs/distribution_cache")
+    parser.add_argument("--output_csv", default="outputs/generator_distribution_distances.csv")
+    parser.add_argument("--n_boot", type=int, default=200)
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=20260515)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    _, index = open_pixel_store(args.store_dir)
+    # Rater-set folders hold copies of roentgen images; count each file once, in its own folder.
+    index = index[index["reader_folder"] == ""]
+    rows_by_group: Dict[str, np.ndarray] = {
+        name: grp["row"].to_numpy() for name, grp in index.groupby("generator", sort=True)
+    }
+    format_by_group = {name: source_formats(grp) for name, grp in index.groupby("generator", sort=True)}
+    if args.reference not in rows_by_group:
+        raise RuntimeError(f"Reference group {args.reference!r} not in the pixel store.")
+    groups = args.groups or [g for g in rows_by_group if g != args.reference]
+    missing = [g for g in groups if g not in rows_by_group]
+    if missing:
+        raise RuntimeError(f"Groups not in the pixel store: {missing}")
+
+    ref_desc = group_descriptors(args.store_dir, args.reference, rows_by_group[args.reference], args.cache_dir, args.batch_size)
+    ref_format = format_by_group[args.reference]
+    tasks = [
+        (
+            args.store_dir, g, rows_by_group[g], ref_desc, args.cache_dir, args.batch_size, args.n_boot, args.seed,
+            {
+                "source_format": format_by_group[g],
+                "reference_source_format": ref_format,
+                "format_confounded": format_by_group[g] != ref_format,
+            },
+        )
+        for g in groups
+    ]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = [row for rows in pool.map(compare_group, tasks) for row in rows]
+
+    report = pd.DataFrame(results)
+    out_path = Path(args.output_csv)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(out_path, index=False, encoding="utf-8-sig")
+
+    print(f"Wrote {out_path} in {time.perf_counter() - t0:.1f}s")
+    summary = report[report["descriptor"] == "all"][["group", "n_images", "frechet", "frechet_ci_low", "frechet_ci_high", "mmd2"]]
+    print(summary.round(3).to_string(index=False))
+    confounded = [g for g in groups if format_by_group[g] != ref_format]
+    if confounded:
+        print(
+            f"WARNING: {', '.join(confounded)} differ from {args.reference} in source format/size ({ref_format}); "
+            "their spectrum/gradient distances partly measure the format. Use a store built from normalized images."
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Compact and export app.py local result journals (local_survey_results/*.ndjson)
+into the local result CSV format (<STUDY_ID>_<reader_id>[_compact].csv).
+
+Rows already present in an existing CSV (written by app.py before the journal existed,
+or by an earlier export) are kept; each (study_id, reader_id, assignment_id) is exported
+once, first occurrence wins.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import glob
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from result_journal import compact_journal, export_csv, read_journal  # noqa: E402
+
+KEY_COLS = ["study_id", "reader_id", "assignment_id"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--local_dir", default="local_survey_results")
+    parser.add_argument("--compact", action="store_true", help="Rewrite each journal in place without repeated tokens first.")
+    args = parser.parse_args()
+
+    journals = sorted(glob.glob(os.path.join(args.local_dir, "*.ndjson")))
+    if not journals:
+        print("No journals found in", args.local_dir)
+        return
+
+    for journal in journals:
+        if args.compact:
+            n_in, n_out = compact_journal(journal)
+            print(f"Compacted {journal}: {n_in} -> {n_out} records")
+
+        csv_path = os.path.splitext(journal)[0] + ".csv"
+        records = []
+        if os.path.exists(csv_path):
+            with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+                records += [{"row": row} for row in csv.DictReader(f)]
+        records += list(read_journal(journal))
+
+        seen = set()
+        unique = []
+        for record in records:
+            key = tuple(record["row"].get(c, "") for c in KEY_COLS)
+            if key in seen:
+                continue
+            seen.add(key)
+            unique.append(record)
+
+        n = export_csv(unique, csv_path)
+        print(f"Exported {n} rows to {csv_path}")
+
+
+if __name__ == "__main__":
+    main()
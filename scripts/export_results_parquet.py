@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Export all survey results into one partitioned Parquet dataset (results_dataset.py).
+
+Sources:
+- sheet (default): every worksheet of SHEET_NAME with one worksheets() metadata call and
+  one values batch_get, using the same credentials as scripts/reconcile_survey_results.py
+  (or --emulator for the local Sheets emulator),
+- local: app.py's local journals and CSVs in --local_dir.
+
+Rows are normalized (OXN codes, float time_spent_sec, int reader_sequence, timestamps) and
+only rows whose (study_id, reader_id, assignment_id) is not in the dataset yet are written,
+so a refresh is two API calls and a small append. --rebuild writes the dataset from scratch.
+
+    python scripts/export_results_parquet.py --output_dir outputs/survey_results
+    python scripts/export_results_parquet.py --source local --output_dir outputs/survey_results_local
+    python scripts/analyze_external_qa_survey_agreement.py --survey_results outputs/survey_results
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import glob
+import json
+import os
+import shutil
+import sys
+import tomllib
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from result_journal import read_journal  # noqa: E402
+from results_dataset import append_results, normalize_results  # noqa: E402
+from sheets_emulator import EmulatorSettings, connect  # noqa: E402
+
+SHEET_NAME = "M2SMF_survey"
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+def open_spreadsheet(args):
+    if args.emulator:
+        return connect(EmulatorSettings(path=args.emulator)).open(args.sheet_name)
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    if args.service_account_json:
+        with open(args.service_account_json, "r", encoding="utf-8") as f:
+            creds_dict = json.load(f)
+    else:
+        with open(args.secrets_toml, "rb") as f:
+            secrets = tomllib.load(f)
+        if "gcp_service_account" not in secrets:
+            raise RuntimeError(f"{args.secrets_toml} has no [gcp_service_account] table.")
+        creds_dict = dict(secrets["gcp_service_account"])
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
+    return gspread.authorize(creds).open(args.sheet_name)
+
+
+def frame(header: List[str], rows: List[List[str]]) -> pd.DataFrame:
+    rows = [r + [""] * (len(header) - len(r)) for r in rows if any(str(c).strip() for c in r)]
+    return pd.DataFrame([r[:len(header)] for r in rows], columns=header, dtype="object")
+
+
+def read_sheet_frames(spreadsheet) -> List[pd.DataFrame]:
+    worksheets = spreadsheet.worksheets()
+    ranges = ["'" + ws.title.replace("'", "''") + "'" for ws in worksheets]
+    response = spreadsheet.values_batch_get(ranges) if ranges else {"valueRanges": []}
+    frames = []
+    for ws, value_range in zip(worksheets, response.get("valueRanges", [])):
+        values = value_range.get("values", [])
+        if len(values) > 1 and "assignment_id" in values[0]:
+            frames.append(frame(values[0], values[1:]))
+            print(f"sheet {ws.title}: {len(values) - 1} rows")
+        elif values:
+            print(f"sheet {ws.title}: skipped (no assignment_id column)")
+    return frames
+
+
+def read_local_frames(local_dir: str) -> List[pd.DataFrame]:
+    frames = []
+    for path in sorted(glob.glob(os.path.join(local_dir, "*.*"))):
+        if path.endswith(".ndjson"):
+            records = [r["row"] for r in read_journal(path)]
+            df = pd.DataFrame(records, dtype="object") if records else None
+        elif path.endswith(".csv"):
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                rows = list(csv.reader(f))
+            df = frame(rows[0], rows[1:]) if len(rows) > 1 else None
+        else:
+            continue
+        if df is not None and "assignment_id" in df.columns:
+            frames.append(df)
+            print(f"local {os.path.basename(path)}: {len(df)} rows")
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", choices=["sheet", "local"], default="sheet")
+    parser.add_argument("--output_dir", default="outputs/survey_results")
+    parser.add_argument("--rebuild", action="store_true", help="Replace the dataset instead of appending new rows.")
+    parser.add_argument("--local_dir", default="local_survey_results")
+    parser.add_argument("--sheet_name", default=SHEET_NAME)
+    parser.add_argument("--secrets_toml", default=".streamlit/secrets.toml")
+    parser.add_argument("--service_account_json", default="", help="Service-account key file; overrides --secrets_toml.")
+    parser.add_argument("--emulator", default="", help="SQLite store of the local Sheets emulator; overrides credentials.")
+    args = parser.parse_args()
+
+    frames = read_sheet_frames(open_spreadsheet(args)) if args.source == "sheet" else read_local_frames(args.local_dir)
+    if not frames:
+        print("No result rows found.")
+        return
+    results = normalize_results(pd.concat(frames, ignore_index=True))
+
+    target = args.output_dir
+    if args.rebuild:
+        target = args.output_dir.rstrip("/\\") + ".rebuild"
+        shutil.rmtree(target, ignore_errors=True)
+    written = append_results(results, target)
+    if args.rebuild:
+        shutil.rmtree(args.output_dir, ignore_errors=True)
+        if os.path.isdir(target):
+            os.replace(target, args.output_dir)
+
+    for path, n in written:
+        print(f"Wrote {n} rows to {os.path.join(args.output_dir, os.path.relpath(path, target))}")
+    print(f"{sum(n for _, n in written)} new rows of {len(results)} exported to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
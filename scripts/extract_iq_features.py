@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+No-reference image quality features for every image in the pixel store
+(scripts/build_pixel_store.py): generator folders, roentgen sets, mimic_451 and rater sets.
+
+Texture features (laplacian_var, noise_sigma, hf_energy_ratio) are computed on the native
+pixels of each source file by default. The store's 256² tensors are not comparable for
+these: 1024² PNGs reach them through a 4x bilinear resize and 512² JPEGs through the JPEG
+decoder's draft scaling plus 2x, so on the store they partly measure the file format and
+source size rather than the image. --texture_source store uses the tensors anyway (much
+faster); the output's texture_source column records which was used. Native values are still
+per source pixel, so compare them within one orig_width/orig_height.
+
+Features (CPU only):
+- laplacian_var      variance of the 4-neighbour Laplacian (sharpness)
+- noise_sigma        Immerkaer fast noise estimate
+- hist_entropy       Shannon entropy of the 256-bin intensity histogram (bits)
+- dynamic_range      p99 - p1 intensity; also mean_intensity / std_intensity
+- border_*_px        rows/columns at each edge that are flat (std < 2) and near black or white,
+                     border_fraction = flat border area / image area (crop/FOV padding)
+- hf_energy_ratio    spectral energy above half Nyquist / total non-DC energy
+
+The histogram and border features use the store tensors. Batches of rows are processed
+vectorized with numpy in a process pool; each worker maps the store itself, so only row
+ranges (and, for native texture features, the rows' file paths) cross process boundaries.
+The output Parquet carries the store's index columns, including generated_image_id for
+joining to the hidden assignment.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from pixel_store import PIXELS_FILE, open_pixel_store  # noqa: E402
+
+TEXTURE_FEATURES = ["laplacian_var", "noise_sigma", "hf_energy_ratio"]
+FLAT_STD = 2.0
+DARK_MAX = 10
+BRIGHT_MIN = 245
+
+
+def _leading_true(mask: np.ndarray) -> np.ndarray:
+    """Count of leading True values along axis 1 of a (batch, n) mask."""
+    return np.cumprod(mask, axis=1, dtype=np.int32).sum(axis=1)
+
+
+def _flat_lines(x: np.ndarray, axis: int) -> np.ndarray:
+    """(batch, n) mask of rows (axis=2) or columns (axis=1) that are flat and near black/white."""
+    mean = x.mean(axis=axis)
+    std = x.std(axis=axis)
+    return (std < FLAT_STD) & ((mean <= DARK_MAX) | (mean >= BRIGHT_MIN))
+
+
+def texture_features(x: np.ndarray) -> Dict[str, np.ndarray]:
+    """TEXTURE_FEATURES for a (batch, height, width) float32 array."""
+    b, h, w = x.shape
+    out: Dict[str, np.ndarray] = {}
+
+    lap = x[:, :-2, 1:-1] + x[:, 2:, 1:-1] + x[:, 1:-1, :-2] + x[:, 1:-1, 2:] - 4.0 * x[:, 1:-1, 1:-1]
+    out["laplacian_var"] = lap.reshape(b, -1).var(axis=1)
+
+    # Immerkaer (1996): |I * [[1,-2,1],[-2,4,-2],[1,-2,1]]| summed, scaled to sigma.
+    c = x[:, 1:-1, 1:-1]
+    conv = (
+        4.0 * c
+        - 2.0 * (x[:, :-2, 1:-1] + x[:, 2:, 1:-1] + x[:, 1:-1, :-2] + x[:, 1:-1, 2:])
+        + (x[:, :-2, :-2] + x[:, :-2, 2:] + x[:, 2:, :-2] + x[:, 2:, 2:])
+    )
+    out["noise_sigma"] = np.abs(conv).reshape(b, -1).sum(axis=1) * np.sqrt(np.pi / 2.0) / (6.0 * (w - 2) * (h - 2))
+
+    power = np.abs(np.fft.rfft2(x - x.mean(axis=(1, 2), keepdims=True))) ** 2
+    fy = np.fft.fftfreq(h)[:, None]
+    fx = np.fft.rfftfreq(w)[None, :]
+    radius = np.sqrt(fx ** 2 + fy ** 2) / 0.5
+    total = power.reshape(b, -1).sum(axis=1)
+    high = power[:, radius > 0.5].sum(axis=1)
+    out["hf_energy_ratio"] = np.divide(high, total, out=np.zeros_like(high), where=total > 0)
+    return out
+
+
+def native_texture_features(paths: List[str]) -> Dict[str, np.ndarray]:
+    """TEXTURE_FEATURES on the full-resolution grayscale decode of each file (NaN if unreadable)."""
+    from PIL import Image
+
+    out = {k: np.full(len(paths), np.nan, dtype=np.float64) for k in TEXTURE_FEATURES}
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as img:
+                x = np.asarray(img.convert("L"), dtype=np.float32)[None]
+        except Exception:
+            continue
+        for k, v in texture_features(x).items():
+            out[k][i] = v[0]
+    return out
+
+
+def batch_features(pixels: np.ndarray, texture: bool = True) -> Dict[str, np.ndarray]:
+    """Features for a (batch, height, width) uint8 array; every value is a (batch,) array."""
+    x = pixels.astype(np.float32)
+    b, h, w = x.shape
+    out: Dict[str, np.ndarray] = texture_features(x) if texture else {}
+
+    offsets = (np.arange(b, dtype=np.int64) * 256)[:, None]
+    hist = np.bincount((pixels.reshape(b, -1).astype(np.int64) + offsets).ravel(), minlength=b * 256).reshape(b, 256)
+    p = hist / hist.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["hist_entropy"] = -np.where(p > 0, p * np.log2(p), 0.0).sum(axis=1)
+    cdf = np.cumsum(p, axis=1)
+    p1 = (cdf < 0.01).sum(axis=1)
+    p99 = (cdf < 0.99).sum(axis=1)
+    out["dynamic_range"] = (p99 - p1).astype(np.float32)
+    out["mean_intensity"] = x.reshape(b, -1).mean(axis=1)
+    out["std_intensity"] = x.reshape(b, -1).std(axis=1)
+
+    flat_rows = _flat_lines(x, axis=2)
+    flat_cols = _flat_lines(x, axis=1)
+    top = _leading_true(flat_rows)
+    bottom = _leading_true(flat_rows[:, ::-1])
+    left = _leading_true(flat_cols)
+    right = _leading_true(flat_cols[:, ::-1])
+    out["border_top_px"] = top
+    out["border_bottom_px"] = bottom
+    out["border_left_px"] = left
+    out["border_right_px"] = right
+    inner_h = np.clip(h - top - bottom, 0, h)
+    inner_w = np.clip(w - left - right, 0, w)
+    out["border_fraction"] = 1.0 - (inner_h * inner_w) / float(h * w)
+    return out
+
+
+def features_for_rows(task: Tuple[str, int, int, int, List[str]]) -> Dict[str, np.ndarray]:
+    """
+    Worker: map the store and compute features for rows [start, stop) in sub-batches. With
+    `paths` (one per row) the texture features come from the source files instead.
+    """
+    store_dir, start, stop, batch_size, paths = task
+    pixels = np.load(os.path.join(store_dir, PIXELS_FILE), mmap_mode="r")
+    parts = [
+        batch_features(np.asarray(pixels[i:min(i + batch_size, stop)]), texture=paths is None)
+        for i in range(start, stop, batch_size)
+    ]
+    out = {k: np.concatenate([part[k] for part in parts]) for k in parts[0]}
+    if paths is not None:
+        out.update(native_texture_features(paths))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store_dir", default="pixel_store")
+    parser.add_argument("--output", default="outputs/iq_features.parquet")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--root", default=".", help="Study root the store's image_id paths are relative to.")
+    parser.add_argument(
+        "--texture_source", choices=["native", "store"], default="native",
+        help="native: decode each source file at full resolution; store: use the 256² tensors (format-confounded).",
+    )
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    pixels, index = open_pixel_store(args.store_dir)
+    n = pixels.shape[0]
+    if n == 0 or index.empty:
+        print(f"Pixel store {args.store_dir} is empty; build it with scripts/build_pixel_store.py first.")
+        return
+    paths = None
+    if args.texture_source == "native":
+        by_row = index.sort_values("row")["image_id"]
+        paths = [os.path.join(args.root, image_id) for image_id in by_row]
+    chunk = max(args.batch_size, -(-n // max(1, args.workers * 4)))
+    tasks = [
+        (args.store_dir, s, min(s + chunk, n), args.batch_size, paths[s:min(s + chunk, n)] if paths else None)
+        for s in range(0, n, chunk)
+    ]
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(features_for_rows, tasks))
+    features = pd.DataFrame({k: np.concatenate([r[k] for r in results]) for k in results[0]})
+    features.insert(0, "row", np.arange(n))
+    features["texture_source"] = args.texture_source
+
+    out = index.merge(features, on="row", how="left", validate="one_to_one")
+    out_path = Path(args.output)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out.to_parquet(out_path, index=False)
+
+    print(f"Wrote {len(out)} rows x {features.shape[1] - 2} features to {out_path} in {time.perf_counter() - t0:.1f}s")
+    print(out.groupby("generator")[["laplacian_var", "noise_sigma", "hist_entropy", "border_fraction", "hf_energy_ratio"]]
+          .median().round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic M2SMF external QA study of arbitrary size for scale testing.
+
+Everything is written as a stream, row by row, so studies with millions of ratings
+never have to fit in memory. The output directory mirrors the real repository layout:
+
+- m2smf_external_prompt_<N>_input.csv       prompt CSV (id, annotated_prompt)
+- gpt/, gemini/, sana/, roentgen/           tiny grayscale placeholder PNGs
+- survey_manifests/M2SMF_external_QA_hidden_assignment.csv
+- local_survey_results/<STUDY_ID>_<reader>.csv   simulated ratings in the app.py schema
+
+Design (generalized from the 75 × 4 × 4 study):
+- Every prompt is rendered by every generator.
+- Every generated image gets one primary reader (rotating over readers).
+- A fraction of images (--duplicate_fraction) gets a second, different reader
+  as a cross-validation duplicate.
+- Each image has a latent artifact vector. A reader reports the latent value with
+  probability --agreement and a random different value otherwise, so the expected
+  inter-reader agreement on duplicates is controllable.
+
+Only --n_prompts 75 with the default generators and readers produces a prompt CSV that
+prepare_external_qa_survey_manifest.py accepts as-is; other sizes are meant for the apps
+and analyze_external_qa_survey_agreement.py.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import os
+import random
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+STUDY_ID = "M2SMF_External_Synthetic_CXR_Artifact_Checklist_300"
+APP_VERSION = "M2SMF_EXTERNAL_SYNTH_ARTIFACT_ONLY_v1.2"
+
+GENERATORS = [
+    {"model_key": "gemini", "generator_name": "Nano Banana", "folder": "gemini",
+     "model_version_or_identifier": "gemini-2.5-flash-image / Nano Banana"},
+    {"model_key": "sana", "generator_name": "Sana", "folder": "sana",
+     "model_version_or_identifier": "CheXGenBench Sana CXR generator"},
+    {"model_key": "gpt", "generator_name": "ChatGPT Images 2.0", "folder": "gpt",
+     "model_version_or_identifier": "ChatGPT Images 2.0"},
+    {"model_key": "roentgen", "generator_name": "RoentGen-v2", "folder": "roentgen",
+     "model_version_or_identifier": "RoentGen-v2"},
+]
+
+# Same prompt-number ranges as prepare_external_qa_survey_manifest.py; prompt numbers
+# beyond 75 wrap around so large studies keep the original category mix.
+CATEGORY_BY_RANGE = [
+    (1, 14, "No acute / normal", "No acute cardiopulmonary abnormality",
+     "No focal air-space opacity. No pleural effusion or pneumothorax. Normal cardiomediastinal silhouette.",
+     "No acute cardiopulmonary abnormality."),
+    (15, 26, "Pneumonia / opacity", "Pneumonia / air-space opacity",
+     "Patchy air-space opacity in the {side} lower lung zone. No pleural effusion or pneumothorax.",
+     "{Side} lower-lobe pneumonia."),
+    (27, 34, "Atelectasis / scarring", "Atelectasis / scarring",
+     "Linear atelectatic opacity at the {side} lung base. No pleural effusion or pneumothorax.",
+     "{Side} basilar atelectasis."),
+    (35, 42, "Pulmonary edema / vascular congestion", "Pulmonary edema / vascular congestion",
+     "Pulmonary vascular congestion with mild interstitial edema. No pneumothorax.",
+     "Mild pulmonary edema."),
+    (43, 50, "Pleural effusion", "Pleural effusion",
+     "Small {side} pleural effusion with mild adjacent atelectasis. No pneumothorax.",
+     "Small {side} pleural effusion."),
+    (51, 57, "Cardiomegaly", "Cardiomegaly",
+     "Enlargement of the cardiac silhouette. Lungs are clear. No pleural effusion or pneumothorax.",
+     "Cardiomegaly without acute pulmonary disease."),
+    (58, 61, "Pneumothorax", "Pneumothorax",
+     "Small {side} apical pneumothorax. No pleural effusion.",
+     "Small {side} apical pneumothorax."),
+    (62, 65, "Chronic lung disease / interstitial", "Chronic lung disease / interstitial change",
+     "Hyperinflation with flattened diaphragms. No focal consolidation.",
+     "Chronic lung disease without acute change."),
+    (66, 70, "Support device / postoperative hardware", "Support device / postoperative hardware",
+     "Left chest wall pacemaker with leads in expected position. No pneumothorax.",
+     "Support device without acute cardiopulmonary abnormality."),
+    (71, 75, "Mixed common findings", "Mixed common cardiopulmonary findings",
+     "Mild cardiomegaly, small bilateral pleural effusions, and bibasilar atelectatic opacities.",
+     "Cardiomegaly with small bilateral effusions and bibasilar atelectasis."),
+]
+
+LABEL_COLUMNS = [
+    "label_pneumonia_or_opacity",
+    "label_cardiomegaly",
+    "label_pleural_effusion",
+    "label_pneumothorax",
+    "label_edema",
+    "label_atelectasis",
+    "label_support_device",
+    "label_chronic_lung_disease",
+]
+LABEL_BY_CATEGORY = {
+    "Pneumonia / opacity": ["label_pneumonia_or_opacity"],
+    "Atelectasis / scarring": ["label_atelectasis"],
+    "Pulmonary edema / vascular congestion": ["label_edema"],
+    "Pleural effusion": ["label_pleural_effusion"],
+    "Cardiomegaly": ["label_cardiomegaly"],
+    "Pneumothorax": ["label_pneumothorax"],
+    "Chronic lung disease / interstitial": ["label_chronic_lung_disease"],
+    "Support device / postoperative hardware": ["label_support_device"],
+    "Mixed common findings": [
+        "label_pneumonia_or_opacity",
+        "label_cardiomegaly",
+        "label_pleural_effusion",
+        "label_atelectasis",
+    ],
+}
+
+# Column order of survey_manifests/M2SMF_external_QA_hidden_assignment.csv.
+HIDDEN_ASSIGNMENT_COLUMNS = [
+    "assignment_id", "reader_id", "reader_display", "reader_sequence", "blinded_image_id",
+    "blinded_filename", "case_hash", "prompt_id", "prompt_number", "generation_prompt",
+    "category", "disease_primary", "age", "sex", "severity", *LABEL_COLUMNS,
+    "model_key", "generator_name", "folder", "model_version_or_identifier",
+    "generated_image_id", "image_relpath", "image_path", "image_exists",
+    "cv_role", "is_cross_validation_duplicate", "blinding_note",
+]
+
+# Must match SHEET_HEADERS in app.py.
+ARTIFACT_HEADERS = [
+    "artifact_marker_OXN",
+    "artifact_density_OXN",
+    "artifact_gas_lucency_OXN",
+    "artifact_boundaries_OXN",
+    "artifact_anterior_ribs_OXN",
+    "artifact_wavy_clavicle_OXN",
+    "artifact_organ_shape_OXN",
+    "artifact_global_quality_fov_crop_OXN",
+]
+SHEET_HEADERS = [
+    "timestamp", "study_id", "app_version", "reader_id", "assignment_id", "reader_sequence",
+    "blinded_image_id", "blinded_filename", "case_hash",
+    "source_image_folder", "source_image_filename", "source_image_relpath", "source_image_path",
+    "generated_image_id", "prompt_id", "model_key", "generator_name", "cv_role",
+    "is_cross_validation_duplicate",
+    *ARTIFACT_HEADERS,
+    "time_spent_sec",
+]
+
+OXN_VALUES = ["X", "O", "N/A"]
+# Latent prevalence of X / O / N/A per artifact item.
+LATENT_WEIGHTS = [0.70, 0.25, 0.05]
+
+BLINDING_NOTE = "Reader-facing UI must not show generator, prompt, disease, age, sex, category, or cross-validation role."
+
+
+def category_for(prompt_number: int) -> Tuple[str, str, str, str]:
+    n = (prompt_number - 1) % 75 + 1
+    for lo, hi, category, disease, findings, impression in CATEGORY_BY_RANGE:
+        if lo <= n <= hi:
+            return category, disease, findings, impression
+    raise AssertionError(n)
+
+
+def prompt_id_for(prompt_number: int, width: int) -> str:
+    return f"P{prompt_number:0{width}d}"
+
+
+def iter_prompts(n_prompts: int, seed: int) -> Iterator[Dict[str, object]]:
+    rng = random.Random(seed)
+    width = max(3, len(str(n_prompts)))
+    for n in range(1, n_prompts + 1):
+        category, disease, findings, impression = category_for(n)
+        side = rng.choice(["right", "left"])
+        age = rng.randint(21, 89)
+        sex = rng.choice(["female", "male"])
+        text = (
+            f"{age}-year-old {sex}. PA frontal chest radiograph. Findings: "
+            f"{findings.format(side=side, Side=side.capitalize())} "
+            f"Impression: {impression.format(side=side, Side=side.capitalize())}"
+        )
+        labels = {c: 0 for c in LABEL_COLUMNS}
+        for c in LABEL_BY_CATEGORY.get(category, []):
+            labels[c] = 1
+        yield {
+            "prompt_id": prompt_id_for(n, width),
+            "prompt_number": n,
+            "generation_prompt": text,
+            "category": category,
+            "disease_primary": disease,
+            "age": age,
+            "sex": sex,
+            "severity": "",
+            **labels,
+        }
+
+
+def placeholder_png(size: int, level: int) -> bytes:
+    """Encode a flat 8-bit grayscale PNG without any imaging dependency."""
+    raw = (b"\x00" + bytes([level]) * size) * size
+    ihdr = struct.pack(">IIBBBBB", size, size, 8, 0, 0, 0, 0)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+def rate(latent: List[str], agreement: float, rng: random.Random) -> List[str]:
+    out = []
+    for v in latent:
+        if rng.random() < agreement:
+            out.append(v)
+        else:
+            out.append(rng.choice([o for o in OXN_VALUES if o != v]))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default="synthetic_study", help="Directory that receives the synthetic study tree.")
+    parser.add_argument("--n_prompts", type=int, default=7500, help="Number of prompt scenarios (75 reproduces the real study).")
+    parser.add_argument("--n_readers", type=int, default=4)
+    parser.add_argument("--duplicate_fraction", type=float, default=1 / 3,
+                        help="Fraction of generated images that receive a second cross-validation reader.")
+    parser.add_argument("--agreement", type=float, default=0.85,
+                        help="Probability that a reader reports the latent artifact value (per item).")
+    parser.add_argument("--completion", type=float, default=1.0,
+                        help="Fraction of assigned cases with a simulated result row.")
+    parser.add_argument("--image_size", type=int, default=32, help="Side length of placeholder PNGs; 0 skips images.")
+    parser.add_argument("--seed", type=int, default=20260601)
+    args = parser.parse_args()
+
+    if args.n_readers < 2 and args.duplicate_fraction > 0:
+        parser.error("--duplicate_fraction > 0 needs at least 2 readers.")
+
+    t0 = time.time()
+    out = Path(args.output_dir)
+    manifest_dir = out / "survey_manifests"
+    result_dir = out / "local_survey_results"
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    result_dir.mkdir(parents=True, exist_ok=True)
+    if args.image_size > 0:
+        for gen in GENERATORS:
+            (out / gen["folder"]).mkdir(parents=True, exist_ok=True)
+
+    readers = [f"professor_{i}" for i in range(1, args.n_readers + 1)]
+    rng = random.Random(args.seed)
+    rating_rng = random.Random(args.seed + 1)
+    seq_by_reader = {rd: 0 for rd in readers}
+    base_time = datetime(2026, 6, 1, 9, 0, 0)
+
+    prompt_path = out / f"m2smf_external_prompt_{args.n_prompts}_input.csv"
+    hidden_path = manifest_dir / "M2SMF_external_QA_hidden_assignment.csv"
+    result_files = {}
+    result_writers = {}
+    n_images = n_assignments = n_results = 0
+
+    with open(prompt_path, "w", encoding="utf-8-sig", newline="") as f_prompt, \
+            open(hidden_path, "w", encoding="utf-8-sig", newline="") as f_hidden:
+        prompt_writer = csv.writer(f_prompt)
+        prompt_writer.writerow(["id", "annotated_prompt"])
+        hidden_writer = csv.writer(f_hidden)
+        hidden_writer.writerow(HIDDEN_ASSIGNMENT_COLUMNS)
+        for rd in readers:
+            f = open(result_dir / f"{STUDY_ID}_{rd}.csv", "w", encoding="utf-8-sig", newline="")
+            result_files[rd] = f
+            result_writers[rd] = csv.writer(f)
+            result_writers[rd].writerow(SHEET_HEADERS)
+
+        try:
+            image_index = 0
+            for p in iter_prompts(args.n_prompts, args.seed):
+                prompt_writer.writerow([p["prompt_id"], p["generation_prompt"]])
+                for gen in GENERATORS:
+                    rel = f"{gen['folder']}/{p['prompt_id']}.png"
+                    if args.image_size > 0:
+                        level = int(hashlib.sha1(rel.encode()).hexdigest()[:2], 16)
+                        with open(out / rel, "wb") as f_img:
+                            f_img.write(placeholder_png(args.image_size, level))
+                    n_images += 1
+
+                    primary_rd = readers[image_index % len(readers)]
+                    image_index += 1
+                    roles = [(primary_rd, "primary")]
+                    if rng.random() < args.duplicate_fraction:
+                        second = rng.choice([rd for rd in readers if rd != primary_rd])
+                        roles.append((second, "cross_validation_duplicate"))
+
+                    latent = rng.choices(OXN_VALUES, weights=LATENT_WEIGHTS, k=len(ARTIFACT_HEADERS))
+                    generated_image_id = f"{p['prompt_id']}_{gen['model_key']}"
+                    for rd, cv_role in roles:
+                        n_assignments += 1
+                        seq_by_reader[rd] += 1
+                        seq = seq_by_reader[rd]
+                        reader_tag = rd.replace("professor_", "R")
+                        blinded_id = f"{reader_tag}_{seq:06d}"
+                        assignment_id = f"A{n_assignments:08d}"
+                        case_hash = hashlib.sha1(f"{rd}:{seq}:{generated_image_id}:M2SMF".encode()).hexdigest()[:10]
+                        is_dup = 1 if cv_role == "cross_validation_duplicate" else 0
+                        hidden_writer.writerow([
+                            assignment_id, rd, rd.replace("professor_", "Professor "), seq, blinded_id,
+                            f"{blinded_id}.png", case_hash, p["prompt_id"], p["prompt_number"],
+                            p["generation_prompt"], p["category"], p["disease_primary"], p["age"], p["sex"],
+                            p["severity"], *[p[c] for c in LABEL_COLUMNS],
+                            gen["model_key"], gen["generator_name"], gen["folder"],
+                            gen["model_version_or_identifier"], generated_image_id, rel, rel,
+                            args.image_size > 0, cv_role, is_dup, BLINDING_NOTE,
+                        ])
+
+                        if rating_rng.random() >= args.completion:
+                            continue
+                        elapsed = rating_rng.lognormvariate(3.0, 0.5)
+                        timestamp = base_time + timedelta(seconds=seq * 45 + rating_rng.random() * 30)
+                        result_writers[rd].writerow([
+                            timestamp.strftime("%Y-%m-%d %H:%M:%S"), STUDY_ID, APP_VERSION, rd, assignment_id,
+                            str(seq), blinded_id, f"{blinded_id}.png", case_hash,
+                            gen["folder"], os.path.basename(rel), rel, rel, generated_image_id,
+                            p["prompt_id"], gen["model_key"], gen["generator_name"], cv_role, str(is_dup),
+                            *rate(latent, args.agreement, rating_rng),
+                            f"{elapsed:.2f}",
+                        ])
+                        n_results += 1
+        finally:
+            for f in result_files.values():
+                f.close()
+
+    elapsed = time.time() - t0
+    print("Wrote synthetic study to:", out)
+    print("Prompts:", args.n_prompts)
+    print("Generated images:", n_images)
+    print("Assignments:", n_assignments)
+    print("Simulated result rows:", n_results)
+    print(f"Elapsed: {elapsed:.1f}s ({n_assignments / max(elapsed, 1e-9):,.0f} assignments/s)")
+
+
+if __name__ == "__main__":
+    main()
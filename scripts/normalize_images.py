@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Normalize every corpus image to the canonical representation in image_normalize.py
+(single-channel 8-bit PNG, common size, configurable resampler).
+
+- Parallel: images are normalized in a process pool.
+- Resumable: each finished image is appended to <version>/provenance.csv immediately;
+  a rerun skips images whose source mtime/size match their provenance row and whose
+  output exists, so an interrupted run continues where it stopped.
+- Versioned: outputs go to <output_dir>/<spec version>/, e.g. normalized/v1-1024-lanczos-L8-png.
+
+Point the apps at the result with M2SMF_NORMALIZED_DIR=<output_dir>/<version>, and the
+analysis tools with scripts/build_pixel_store.py --root <output_dir>/<version>.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from image_normalize import (  # noqa: E402
+    PROVENANCE_FILE,
+    PROVENANCE_HEADERS,
+    RESAMPLERS,
+    NormalizationSpec,
+    is_current,
+    normalize_image,
+    normalized_path,
+    read_provenance,
+    write_spec,
+)
+from pixel_store import DEFAULT_FOLDERS, scan_corpus  # noqa: E402
+
+
+def normalize_one(task):
+    image_id, source_path, version_dir, spec = task
+    try:
+        png, details = normalize_image(source_path, NormalizationSpec(*spec))
+    except Exception as e:
+        return image_id, None, str(e)
+    out_path = normalized_path(version_dir, image_id)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = f"{out_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, out_path)
+    details["output_relpath"] = os.path.relpath(out_path, version_dir).replace("\\", "/")
+    return image_id, details, ""
+
+
+def open_provenance(version_dir: str):
+    path = os.path.join(version_dir, PROVENANCE_FILE)
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    if not new:
+        # Close off a row torn by an interrupted run so the next row starts on its own line.
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+        if torn:
+            with open(path, "ab") as f:
+                f.write(b"\n")
+    f = open(path, "a", encoding="utf-8", newline="")
+    writer = csv.DictWriter(f, fieldnames=PROVENANCE_HEADERS)
+    if new:
+        writer.writeheader()
+    return f, writer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--folders", nargs="+", default=DEFAULT_FOLDERS)
+    parser.add_argument("--output_dir", default="normalized")
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--resampler", choices=sorted(RESAMPLERS), default="lanczos")
+    parser.add_argument("--compress_level", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    spec = NormalizationSpec(size=args.size, resampler=args.resampler, compress_level=args.compress_level)
+    version_dir = os.path.join(args.output_dir, spec.version)
+    write_spec(version_dir, spec)
+
+    done = read_provenance(version_dir)
+    files = scan_corpus(args.root, args.folders)
+    todo = [f for f in files if not is_current(done.get(f["image_id"]), version_dir, f["mtime_ns"], f["size"])]
+    print(f"{spec.version}: {len(files)} images, {len(files) - len(todo)} already normalized, {len(todo)} to do")
+
+    t0 = time.perf_counter()
+    stats = {f["image_id"]: f for f in todo}
+    tasks = [(f["image_id"], f["path"], version_dir, tuple(spec)) for f in todo]
+    failed = []
+    f, writer = open_provenance(version_dir)
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for n, (image_id, details, error) in enumerate(pool.map(normalize_one, tasks, chunksize=8), start=1):
+                if details is None:
+                    failed.append((image_id, error))
+                    continue
+                src = stats[image_id]
+                writer.writerow({
+                    "image_id": image_id,
+                    "source_path": src["path"],
+                    "source_mtime_ns": src["mtime_ns"],
+                    "source_size": src["size"],
+                    **details,
+                })
+                f.flush()
+                if n % 200 == 0:
+                    print(f"  {n}/{len(tasks)}")
+    finally:
+        f.close()
+
+    print(f"Normalized {len(tasks) - len(failed)} images into {version_dir} in {time.perf_counter() - t0:.1f}s")
+    for image_id, error in failed[:10]:
+        print(f"WARNING: {image_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
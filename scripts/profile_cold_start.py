@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Cold-start import profile of the survey apps (python -X importtime).
+
+Each target module is imported in a fresh interpreter --repeat times from the repo root;
+the fastest run is reported. The report lists the module's cumulative import time, the
+wall time of the interpreter, and the cumulative time of the heavy packages that should
+stay off the start-up path (gspread/oauth2client until credentials exist, PIL until the
+first image, sklearn until kappa is computed).
+
+Exit status is 1 if any --forbid module was imported, so the script can run as a
+start-up regression check:
+
+    python scripts/profile_cold_start.py
+    python scripts/profile_cold_start.py --targets app --forbid gspread PIL.Image numpy
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_TARGETS = ["app", "app_survey", "app_survey2"]
+WATCHED = ["streamlit", "pandas", "numpy", "PIL.Image", "gspread", "oauth2client", "sklearn", "pyarrow"]
+DEFAULT_FORBID = ["gspread", "oauth2client", "PIL.Image", "sklearn"]
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """module -> (self_us, cumulative_us) from -X importtime output; first import wins."""
+    out: Dict[str, Tuple[int, int]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+            out.setdefault(name.strip(), (int(self_us), int(cum_us)))
+        except ValueError:
+            continue
+    return out
+
+
+def profile(target: str) -> Tuple[float, Dict[str, Tuple[int, int]]]:
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        # Bare-mode Streamlit warnings are noise here; only the import timings matter.
+        env={**os.environ, "PYTHONWARNINGS": "ignore"},
+    )
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or [""]
+        raise RuntimeError(f"import {target} failed: {tail[0]}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBID, help="Modules that must not be imported at start-up.")
+    parser.add_argument("--output_csv", default="", help="Optional CSV with one row per target.")
+    args = parser.parse_args()
+
+    rows: List[dict] = []
+    violations = []
+    for target in args.targets:
+        runs = [profile(target) for _ in range(max(1, args.repeat))]
+        wall, modules = min(runs, key=lambda r: r[1].get(target, (0, 0))[1])
+        row = {
+            "target": target,
+            "import_ms": modules.get(target, (0, 0))[1] / 1000.0,
+            "wall_ms": wall * 1000.0,
+            "n_modules": len(modules),
+        }
+        for name in WATCHED:
+            row[f"{name}_ms"] = modules[name][1] / 1000.0 if name in modules else None
+        rows.append(row)
+        violations += [(target, name) for name in args.forbid if name in modules]
+
+    header = ["target", "import_ms", "wall_ms", "n_modules"] + [f"{n}_ms" for n in WATCHED]
+    print("  ".join(f"{h:>14}" for h in header))
+    for row in rows:
+        cells = [row["target"]] + [
+            "-" if row[h] is None else (f"{row[h]:.1f}" if isinstance(row[h], float) else str(row[h])) for h in header[1:]
+        ]
+        print("  ".join(f"{c:>14}" for c in cells))
+
+    if args.output_csv:
+        Path(args.output_csv).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output_csv, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    for target, name in violations:
+        print(f"FAIL: importing {target} loads {name}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Lossless archival recompression of the image corpus.
+
+Every image under the corpus folders (pixel_store.DEFAULT_FOLDERS) is re-encoded in a
+process pool by image_sanitize.recompress_lossless: optimized PNG and lossless WebP are
+tried, each candidate is decoded and must match the source pixels exactly, and the
+smallest file wins. JPEG sources and files nothing beats are kept byte-for-byte.
+
+Non-pixel data is preserved by default: PNGs with a C2PA provenance manifest (the caBX
+chunk in the gpt/ and gemini/ outputs) are kept byte-for-byte, other PNG ancillary chunks
+(ICC profile, text, EXIF) are copied into the re-encoded PNG, and such files are never
+converted to WebP. --strip_metadata opts into the old behaviour of re-encoding pixels only,
+which discards provenance manifests, ICC profiles and text chunks; combined with --in_place
+the originals are deleted and that data cannot be recovered, so mirror first.
+
+Without --in_place the recompressed corpus is mirrored under --output_root together with
+rewritten copies of the manifests. With --in_place files are replaced atomically; when the
+extension changes (P001.png -> P001.webp) the old file is removed after the new one is
+written. In both modes image_relpath / image_path / image_id in the generation manifest,
+the hidden assignment, the copy plans and the rater-set / cross-eval manifests are
+rewritten for every changed extension. app.py's
+resolve_image_path also tolerates the old extension, so a stale manifest still resolves.
+
+A per-folder size report is written to --report.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from image_sanitize import recompress_lossless  # noqa: E402
+from pixel_store import DEFAULT_FOLDERS, scan_corpus  # noqa: E402
+from study_index import DEFAULT_SOURCES  # noqa: E402
+
+MANIFEST_ROLES = ["generation_manifest", "hidden_assignment", "copy_plans", "rater_sets", "cross_eval"]
+PATH_COLUMNS = ["image_relpath", "image_path", "image_id"]
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def recompress_file(task):
+    """Worker: recompress one file and write it to out_root (None = in place)."""
+    root, image_id, out_root, compress_level, webp_method, strip_metadata, dry_run = task
+    source_path = os.path.join(root, image_id)
+    try:
+        with open(source_path, "rb") as f:
+            data = f.read()
+        best, ext, details = recompress_lossless(
+            data, compress_level=compress_level, webp_method=webp_method, strip_metadata=strip_metadata
+        )
+    except Exception as e:
+        return image_id, None, str(e)
+
+    new_id = os.path.splitext(image_id)[0] + ext if ext else image_id
+    details.update({"image_id": image_id, "new_image_id": new_id})
+    if dry_run:
+        return image_id, details, ""
+    if out_root is None:
+        if ext:
+            _write_atomic(os.path.join(root, new_id), best)
+            if new_id != image_id:
+                os.remove(source_path)
+    else:
+        out_path = os.path.join(out_root, new_id)
+        if ext:
+            _write_atomic(out_path, best)
+        else:
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            shutil.copy2(source_path, out_path)
+    return image_id, details, ""
+
+
+def rewrite_manifests(root: str, out_root: str, renamed: dict, dry_run: bool):
+    """Rewrite PATH_COLUMNS in the manifests; renamed maps lower-case folder/stem -> new image_id."""
+    changed = []
+    for role in MANIFEST_ROLES:
+        for path in sorted(glob.glob(os.path.join(root, DEFAULT_SOURCES[role]))):
+            df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+            n = 0
+            for col in PATH_COLUMNS:
+                if col not in df.columns:
+                    continue
+                old = df[col]
+                stems = old.str.replace("\\", "/", regex=False).str.lstrip("/").map(lambda p: os.path.splitext(p)[0].lower())
+                df[col] = [renamed.get(s, v) for s, v in zip(stems, old)]
+                n += int((df[col] != old).sum())
+            if n:
+                changed.append((os.path.relpath(path, root), n))
+            if not dry_run and (n or out_root != root):
+                out_path = os.path.join(out_root, os.path.relpath(path, root))
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                tmp_path = f"{out_path}.tmp-{os.getpid()}"
+                df.to_csv(tmp_path, index=False, encoding="utf-8-sig")
+                os.replace(tmp_path, out_path)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--folders", nargs="*", default=DEFAULT_FOLDERS)
+    parser.add_argument("--output_root", default="archive", help="Mirror the recompressed corpus here (ignored with --in_place).")
+    parser.add_argument("--in_place", action="store_true", help="Replace files under --root and rewrite its manifests.")
+    parser.add_argument("--compress_level", type=int, default=9)
+    parser.add_argument("--webp_method", type=int, default=4, help="0-6; 6 is ~8x slower for a few percent. -1 disables WebP.")
+    parser.add_argument(
+        "--strip_metadata",
+        action="store_true",
+        help="Drop C2PA provenance, ICC profiles and text chunks instead of keeping them (irreversible with --in_place).",
+    )
+    parser.add_argument("--dry_run", action="store_true", help="Encode and verify, but write only the report.")
+    parser.add_argument("--report", default="outputs/recompression_report.csv")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    out_root = None if args.in_place else args.output_root
+    webp_method = None if args.webp_method < 0 else args.webp_method
+    files = scan_corpus(args.root, args.folders)
+    tasks = [(args.root, f["image_id"], out_root, args.compress_level, webp_method, args.strip_metadata, args.dry_run) for f in files]
+    print(f"Recompressing {len(tasks)} images from {len(args.folders)} folders")
+    if args.strip_metadata:
+        print("WARNING: --strip_metadata drops C2PA provenance, ICC profiles and text chunks.")
+
+    t0 = time.perf_counter()
+    results, failed = [], []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for image_id, details, error in pool.map(recompress_file, tasks, chunksize=2):
+            if details is None:
+                failed.append((image_id, error))
+            else:
+                results.append(details)
+
+    renamed = {
+        os.path.splitext(r["image_id"])[0].lower(): r["new_image_id"]
+        for r in results
+        if r["new_image_id"] != r["image_id"]
+    }
+    changed = rewrite_manifests(args.root, args.root if out_root is None else out_root, renamed, args.dry_run)
+
+    files_df = pd.DataFrame(results)
+    if files_df.empty:
+        print("Nothing recompressed.")
+        return
+    files_df["folder"] = files_df["image_id"].str.split("/").str[0]
+    files_df["kept_original"] = files_df["source_bytes"] == files_df["output_bytes"]
+    by_folder = files_df.groupby("folder").agg(
+        n_images=("image_id", "size"),
+        n_webp=("output_format", lambda s: int((s == "webp").sum())),
+        n_kept_original=("kept_original", "sum"),
+        n_provenance=("kept_original_reason", lambda s: int((s == "c2pa_provenance").sum())),
+        source_mb=("source_bytes", lambda s: s.sum() / 1e6),
+        output_mb=("output_bytes", lambda s: s.sum() / 1e6),
+    ).reset_index()
+    by_folder["saved_pct"] = 100.0 * (1.0 - by_folder["output_mb"] / by_folder["source_mb"])
+
+    Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+    files_df.to_csv(args.report, index=False, encoding="utf-8-sig")
+
+    where = "in place" if out_root is None else f"into {out_root}"
+    print(f"{'Verified' if args.dry_run else 'Recompressed'} {len(results)} images {where} in {time.perf_counter() - t0:.1f}s")
+    print(by_folder.round(2).to_string(index=False))
+    for path, n in changed:
+        print(f"{path}: {n} path values {'would be ' if args.dry_run else ''}rewritten")
+    if changed and not args.dry_run:
+        print("Manifests changed: rebuild study_index.sqlite and any image pack / pixel store built from them.")
+    for image_id, error in failed[:10]:
+        print(f"WARNING: {image_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Reconcile app.py local results (journals and CSVs in local_survey_results/) with the Google Sheet.
+
+app.py writes every submit to the local journal and, when connected, to the reader's
+worksheet. The local files are therefore a superset unless a sheet append failed.
+This tool:
+
+- reads all local result journals/CSVs and all worksheets of SHEET_NAME (one values batch_get
+  for the whole spreadsheet),
+- indexes both sides by (study_id, reader_id, assignment_id),
+- reports rows missing from the sheet, rows only in the sheet, and conflicts
+  (same key, different ratings),
+- with --apply, bulk-appends the missing rows to each worksheet with one append_rows call.
+
+Local files can be full or compact (M2SMF_RESULT_STORAGE_MODE=compact). A compact row
+missing from a full-layout worksheet is first rehydrated from the hidden assignment
+(scripts/rehydrate_compact_results.py), so it is not appended with blank metadata. Rows
+that still lack worksheet columns (e.g. no hidden-assignment match) are skipped and listed
+in the report as header_mismatch. An empty worksheet adopts the widest local header.
+
+Credentials are read from a service-account JSON file or from the [gcp_service_account]
+table of .streamlit/secrets.toml, the same secret app.py uses. --emulator <sqlite path> runs
+against the local Sheets emulator (sheets_emulator.py) instead.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import tomllib
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from result_journal import read_journal  # noqa: E402
+from sheets_emulator import EmulatorSettings, connect  # noqa: E402
+
+SHEET_NAME = "M2SMF_survey"
+STUDY_ID = "M2SMF_External_Synthetic_CXR_Artifact_Checklist_300"
+# Must match READER_CONFIG in app.py.
+WORKSHEET_BY_READER = {
+    "professor_1": "P1",
+    "professor_2": "P2",
+    "professor_3": "P3",
+    "professor_4": "P4",
+}
+KEY_COLS = ["study_id", "reader_id", "assignment_id"]
+COMPARE_COLS = [
+    "artifact_marker_OXN",
+    "artifact_density_OXN",
+    "artifact_gas_lucency_OXN",
+    "artifact_boundaries_OXN",
+    "artifact_anterior_ribs_OXN",
+    "artifact_wavy_clavicle_OXN",
+    "artifact_organ_shape_OXN",
+    "artifact_global_quality_fov_crop_OXN",
+]
+# Worksheet columns a local row may leave blank (the viewer column only exists with IMAGE_VIEWER).
+OPTIONAL_COLS = {"viewer_telemetry"}
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+Key = Tuple[str, str, str]
+
+
+def load_credentials_dict(args) -> dict:
+    if args.service_account_json:
+        with open(args.service_account_json, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with open(args.secrets_toml, "rb") as f:
+        secrets = tomllib.load(f)
+    if "gcp_service_account" not in secrets:
+        raise RuntimeError(f"{args.secrets_toml} has no [gcp_service_account] table.")
+    return dict(secrets["gcp_service_account"])
+
+
+def open_spreadsheet(args):
+    if args.emulator:
+        return connect(EmulatorSettings(path=args.emulator)).open(args.sheet_name)
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(load_credentials_dict(args), SCOPE)
+    client = gspread.authorize(creds)
+    return client.open(args.sheet_name)
+
+
+def row_key(record: Dict[str, str]) -> Key:
+    return tuple(str(record.get(c, "")).strip() for c in KEY_COLS)
+
+
+def index_rows(header: List[str], rows: List[List[str]], source: str, index: Dict[Key, dict], duplicates: List[dict]):
+    """Add rows to a key -> record index. The first occurrence wins; repeats are reported."""
+    missing = [c for c in KEY_COLS if c not in header]
+    if missing:
+        raise RuntimeError(f"{source} is missing key columns: {missing}")
+    for row in rows:
+        if not any(cell.strip() for cell in row):
+            continue
+        record = dict(zip(header, row + [""] * (len(header) - len(row))))
+        key = row_key(record)
+        if not key[2]:
+            continue
+        if key in index:
+            duplicates.append({"source": source, "study_id": key[0], "reader_id": key[1], "assignment_id": key[2]})
+            continue
+        record["_source"] = source
+        record["_header"] = header
+        index[key] = record
+
+
+def read_local(local_dir: str, study_id: str):
+    """
+    Index local journals and CSVs. A CSV exported from a journal repeats the journal's
+    rows, so repeats across files are merged silently; only repeats within a file count
+    as duplicates.
+    """
+    index: Dict[Key, dict] = {}
+    duplicates: List[dict] = []
+    for path in sorted(glob.glob(os.path.join(local_dir, f"{study_id}_*.*"))):
+        if path.endswith(".ndjson"):
+            records = [r["row"] for r in read_journal(path)]
+            header = list(records[0].keys()) if records else []
+            rows = [[r.get(c, "") for c in header] for r in records]
+        elif path.endswith(".csv"):
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                rows = list(csv.reader(f))
+            if not rows:
+                continue
+            header, rows = rows[0], rows[1:]
+        else:
+            continue
+        if not header:
+            continue
+        file_index: Dict[Key, dict] = {}
+        index_rows(header, rows, path, file_index, duplicates)
+        for key, record in file_index.items():
+            index.setdefault(key, record)
+    return index, duplicates
+
+
+def read_sheet(spreadsheet):
+    """Fetch every worksheet's values with a single values batch_get request."""
+    worksheets = spreadsheet.worksheets()
+    titles = [ws.title for ws in worksheets]
+    ranges = ["'" + t.replace("'", "''") + "'" for t in titles]
+    response = spreadsheet.values_batch_get(ranges) if ranges else {"valueRanges": []}
+    index: Dict[Key, dict] = {}
+    duplicates: List[dict] = []
+    headers: Dict[str, List[str]] = {}
+    for ws, value_range in zip(worksheets, response.get("valueRanges", [])):
+        values = value_range.get("values", [])
+        headers[ws.title] = values[0] if values else []
+        if len(values) > 1:
+            index_rows(values[0], values[1:], f"sheet:{ws.title}", index, duplicates)
+    return {ws.title: ws for ws in worksheets}, headers, index, duplicates
+
+
+def missing_columns(record: dict, header: List[str]) -> List[str]:
+    return [c for c in header if c not in record and c not in OPTIONAL_COLS]
+
+
+def rehydrate_records(records: List[dict], hidden_assignment_csv: str) -> int:
+    """
+    Add the full-layout columns to compact records in place, joined from the hidden assignment.
+    Records without every compact column, or without a hidden-assignment match, keep only their
+    own columns. Returns how many were rehydrated.
+    """
+    import pandas as pd
+    from rehydrate_compact_results import COMPACT_SHEET_HEADERS, read_str_csv, rehydrate
+
+    records = [r for r in records if all(c in r for c in COMPACT_SHEET_HEADERS)]
+    if not records:
+        return 0
+    compact = pd.DataFrame([{c: r.get(c, "") for c in COMPACT_SHEET_HEADERS} for r in records], dtype=str)
+    full = rehydrate(compact, read_str_csv(hidden_assignment_csv))
+    for record, row in zip(records, full.to_dict("records")):
+        for c, v in row.items():
+            record.setdefault(c, v)
+        if not record.get("blinded_image_id"):
+            # No hidden-assignment match: leave the metadata out so the row is skipped, not blank-filled.
+            for c in row:
+                if c not in record["_header"]:
+                    record.pop(c, None)
+    return sum(1 for r in records if r.get("blinded_image_id"))
+
+
+def diff(local: Dict[Key, dict], remote: Dict[Key, dict]):
+    missing_in_sheet = [k for k in local if k not in remote]
+    only_in_sheet = [k for k in remote if k not in local]
+    conflicts = []
+    for k in local.keys() & remote.keys():
+        changed = [c for c in COMPARE_COLS if c in local[k] and c in remote[k] and local[k][c] != remote[k][c]]
+        if changed:
+            conflicts.append((k, changed))
+    return sorted(missing_in_sheet), sorted(only_in_sheet), sorted(conflicts)
+
+
+def write_report(path: Path, missing, only_in_sheet, conflicts, local, remote, duplicates):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["status", *KEY_COLS, "detail"])
+        for k in missing:
+            writer.writerow(["missing_in_sheet", *k, local[k]["_source"]])
+        for k in only_in_sheet:
+            writer.writerow(["only_in_sheet", *k, remote[k]["_source"]])
+        for k, cols in conflicts:
+            detail = "; ".join(f"{c}: local={local[k][c]} sheet={remote[k][c]}" for c in cols)
+            writer.writerow(["conflict", *k, detail])
+        for d in duplicates:
+            writer.writerow(["duplicate_row", d["study_id"], d["reader_id"], d["assignment_id"], d["source"]])
+
+
+def append_report(path: Path, rows: List[list]):
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--local_dir", default="local_survey_results")
+    parser.add_argument("--study_id", default=STUDY_ID)
+    parser.add_argument("--sheet_name", default=SHEET_NAME)
+    parser.add_argument("--secrets_toml", default=".streamlit/secrets.toml")
+    parser.add_argument("--service_account_json", default="", help="Service-account key file; overrides --secrets_toml.")
+    parser.add_argument("--emulator", default="", help="SQLite store of the local Sheets emulator; overrides credentials.")
+    parser.add_argument("--report_csv", default="outputs/reconciliation_report.csv")
+    parser.add_argument(
+        "--hidden_assignment_csv", default="survey_manifests/M2SMF_external_QA_hidden_assignment.csv",
+        help="Used to rehydrate compact local rows before appending them to a full-layout worksheet.",
+    )
+    parser.add_argument("--apply", action="store_true", help="Append rows missing from the sheet. Without it, only report.")
+    args = parser.parse_args()
+
+    local, local_dups = read_local(args.local_dir, args.study_id)
+    spreadsheet = open_spreadsheet(args)
+    worksheets, headers, remote, remote_dups = read_sheet(spreadsheet)
+
+    missing, only_in_sheet, conflicts = diff(local, remote)
+    write_report(Path(args.report_csv), missing, only_in_sheet, conflicts, local, remote, local_dups + remote_dups)
+
+    print("Local rows:", len(local))
+    print("Sheet rows:", len(remote))
+    print("Missing in sheet:", len(missing))
+    print("Only in sheet:", len(only_in_sheet))
+    print("Conflicts:", len(conflicts))
+    print("Duplicate rows (local/sheet):", len(local_dups), "/", len(remote_dups))
+    print("Report:", args.report_csv)
+
+    if not args.apply or not missing:
+        return
+
+    by_title: Dict[str, List[dict]] = defaultdict(list)
+    for k in missing:
+        title = WORKSHEET_BY_READER.get(k[1])
+        if title is None:
+            print(f"WARNING: no worksheet configured for reader {k[1]!r}; skipped {k[2]}")
+            continue
+        by_title[title].append(local[k])
+
+    to_append: Dict[str, List[List[str]]] = defaultdict(list)
+    mismatched = []
+    for title, records in by_title.items():
+        if title not in worksheets:
+            worksheets[title] = spreadsheet.add_worksheet(title=title, rows=1000, cols=max(len(r["_header"]) for r in records))
+            headers[title] = []
+        if not headers[title]:
+            # Empty worksheet: adopt the widest local header (full over compact), as ensure_sheet_header() would.
+            headers[title] = max((r["_header"] for r in records), key=len)
+            to_append[title].append(list(headers[title]))
+        incomplete = [r for r in records if missing_columns(r, headers[title])]
+        if incomplete:
+            n = rehydrate_records(incomplete, args.hidden_assignment_csv)
+            print(f"Rehydrated {n} compact rows for {title}")
+        for record in records:
+            lacking = missing_columns(record, headers[title])
+            if lacking:
+                mismatched.append(["header_mismatch", *row_key(record), f"{record['_source']}: no {', '.join(lacking[:5])}"])
+                continue
+            to_append[title].append([record.get(c, "") for c in headers[title]])
+
+    if mismatched:
+        append_report(Path(args.report_csv), mismatched)
+        print(f"WARNING: {len(mismatched)} rows do not match their worksheet header and were not appended (see report)")
+
+    for title, rows in to_append.items():
+        worksheets[title].append_rows(rows, value_input_option="RAW")
+        print(f"Appended {len(rows)} rows to {args.sheet_name}/{title}")
+
+
+if __name__ == "__main__":
+    main()
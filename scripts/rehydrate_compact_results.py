@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Rehydrate compact survey result rows (app.py with M2SMF_RESULT_STORAGE_MODE=compact)
+back into the full app.py SHEET_HEADERS layout.
+
+Compact rows only carry the assignment key, the eight OXN ratings and the timing
+(plus viewer_telemetry when app.py ran with M2SMF_IMAGE_VIEWER). Everything else is
+joined back from the hidden assignment CSV on assignment_id; viewer_telemetry is carried
+through as the last column when present.
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+APP_VERSION = "M2SMF_EXTERNAL_SYNTH_ARTIFACT_ONLY_v1.2"
+
+ARTIFACT_HEADERS = [
+    "artifact_marker_OXN",
+    "artifact_density_OXN",
+    "artifact_gas_lucency_OXN",
+    "artifact_boundaries_OXN",
+    "artifact_anterior_ribs_OXN",
+    "artifact_wavy_clavicle_OXN",
+    "artifact_organ_shape_OXN",
+    "artifact_global_quality_fov_crop_OXN",
+]
+# Must match COMPACT_SHEET_HEADERS / SHEET_HEADERS in app.py.
+COMPACT_SHEET_HEADERS = ["timestamp", "study_id", "reader_id", "assignment_id"] + ARTIFACT_HEADERS + ["time_spent_sec"]
+SHEET_HEADERS = [
+    "timestamp", "study_id", "app_version", "reader_id", "assignment_id", "reader_sequence",
+    "blinded_image_id", "blinded_filename", "case_hash",
+    "source_image_folder", "source_image_filename", "source_image_relpath", "source_image_path",
+    "generated_image_id", "prompt_id", "model_key", "generator_name", "cv_role",
+    "is_cross_validation_duplicate",
+] + ARTIFACT_HEADERS + ["time_spent_sec"]
+# Optional trailing column (VIEWER_HEADERS in app.py, only with M2SMF_IMAGE_VIEWER).
+VIEWER_HEADERS = ["viewer_telemetry"]
+
+
+def read_str_csv(path) -> pd.DataFrame:
+    # keep_default_na=False keeps the literal "N/A" rating instead of turning it into NaN.
+    return pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+
+
+def rehydrate(compact: pd.DataFrame, hidden: pd.DataFrame, app_version: str = APP_VERSION) -> pd.DataFrame:
+    missing = [c for c in COMPACT_SHEET_HEADERS if c not in compact.columns]
+    if missing:
+        raise RuntimeError(f"Compact results are missing columns: {missing}")
+
+    hidden_cols = [
+        "assignment_id", "reader_id", "reader_sequence", "blinded_image_id", "blinded_filename", "case_hash",
+        "folder", "image_relpath", "image_path", "generated_image_id", "prompt_id", "model_key",
+        "generator_name", "cv_role", "is_cross_validation_duplicate",
+    ]
+    hidden = hidden[[c for c in hidden_cols if c in hidden.columns]]
+    viewer_cols = [c for c in VIEWER_HEADERS if c in compact.columns]
+    merged = compact[COMPACT_SHEET_HEADERS + viewer_cols].merge(
+        hidden, on="assignment_id", how="left", suffixes=("", "_hidden"), validate="many_to_one"
+    )
+    unmatched = merged["blinded_image_id"].isna() | (merged["blinded_image_id"] == "")
+    if unmatched.any():
+        print(f"WARNING: {int(unmatched.sum())} rows have no matching assignment_id in the hidden assignment.")
+    merged = merged.fillna("")
+
+    # Same derivation as build_source_metadata() in app.py.
+    relpath = merged["image_relpath"].where(merged["image_relpath"] != "", merged["image_path"])
+    relpath = relpath.str.replace("\\", "/", regex=False)
+    folder = merged.get("folder", pd.Series("", index=merged.index))
+    folder = folder.where(folder != "", relpath.map(lambda p: p.split("/")[0] if "/" in p else ""))
+
+    out = pd.DataFrame({
+        "timestamp": merged["timestamp"],
+        "study_id": merged["study_id"],
+        "app_version": app_version,
+        "reader_id": merged["reader_id"],
+        "assignment_id": merged["assignment_id"],
+        "reader_sequence": merged["reader_sequence"],
+        "blinded_image_id": merged["blinded_image_id"],
+        "blinded_filename": merged["blinded_filename"],
+        "case_hash": merged["case_hash"],
+        "source_image_folder": folder,
+        "source_image_filename": relpath.map(lambda p: p.rsplit("/", 1)[-1] if p else ""),
+        "source_image_relpath": relpath,
+        "source_image_path": merged["image_path"],
+        "generated_image_id": merged["generated_image_id"],
+        "prompt_id": merged["prompt_id"],
+        "model_key": merged["model_key"],
+        "generator_name": merged["generator_name"],
+        "cv_role": merged["cv_role"],
+        "is_cross_validation_duplicate": merged["is_cross_validation_duplicate"],
+        **{c: merged[c] for c in ARTIFACT_HEADERS},
+        "time_spent_sec": merged["time_spent_sec"],
+        **{c: merged[c] for c in viewer_cols},
+    })
+    return out[SHEET_HEADERS + viewer_cols]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compact_results_csv", nargs="+", required=True, help="Compact Google Sheet exports or local *_compact.csv files.")
+    parser.add_argument("--hidden_assignment_csv", default="survey_manifests/M2SMF_external_QA_hidden_assignment.csv")
+    parser.add_argument("--output_csv", default="outputs/survey_results_rehydrated.csv")
+    parser.add_argument("--app_version", default=APP_VERSION, help="app_version written into rehydrated rows.")
+    args = parser.parse_args()
+
+    compact = pd.concat([read_str_csv(p) for p in args.compact_results_csv], ignore_index=True)
+    hidden = read_str_csv(args.hidden_assignment_csv)
+    full = rehydrate(compact, hidden, app_version=args.app_version)
+
+    out_path = Path(args.output_csv)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    full.to_csv(out_path, index=False, encoding="utf-8-sig")
+    print("Wrote rehydrated results to:", out_path)
+    print("Rows:", len(full))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Start a survey app with warm-up at boot.
+
+Streamlit runs an app script only when a session connects, so nothing is prepared before
+the first reader arrives. This launcher:
+
+1. starts `streamlit run <app>` with M2SMF_HEALTH_PORT set,
+2. waits for Streamlit's /_stcore/health,
+3. opens one headless session over /_stcore/stream and requests a script run, which calls
+   app.start_warmup() (manifests and path index, Google authorization, each reader's
+   current and next case images, see warmup.py),
+4. polls http://127.0.0.1:<health_port>/health until warm-up reports ready and prints the
+   per-step timings, then keeps serving until Streamlit exits.
+
+Step 3 needs the `websockets` package (requirements.txt); the launcher exits before starting
+Streamlit when it is missing, and exits non-zero (stopping Streamlit) when warm-up cannot be
+triggered or confirmed, so a broken boot never looks like a served app.
+
+Extra arguments after "--" are passed to streamlit run, e.g.
+
+    python scripts/serve_app.py --app app.py --port 8501 -- --server.address 0.0.0.0
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def wait_for(url: str, timeout: float, accept=(200,)):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                if resp.status in accept:
+                    return resp.read()
+        except urllib.error.HTTPError as e:
+            if e.code in accept:
+                return e.read()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} not ready after {timeout:.0f}s")
+
+
+async def trigger_session(port: int, timeout: float):
+    """Open a headless session and request one script run; return once it finishes."""
+    import websockets
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    msg = BackMsg()
+    msg.rerun_script.query_string = ""
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"], max_size=None) as ws:
+        await ws.send(msg.SerializeToString())
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            raw = await asyncio.wait_for(ws.recv(), timeout=max(0.1, deadline - time.monotonic()))
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            if fwd.WhichOneof("type") == "script_finished":
+                return
+    raise TimeoutError(f"script run not finished after {timeout:.0f}s")
+
+
+def main():
+    argv = sys.argv[1:]
+    extra = argv[argv.index("--") + 1:] if "--" in argv else []
+    argv = argv[:argv.index("--")] if "--" in argv else argv
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--port", type=int, default=8501)
+    parser.add_argument("--health_port", type=int, default=8599)
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds to wait for boot and for warm-up.")
+    args = parser.parse_args(argv)
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        sys.exit("[serve_app] ERROR: the 'websockets' package is required to trigger warm-up (pip install -r requirements.txt)")
+
+    env = {**os.environ, "M2SMF_HEALTH_PORT": str(args.health_port)}
+    cmd = [sys.executable, "-m", "streamlit", "run", args.app, "--server.port", str(args.port), "--server.headless", "true", *extra]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: proc.send_signal(signum))
+
+    try:
+        wait_for(f"http://127.0.0.1:{args.port}/_stcore/health", args.timeout)
+        print(f"[serve_app] streamlit up in {time.perf_counter() - t0:.1f}s; triggering warm-up", flush=True)
+        asyncio.run(trigger_session(args.port, args.timeout))
+        body = wait_for(f"http://127.0.0.1:{args.health_port}/health", args.timeout, accept=(200,))
+        report = json.loads(body)
+        print(f"[serve_app] ready in {time.perf_counter() - t0:.1f}s ({report['errors']} step errors)", flush=True)
+        for name, step in report["steps"].items():
+            print(f"[serve_app]   {name}: {step['state']} {step['seconds']}s {step['detail']}", flush=True)
+    except Exception as e:
+        print(f"[serve_app] ERROR: warm-up not confirmed: {type(e).__name__}: {e}; stopping streamlit", flush=True)
+        proc.terminate()
+        proc.wait()
+        sys.exit(1)
+
+    sys.exit(proc.wait())
+
+
+if __name__ == "__main__":
+    main()
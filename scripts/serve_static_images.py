@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Serve static/img (static_images.py) with immutable caching headers.
+
+File names are content hashes, so every response is sent with
+`Cache-Control: public, max-age=31536000, immutable` and an ETag equal to the name's hash;
+a request with a matching If-None-Match gets 304 without a body. Only files directly
+inside the directory are served and listings are disabled.
+
+Point the apps at it with M2SMF_IMAGE_URL_BASE=http://<host>:<port>, e.g.
+
+    python scripts/serve_static_images.py --port 8601 &
+    M2SMF_IMAGE_URL_BASE=http://localhost:8601 streamlit run app.py
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import os
+import sys
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from static_images import STATIC_IMAGE_DIR  # noqa: E402
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ImmutableImageHandler(SimpleHTTPRequestHandler):
+    etag = None
+
+    def send_head(self):
+        name = urlsplit(self.path).path.lstrip("/")
+        if not name or "/" in name or name.startswith(".") or not os.path.isfile(os.path.join(self.directory, name)):
+            self.send_error(404)
+            return None
+        self.etag = f'"{os.path.splitext(name)[0]}"'
+        if self.etag in [t.strip() for t in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.end_headers()
+            return None
+        return super().send_head()
+
+    def end_headers(self):
+        if self.etag is not None:
+            self.send_header("ETag", self.etag)
+            self.send_header("Cache-Control", CACHE_CONTROL)
+            # The canvas viewer (image_viewer.py) loads images with crossOrigin="anonymous".
+            self.send_header("Access-Control-Allow-Origin", "*")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directory", default=STATIC_IMAGE_DIR)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8601)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    handler = functools.partial(ImmutableImageHandler, directory=args.directory)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.verbose = args.verbose
+    print(f"Serving {args.directory} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
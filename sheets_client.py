@@ -0,0 +1,367 @@
+"""
+Rate-limit-aware access to the survey Google Sheet, shared by every session of a process.
+
+The Sheets API allows about 60 read and 60 write requests per minute for one user (the
+service account) per project. All Streamlit sessions of a process use that one account, so a
+few readers saving at the same moment can exceed it and get HTTP 429. `SheetsGateway`
+(one per process, st.cache_resource in the apps):
+
+- keeps a sliding one-minute read/write budget (`QuotaBudget`) and waits up to `max_wait`
+  seconds for a free slot instead of sending a request that would be rejected,
+- coalesces identical concurrent reads: one get_all_values per worksheet is in flight and
+  every session waiting for it receives the same result (treat it as read-only),
+- answers get_all_values from the last snapshot plus the rows this process appended since
+  when the read budget is exhausted or the API keeps failing, so resume still works,
+- retries 429, 5xx and dropped connections with full-jitter exponential backoff, honouring
+  Retry-After when the response carries one (a 429 also pauses the budget, since other
+  clients of the account are using it) and giving up after `max_call_seconds`,
+- queues rows whose append could not be sent (`append_row_or_defer`) and flushes them, in
+  order, before later writes and reads of the same process. The queue lives in memory only:
+  app.py writes every row to its local journal first, so a queued row survives a restart
+  there. Apps without a local copy (app_survey.py, app_survey2.py) pass defer=False and get
+  the error instead, so the reader can retry,
+- opens each worksheet once and keeps the authorized handle,
+- counts requests, retries, throttled calls, coalesced reads and deferred rows (`stats()`).
+
+`ManagedWorksheet` wraps a gspread Worksheet; get_all_values and append_row go through the
+gateway and every other attribute falls through to the worksheet. `sheets_backend()` picks
+gspread or the local emulator (sheets_emulator.py) from the environment and secrets.
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple, Type
+
+from sheets_emulator import WorksheetNotFound as EmulatedWorksheetNotFound
+from sheets_emulator import connect as connect_emulator
+from sheets_emulator import emulator_settings
+
+DEFAULT_READS_PER_MINUTE = 50
+DEFAULT_WRITES_PER_MINUTE = 50
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class QuotaExhausted(RuntimeError):
+    """No request slot of the per-minute budget became free within the wait limit."""
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """429/5xx API errors and network errors (requests' exceptions are OSError subclasses)."""
+    status = _status_of(exc)
+    if status is not None:
+        return status in RETRY_STATUS
+    return isinstance(exc, OSError)
+
+
+def sheets_backend(secrets, scope: List[str]) -> Optional[Tuple[Callable[[], Any], Type[Exception]]]:
+    """
+    (authorize, WorksheetNotFound) for the configured backend: the local emulator when
+    M2SMF_SHEETS_EMULATOR or a [sheets_emulator] secret is set, else gspread with the
+    [gcp_service_account] secret. None when neither is configured. gspread and oauth2client
+    are imported only here, so they stay off the start-up path.
+    """
+    settings = emulator_settings(secrets)
+    if settings is not None:
+        return (lambda: connect_emulator(settings)), EmulatedWorksheetNotFound
+    if "gcp_service_account" not in secrets:
+        return None
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    creds_dict = dict(secrets["gcp_service_account"])
+
+    def authorize():
+        return gspread.authorize(ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope))
+
+    return authorize, gspread.exceptions.WorksheetNotFound
+
+
+def worksheet_key(ws) -> tuple:
+    spreadsheet_id = getattr(ws, "spreadsheet_id", None) or ws.spreadsheet.id
+    return (spreadsheet_id, ws.id)
+
+
+class QuotaBudget:
+    """Sliding-window request budget: at most limits[kind] requests in any `window` seconds."""
+
+    def __init__(self, limits: Dict[str, int], window: float = 60.0):
+        self.limits = dict(limits)
+        self.window = window
+        self._sent = {kind: deque() for kind in limits}
+        self._paused_until = {kind: 0.0 for kind in limits}
+        self._lock = threading.Lock()
+
+    def _prune(self, kind: str, now: float):
+        sent = self._sent[kind]
+        while sent and now - sent[0] >= self.window:
+            sent.popleft()
+
+    def acquire(self, kind: str, max_wait: float) -> bool:
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune(kind, now)
+                sent = self._sent[kind]
+                paused_until = self._paused_until[kind]
+                if len(sent) < self.limits[kind] and now >= paused_until:
+                    sent.append(now)
+                    return True
+                if now < paused_until:
+                    free_at = paused_until
+                else:
+                    # A limit of 0 never frees a slot.
+                    free_at = sent[0] + self.window if sent else deadline
+                wait = min(free_at - now, deadline - now)
+            if wait <= 0:
+                return False
+            time.sleep(wait)
+
+    def pause(self, kind: str, seconds: float):
+        """Send no `kind` request for `seconds` (the API answered 429)."""
+        with self._lock:
+            self._paused_until[kind] = max(self._paused_until[kind], time.monotonic() + seconds)
+
+    def usage(self) -> Dict[str, dict]:
+        with self._lock:
+            now = time.monotonic()
+            for kind in self._sent:
+                self._prune(kind, now)
+            return {kind: {"used": len(sent), "limit": self.limits[kind]} for kind, sent in self._sent.items()}
+
+
+class SheetsGateway:
+    def __init__(
+        self,
+        reads_per_minute: int = DEFAULT_READS_PER_MINUTE,
+        writes_per_minute: int = DEFAULT_WRITES_PER_MINUTE,
+        max_wait: float = 3.0,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 16.0,
+        max_call_seconds: float = 10.0,
+    ):
+        self.budget = QuotaBudget({"read": reads_per_minute, "write": writes_per_minute})
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_call_seconds = max_call_seconds
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._worksheets: Dict[Hashable, "ManagedWorksheet"] = {}
+        self._deferred: deque = deque()  # (ManagedWorksheet, row, tag)
+        self._counters: Counter = Counter()
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] += n
+
+    def call(self, kind: str, fn: Callable, *args, max_wait: Optional[float] = None, **kwargs):
+        """Run one API call within the `kind` budget, retrying retryable failures."""
+        wait = self.max_wait if max_wait is None else max_wait
+        started = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            if not self.budget.acquire(kind, wait):
+                if wait > 0:
+                    # Non-blocking flush attempts are not caller-visible; count only real waits.
+                    self._count(f"{kind}_throttled")
+                raise QuotaExhausted(f"Google Sheets {kind} budget ({self.budget.limits[kind]}/min) exhausted")
+            self._count(f"{kind}_requests")
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if _status_of(e) == 429:
+                    self._count("rate_limited")
+                    self.budget.pause(kind, _retry_after(e) or self.base_delay * 2 ** attempt)
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                out_of_time = time.monotonic() - started + delay > self.max_call_seconds
+                if attempt >= self.max_retries or not is_retryable(e) or out_of_time:
+                    self._count(f"{kind}_errors")
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+
+    def read(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """Like call("read", ...), but concurrent reads with the same key share one request."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self._counters["coalesced_reads"] += 1
+        if not leader:
+            return future.result()
+        try:
+            result = self.call("read", fn, *args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def worksheet(self, name: Hashable, opener: Callable[[], Any]) -> "ManagedWorksheet":
+        """Open a worksheet once per process; `opener` authorizes and returns a gspread Worksheet."""
+        with self._lock:
+            managed = self._worksheets.get(name)
+        if managed is not None:
+            return managed
+        ws = self.read(("open", name), opener)
+        with self._lock:
+            return self._worksheets.setdefault(name, ManagedWorksheet(ws, self))
+
+    def append_row_or_defer(self, ws: "ManagedWorksheet", row: list, tag: str = "", defer: bool = True) -> bool:
+        """
+        Append now (True) or queue the row for a later flush (False) when the budget is exhausted
+        or retries ran out. Rows already queued are sent first so the sheet keeps submit order.
+        Non-retryable errors (permissions, bad range) are raised. With defer=False nothing is
+        queued: the quota/retry error is raised too (callers without a local copy of the row).
+        """
+        self.flush_deferred()
+        with self._lock:
+            queued = bool(self._deferred)
+            if queued and defer:
+                self._deferred.append((ws, list(row), tag))
+                self._counters["deferred_rows"] += 1
+        if queued:
+            if defer:
+                return False
+            raise QuotaExhausted("Google Sheets write budget exhausted (earlier rows are still queued)")
+        try:
+            self.call("write", ws.worksheet.append_row, row)
+            ws.note_appended(row)
+            return True
+        except Exception as e:
+            if not defer or not (isinstance(e, QuotaExhausted) or is_retryable(e)):
+                raise
+            with self._lock:
+                self._deferred.append((ws, list(row), tag))
+                self._counters["deferred_rows"] += 1
+            return False
+
+    def flush_deferred(self, max_rows: int = 20) -> int:
+        """Send queued rows without waiting for budget; returns how many were written."""
+        if not self._deferred or not self._flush_lock.acquire(blocking=False):
+            return 0
+        written = 0
+        try:
+            while written < max_rows:
+                with self._lock:
+                    if not self._deferred:
+                        break
+                    ws, row, tag = self._deferred[0]
+                try:
+                    self.call("write", ws.worksheet.append_row, row, max_wait=0.0)
+                except Exception as e:
+                    if isinstance(e, QuotaExhausted) or is_retryable(e):
+                        break
+                    # Only callers that kept a local copy defer rows (app.py's journal);
+                    # scripts/reconcile_survey_results.py can resend it from there.
+                    self._count("deferred_dropped")
+                else:
+                    written += 1
+                    ws.note_appended(row)
+                    self._count("deferred_flushed")
+                with self._lock:
+                    self._deferred.popleft()
+        finally:
+            self._flush_lock.release()
+        return written
+
+    def pending_tags(self, ws: "ManagedWorksheet") -> Set[str]:
+        """Tags (e.g. assignment_id) of rows still queued for `ws`."""
+        key = ws.key
+        with self._lock:
+            return {tag for queued_ws, _, tag in self._deferred if tag and queued_ws.key == key}
+
+    def stats(self) -> dict:
+        usage = self.budget.usage()
+        with self._lock:
+            counters = dict(self._counters)
+            pending = len(self._deferred)
+            worksheets = len(self._worksheets)
+        return {
+            "reads_last_minute": usage["read"]["used"],
+            "read_limit": usage["read"]["limit"],
+            "writes_last_minute": usage["write"]["used"],
+            "write_limit": usage["write"]["limit"],
+            "pending_rows": pending,
+            "worksheets": worksheets,
+            **{name: counters.get(name, 0) for name in (
+                "read_requests", "write_requests", "read_errors", "write_errors", "read_throttled", "write_throttled",
+                "retries", "rate_limited", "coalesced_reads", "deferred_rows", "deferred_flushed", "deferred_dropped", "stale_reads",
+            )},
+        }
+
+
+class ManagedWorksheet:
+    def __init__(self, worksheet, gateway: SheetsGateway):
+        self.worksheet = worksheet
+        self.gateway = gateway
+        self.key = worksheet_key(worksheet)
+        self._lock = threading.Lock()
+        self._snapshot: Optional[List[list]] = None
+        self._appended: List[list] = []
+
+    def note_appended(self, row: list):
+        with self._lock:
+            self._appended.append(["" if v is None else str(v) for v in row])
+
+    def get_all_values(self, **kwargs) -> List[list]:
+        self.gateway.flush_deferred()
+        with self._lock:
+            appended_before = len(self._appended)
+        try:
+            values = self.gateway.read(
+                (self.key, "get_all_values", tuple(sorted(kwargs.items()))), self.worksheet.get_all_values, **kwargs
+            )
+        except Exception as e:
+            if self._snapshot is None or kwargs or not (isinstance(e, QuotaExhausted) or is_retryable(e)):
+                raise
+            self.gateway._count("stale_reads")
+            with self._lock:
+                return self._snapshot + self._appended
+        if not kwargs:
+            with self._lock:
+                # Rows appended while the read was in flight may or may not be in it; keep them in the
+                # overlay (a duplicate row only repeats an id the callers put in a set).
+                self._snapshot = values
+                self._appended = self._appended[appended_before:]
+        return values
+
+    def append_row(self, row: list, **kwargs):
+        result = self.gateway.call("write", self.worksheet.append_row, row, **kwargs)
+        self.note_appended(row)
+        return result
+
+    def append_row_or_defer(self, row: list, tag: str = "", defer: bool = True) -> bool:
+        return self.gateway.append_row_or_defer(self, row, tag, defer=defer)
+
+    def pending_tags(self) -> Set[str]:
+        return self.gateway.pending_tags(self)
+
+    def __getattr__(self, name):
+        return getattr(self.worksheet, name)
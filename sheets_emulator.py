@@ -0,0 +1,306 @@
+"""
+Local stand-in for the part of gspread the survey apps use, for offline tests and benchmarks.
+
+`connect(settings)` returns an `EmulatedClient` with the same call surface as a gspread
+Client for these paths: Client.open, Spreadsheet.worksheet / worksheets / add_worksheet /
+values_batch_get, and Worksheet.get_all_values / append_row / append_rows / clear. Data lives
+in SQLite, either a file (shared by processes and kept between runs) or ":memory:" (shared by
+the sessions of one process). Spreadsheets are created on first open.
+
+Every request can be slowed down and made to fail, deterministically when a seed is given:
+
+- latency_ms (+ uniform jitter_ms) per request,
+- error_rate: fraction of requests that fail with HTTP 503,
+- reads_per_minute / writes_per_minute: requests over the limit fail with HTTP 429 and a
+  Retry-After header, like the real per-user quota (0 disables the limit).
+
+Errors carry `.response.status_code` and `.response.headers` like gspread's APIError, so
+sheets_client.SheetsGateway retries and defers them the same way.
+
+The apps select the emulator with M2SMF_SHEETS_EMULATOR=<sqlite path or :memory:> (plus
+M2SMF_SHEETS_EMULATOR_LATENCY_MS, _JITTER_MS, _ERROR_RATE, _READS_PER_MINUTE,
+_WRITES_PER_MINUTE, _SEED) or a [sheets_emulator] table in .streamlit/secrets.toml with the
+keys path, latency_ms, jitter_ms, error_rate, reads_per_minute, writes_per_minute, seed.
+"""
+from __future__ import annotations
+
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+ENV_PREFIX = "M2SMF_SHEETS_EMULATOR"
+
+
+class EmulatorSettings(NamedTuple):
+    path: str = ":memory:"
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    reads_per_minute: int = 0
+    writes_per_minute: int = 0
+    seed: Optional[int] = None
+
+
+class WorksheetNotFound(LookupError):
+    pass
+
+
+class _Response(NamedTuple):
+    status_code: int
+    headers: dict
+    text: str
+
+
+class EmulatedAPIError(Exception):
+    def __init__(self, status_code: int, message: str, headers: Optional[dict] = None):
+        super().__init__(f"APIError: [{status_code}]: {message}")
+        self.response = _Response(status_code, headers or {}, message)
+
+
+def emulator_settings(secrets=None) -> Optional[EmulatorSettings]:
+    """Settings from the environment, else from secrets["sheets_emulator"]; None if not selected."""
+    if os.environ.get(ENV_PREFIX):
+        raw = {"path": os.environ[ENV_PREFIX]}
+        for field in EmulatorSettings._fields[1:]:
+            value = os.environ.get(f"{ENV_PREFIX}_{field.upper()}")
+            if value:
+                raw[field] = value
+    else:
+        try:
+            raw = dict(secrets["sheets_emulator"]) if secrets is not None and "sheets_emulator" in secrets else None
+        except Exception:
+            # st.secrets raises when no secrets.toml exists.
+            raw = None
+        if raw is None:
+            return None
+    defaults = EmulatorSettings()
+    values = {}
+    for field in EmulatorSettings._fields:
+        value = raw.get(field, getattr(defaults, field))
+        if field == "path" or value is None:
+            values[field] = value
+        elif field in ("reads_per_minute", "writes_per_minute", "seed"):
+            values[field] = int(value)
+        else:
+            values[field] = float(value)
+    return EmulatorSettings(**values)
+
+
+class _Backend:
+    """One SQLite store plus the request simulator; shared by every client of the same path."""
+
+    def __init__(self, settings: EmulatorSettings):
+        self.settings = settings
+        self._lock = threading.RLock()
+        self._random = random.Random(settings.seed)
+        self._sent = {"read": deque(), "write": deque()}
+        self.requests = {"read": 0, "write": 0, "rejected": 0}
+        self._db = sqlite3.connect(settings.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS spreadsheets (id TEXT PRIMARY KEY, title TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS worksheets (
+                id INTEGER PRIMARY KEY, spreadsheet_id TEXT NOT NULL, title TEXT NOT NULL,
+                row_count INTEGER NOT NULL, col_count INTEGER NOT NULL, UNIQUE (spreadsheet_id, title));
+            CREATE TABLE IF NOT EXISTS cells (
+                worksheet_id INTEGER NOT NULL, row_index INTEGER NOT NULL, values_json TEXT NOT NULL,
+                PRIMARY KEY (worksheet_id, row_index));
+            """
+        )
+
+    def request(self, kind: str):
+        """Simulate one API request: quota check, latency, injected 503."""
+        s = self.settings
+        limit = s.reads_per_minute if kind == "read" else s.writes_per_minute
+        with self._lock:
+            now = time.monotonic()
+            sent = self._sent[kind]
+            while sent and now - sent[0] >= 60.0:
+                sent.popleft()
+            if limit and len(sent) >= limit:
+                self.requests["rejected"] += 1
+                retry_after = max(1, int(sent[0] + 60.0 - now + 1))
+                raise EmulatedAPIError(
+                    429, f"Quota exceeded for quota metric '{kind.title()} requests' (emulated)", {"Retry-After": str(retry_after)}
+                )
+            sent.append(now)
+            self.requests[kind] += 1
+            delay = (s.latency_ms + self._random.uniform(0, s.jitter_ms)) / 1000.0
+            fail = s.error_rate > 0 and self._random.random() < s.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise EmulatedAPIError(503, "The service is currently unavailable. (emulated)")
+
+    def query(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def append(self, worksheet_id: int, rows: List[list]):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                (n,) = self._db.execute("SELECT COUNT(*) FROM cells WHERE worksheet_id = ?", (worksheet_id,)).fetchone()
+                self._db.executemany(
+                    "INSERT INTO cells (worksheet_id, row_index, values_json) VALUES (?, ?, ?)",
+                    [(worksheet_id, n + i, json.dumps([_cell(v) for v in row], ensure_ascii=False)) for i, row in enumerate(rows)],
+                )
+                self._db.execute(
+                    "UPDATE worksheets SET row_count = MAX(row_count, ?) WHERE id = ?", (n + len(rows), worksheet_id)
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+
+def _cell(value) -> str:
+    # The Sheets API returns every value as a string (RAW input, FORMATTED_VALUE output).
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    return str(value)
+
+
+def _trim(values: List[str]) -> List[str]:
+    # Like the API, trailing empty cells are not returned.
+    end = len(values)
+    while end and values[end - 1] == "":
+        end -= 1
+    return values[:end]
+
+
+class EmulatedWorksheet:
+    def __init__(self, spreadsheet: "EmulatedSpreadsheet", worksheet_id: int, title: str):
+        self.spreadsheet = spreadsheet
+        self.id = worksheet_id
+        self.title = title
+        self._backend = spreadsheet._backend
+
+    @property
+    def spreadsheet_id(self) -> str:
+        return self.spreadsheet.id
+
+    @property
+    def row_count(self) -> int:
+        return self._backend.query("SELECT row_count FROM worksheets WHERE id = ?", (self.id,))[0][0]
+
+    @property
+    def col_count(self) -> int:
+        return self._backend.query("SELECT col_count FROM worksheets WHERE id = ?", (self.id,))[0][0]
+
+    def _values(self) -> List[List[str]]:
+        rows = self._backend.query("SELECT values_json FROM cells WHERE worksheet_id = ? ORDER BY row_index", (self.id,))
+        return [_trim(json.loads(v)) for (v,) in rows]
+
+    def get_all_values(self, **kwargs) -> List[List[str]]:
+        self._backend.request("read")
+        values = self._values()
+        width = max((len(r) for r in values), default=0)
+        return [r + [""] * (width - len(r)) for r in values]
+
+    def append_row(self, values: list, value_input_option: str = "RAW", **kwargs) -> dict:
+        return self.append_rows([values], value_input_option=value_input_option)
+
+    def append_rows(self, values: List[list], value_input_option: str = "RAW", **kwargs) -> dict:
+        self._backend.request("write")
+        self._backend.append(self.id, values)
+        return {"spreadsheetId": self.spreadsheet.id, "updates": {"updatedRows": len(values)}}
+
+    def clear(self) -> dict:
+        self._backend.request("write")
+        self._backend.query("DELETE FROM cells WHERE worksheet_id = ?", (self.id,))
+        return {"spreadsheetId": self.spreadsheet.id}
+
+    def __repr__(self):
+        return f"<EmulatedWorksheet {self.title!r} id:{self.id}>"
+
+
+class EmulatedSpreadsheet:
+    def __init__(self, backend: _Backend, spreadsheet_id: str, title: str):
+        self._backend = backend
+        self.id = spreadsheet_id
+        self.title = title
+
+    def worksheets(self) -> List[EmulatedWorksheet]:
+        self._backend.request("read")
+        rows = self._backend.query("SELECT id, title FROM worksheets WHERE spreadsheet_id = ? ORDER BY id", (self.id,))
+        return [EmulatedWorksheet(self, wid, title) for wid, title in rows]
+
+    def worksheet(self, title: str) -> EmulatedWorksheet:
+        self._backend.request("read")
+        rows = self._backend.query("SELECT id FROM worksheets WHERE spreadsheet_id = ? AND title = ?", (self.id, title))
+        if not rows:
+            raise WorksheetNotFound(title)
+        return EmulatedWorksheet(self, rows[0][0], title)
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, **kwargs) -> EmulatedWorksheet:
+        self._backend.request("write")
+        try:
+            self._backend.query(
+                "INSERT INTO worksheets (spreadsheet_id, title, row_count, col_count) VALUES (?, ?, ?, ?)",
+                (self.id, title, int(rows), int(cols)),
+            )
+        except sqlite3.IntegrityError:
+            raise EmulatedAPIError(400, f'A sheet with the name "{title}" already exists.') from None
+        (wid,) = self._backend.query("SELECT id FROM worksheets WHERE spreadsheet_id = ? AND title = ?", (self.id, title))[0]
+        return EmulatedWorksheet(self, wid, title)
+
+    def values_batch_get(self, ranges: List[str], params: Optional[dict] = None) -> dict:
+        """Whole-sheet ranges only ("Title", "'Title'" or with an A1 suffix, which is ignored)."""
+        self._backend.request("read")
+        value_ranges = []
+        for rng in ranges:
+            title = re.sub(r"!.*$", "", rng)
+            if len(title) >= 2 and title[0] == title[-1] == "'":
+                title = title[1:-1].replace("''", "'")
+            rows = self._backend.query("SELECT id FROM worksheets WHERE spreadsheet_id = ? AND title = ?", (self.id, title))
+            if not rows:
+                raise EmulatedAPIError(400, f"Unable to parse range: {rng}")
+            values = EmulatedWorksheet(self, rows[0][0], title)._values()
+            while values and not values[-1]:
+                values.pop()
+            value_ranges.append({"range": rng, "majorDimension": "ROWS", **({"values": values} if values else {})})
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+    def __repr__(self):
+        return f"<EmulatedSpreadsheet {self.title!r} id:{self.id}>"
+
+
+class EmulatedClient:
+    def __init__(self, backend: _Backend):
+        self._backend = backend
+
+    def open(self, title: str) -> EmulatedSpreadsheet:
+        self._backend.request("read")
+        rows = self._backend.query("SELECT id FROM spreadsheets WHERE title = ?", (title,))
+        if not rows:
+            spreadsheet_id = f"emulated-{len(self._backend.query('SELECT id FROM spreadsheets')) + 1}"
+            self._backend.query("INSERT OR IGNORE INTO spreadsheets (id, title) VALUES (?, ?)", (spreadsheet_id, title))
+            rows = self._backend.query("SELECT id FROM spreadsheets WHERE title = ?", (title,))
+        return EmulatedSpreadsheet(self._backend, rows[0][0], title)
+
+    def stats(self) -> Dict[str, int]:
+        with self._backend._lock:
+            return dict(self._backend.requests)
+
+
+_BACKENDS: Dict[EmulatorSettings, _Backend] = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def connect(settings: EmulatorSettings) -> EmulatedClient:
+    """Client over the shared backend for these settings (one store and quota window per process)."""
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get(settings)
+        if backend is None:
+            backend = _BACKENDS[settings] = _Backend(settings)
+    return EmulatedClient(backend)
@@ -0,0 +1,99 @@
+"""
+Content-addressed image files for browser-cacheable image URLs.
+
+st.image with bytes or a path sends the image through Streamlit's media file manager on
+every rerun, under a new URL each time, so the browser never reuses a cached copy. Here
+each displayed image is written once to
+
+    static/img/<sha256[:32]><ext>
+
+and referenced by URL. The name depends only on the bytes, so the same image gets the same
+URL in every session and every reader's worklist, a changed image gets a new URL, and the
+name reveals nothing about the generator or prompt.
+
+Two ways to serve the directory, chosen by the url base passed to `image_url`:
+- "/app/static/img": Streamlit's own static route (.streamlit/config.toml sets
+  server.enableStaticServing; the static/ folder must sit next to the app script).
+  Responses carry ETag/Last-Modified but no long Cache-Control.
+- "http://<host>:<port>": scripts/serve_static_images.py, which adds
+  `Cache-Control: public, max-age=31536000, immutable` and answers If-None-Match with 304.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import image_pack
+
+STATIC_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "img")
+STREAMLIT_STATIC_BASE = "/app/static/img"
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp"}
+
+
+def static_name(data: bytes, ext: str = ".png") -> str:
+    return hashlib.sha256(data).hexdigest()[:32] + ext.lower()
+
+
+def image_url(url_base: str, name: str) -> str:
+    # ?v= is what Tornado-based Streamlit versions key their long max-age on; the name is
+    # already unique per content, so it costs nothing elsewhere.
+    return f"{url_base.rstrip('/')}/{name}?v={name[:12]}"
+
+
+class StaticImagePublisher:
+    """Writes image bytes into static_dir under their content hash, once per process."""
+
+    def __init__(self, url_base: str, static_dir: str = STATIC_IMAGE_DIR):
+        self.url_base = url_base
+        self.static_dir = static_dir
+        self._lock = threading.Lock()
+        self._written = set()
+        self._by_source: Dict[Tuple[str, tuple], str] = {}
+
+    def _write(self, name: str, data: bytes):
+        with self._lock:
+            if name in self._written:
+                return
+        path = os.path.join(self.static_dir, name)
+        if not os.path.exists(path):
+            os.makedirs(self.static_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._written.add(name)
+
+    def url_for_bytes(self, data: bytes, ext: str = ".png") -> str:
+        name = static_name(data, ext)
+        self._write(name, data)
+        return image_url(self.url_base, name)
+
+    def url_for_source(self, path: str) -> Optional[str]:
+        """URL for a file path or image_pack URI; None if it cannot be read."""
+        fingerprint = image_pack.source_fingerprint(path)
+        if fingerprint is None:
+            return None
+        key = (path, fingerprint)
+        with self._lock:
+            name = self._by_source.get(key)
+        if name is not None:
+            return image_url(self.url_base, name)
+
+        source = image_pack.read_source(path)
+        if isinstance(source, str):
+            try:
+                with open(source, "rb") as f:
+                    data = f.read()
+            except OSError:
+                return None
+        else:
+            data = source
+        ext = os.path.splitext(path.split("#")[-1])[1].lower()
+        name = static_name(data, ext if ext in IMAGE_EXTS else ".png")
+        self._write(name, data)
+        with self._lock:
+            self._by_source[key] = name
+        return image_url(self.url_base, name)
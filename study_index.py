@@ -0,0 +1,414 @@
+"""
+Single SQLite index over the study CSVs (prompts, generated images, reader assignments,
+rater image sets and the Yang cross-evaluation selection).
+
+The CSVs stay the source of truth; `build_study_index` compiles them into one indexed
+database and `StudyIndex` is the read-only query API used by the apps and scripts.
+
+Tables:
+- prompts          one row per prompt_id (generation manifest + annotated prompt input)
+- images           one row per image_key (relative image path), generated or rater-set images
+- readers          professors from the hidden assignment and the app_survey rater sets
+- assignments      hidden reader assignment, one row per assignment_id
+- reader_images    which reader sees which image (copy plans and rater-set manifests)
+- cross_eval       M2SMF_Yang_cross_eval_manifest.csv
+- sources          path/mtime/size of every ingested CSV, used by `is_fresh`
+
+The view `assignment_rows` reproduces the hidden assignment CSV columns, so code written
+against csv.DictReader rows can read from the index unchanged.
+"""
+from __future__ import annotations
+
+import csv
+import glob
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+PROMPT_LABEL_COLS = [
+    "label_pneumonia_or_opacity",
+    "label_cardiomegaly",
+    "label_pleural_effusion",
+    "label_pneumothorax",
+    "label_edema",
+    "label_atelectasis",
+    "label_support_device",
+    "label_chronic_lung_disease",
+]
+PROMPT_COLS = [
+    "prompt_id", "prompt_number", "generation_prompt", "annotated_prompt", "category",
+    "disease_primary", "age", "sex", "severity",
+] + PROMPT_LABEL_COLS
+IMAGE_COLS = [
+    "image_key", "generated_image_id", "prompt_id", "model_key", "generator_name", "folder",
+    "model_version_or_identifier", "image_relpath", "image_path", "image_exists", "source_quality",
+]
+ASSIGNMENT_COLS = [
+    "assignment_id", "reader_id", "reader_sequence", "blinded_image_id", "blinded_filename", "case_hash",
+    "image_key", "cv_role", "is_cross_validation_duplicate", "blinding_note",
+]
+CROSS_EVAL_COLS = [
+    "blind_case_order", "image_key", "original_rater", "final_bucket", "selection_note",
+    "source_quality_hidden", "score", "release", "case_order", "artifact_count", "other_yes", "comment",
+]
+# Column order of survey_manifests/M2SMF_external_QA_hidden_assignment.csv.
+HIDDEN_ASSIGNMENT_COLS = [
+    "assignment_id", "reader_id", "reader_display", "reader_sequence", "blinded_image_id", "blinded_filename",
+    "case_hash", "prompt_id", "prompt_number", "generation_prompt", "category", "disease_primary", "age", "sex",
+    "severity",
+] + PROMPT_LABEL_COLS + [
+    "model_key", "generator_name", "folder", "model_version_or_identifier", "generated_image_id",
+    "image_relpath", "image_path", "image_exists", "cv_role", "is_cross_validation_duplicate", "blinding_note",
+]
+
+SCHEMA = f"""
+CREATE TABLE prompts (
+    prompt_id TEXT PRIMARY KEY,
+    prompt_number INTEGER,
+    {", ".join(f"{c} TEXT" for c in PROMPT_COLS[2:])}
+);
+CREATE TABLE images (
+    image_key TEXT PRIMARY KEY,
+    generated_image_id TEXT UNIQUE,
+    prompt_id TEXT REFERENCES prompts(prompt_id),
+    model_key TEXT,
+    generator_name TEXT,
+    folder TEXT,
+    model_version_or_identifier TEXT,
+    image_relpath TEXT,
+    image_path TEXT,
+    image_exists TEXT,
+    source_quality TEXT
+);
+CREATE INDEX images_model_key ON images(model_key);
+CREATE INDEX images_prompt_id ON images(prompt_id);
+CREATE TABLE readers (
+    reader_id TEXT PRIMARY KEY,
+    reader_display TEXT,
+    source TEXT
+);
+CREATE TABLE assignments (
+    assignment_id TEXT PRIMARY KEY,
+    reader_id TEXT REFERENCES readers(reader_id),
+    reader_sequence INTEGER,
+    blinded_image_id TEXT,
+    blinded_filename TEXT,
+    case_hash TEXT,
+    image_key TEXT REFERENCES images(image_key),
+    cv_role TEXT,
+    is_cross_validation_duplicate TEXT,
+    blinding_note TEXT
+);
+CREATE INDEX assignments_reader ON assignments(reader_id, reader_sequence);
+CREATE INDEX assignments_image ON assignments(image_key);
+CREATE INDEX assignments_blinded ON assignments(blinded_image_id);
+CREATE TABLE reader_images (
+    reader_id TEXT REFERENCES readers(reader_id),
+    image_key TEXT REFERENCES images(image_key),
+    assignment_id TEXT,
+    blinded_filename TEXT,
+    source TEXT,
+    PRIMARY KEY (reader_id, image_key, source)
+);
+CREATE INDEX reader_images_image ON reader_images(image_key);
+CREATE TABLE cross_eval (
+    blind_case_order INTEGER PRIMARY KEY,
+    {", ".join(f"{c} TEXT" for c in CROSS_EVAL_COLS[1:])}
+);
+CREATE INDEX cross_eval_image ON cross_eval(image_key);
+CREATE TABLE sources (
+    path TEXT PRIMARY KEY,
+    role TEXT,
+    mtime_ns INTEGER,
+    size INTEGER,
+    n_rows INTEGER
+);
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE VIEW assignment_rows AS
+SELECT
+    a.assignment_id, a.reader_id, r.reader_display, a.reader_sequence, a.blinded_image_id,
+    a.blinded_filename, a.case_hash, p.prompt_id, p.prompt_number, p.generation_prompt, p.category,
+    p.disease_primary, p.age, p.sex, p.severity,
+    {", ".join(f"p.{c}" for c in PROMPT_LABEL_COLS)},
+    i.model_key, i.generator_name, i.folder, i.model_version_or_identifier, i.generated_image_id,
+    i.image_relpath, i.image_path, i.image_exists, a.cv_role, a.is_cross_validation_duplicate, a.blinding_note
+FROM assignments a
+LEFT JOIN readers r ON r.reader_id = a.reader_id
+LEFT JOIN images i ON i.image_key = a.image_key
+LEFT JOIN prompts p ON p.prompt_id = i.prompt_id;
+"""
+
+DEFAULT_SOURCES = {
+    "prompt_input": "m2smf_external_prompt_75_input.csv",
+    "generation_manifest": "survey_manifests/M2SMF_external_generation_manifest_300.csv",
+    "hidden_assignment": "survey_manifests/M2SMF_external_QA_hidden_assignment.csv",
+    "copy_plans": "survey_manifests/*_image_copy_plan.csv",
+    "worklists": "survey_manifests/*_blinded_worklist.csv",
+    "rater_sets": "*/manifest_*.csv",
+    "cross_eval": "M2SMF_Yang_cross_eval_manifest.csv",
+}
+
+
+def read_csv_rows(path: str) -> List[dict]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return [row for row in csv.DictReader(f)]
+
+
+def image_key(path: str) -> str:
+    key = (path or "").strip().replace("\\", "/")
+    while key.startswith("./"):
+        key = key[2:]
+    return key
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _insert(conn: sqlite3.Connection, table: str, cols: List[str], rows: Iterable[Iterable], mode: str = "INSERT"):
+    sql = f"{mode} INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+    conn.executemany(sql, rows)
+
+
+def _rater_set_quality(root: str, set_dir: str, key: str) -> str:
+    name = os.path.basename(key)
+    for quality in ("HQ", "LQ"):
+        if os.path.exists(os.path.join(root, set_dir, quality, name)):
+            return quality
+    return ""
+
+
+def build_study_index(root: str, db_path: str, sources: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Compile the study CSVs under `root` into a new SQLite database at `db_path`.
+    The database is written to a temporary file and moved into place, so readers never
+    see a half-built index. Returns row counts and consistency warnings.
+    """
+    sources = {**DEFAULT_SOURCES, **(sources or {})}
+    tmp_path = f"{db_path}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    warnings: List[str] = []
+    ingested: List[tuple] = []
+
+    def load(role: str) -> Dict[str, List[dict]]:
+        out = {}
+        for path in sorted(glob.glob(os.path.join(root, sources[role]))):
+            rows = read_csv_rows(path)
+            st = os.stat(path)
+            ingested.append((os.path.relpath(path, root), role, st.st_mtime_ns, st.st_size, len(rows)))
+            out[path] = rows
+        return out
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+
+        generation_rows = [r for rows in load("generation_manifest").values() for r in rows]
+        hidden_rows = [r for rows in load("hidden_assignment").values() for r in rows]
+
+        # prompts: generation manifest first, annotated prompt text joined by id.
+        prompts: Dict[str, dict] = {}
+        for row in generation_rows:
+            prompts.setdefault(row["prompt_id"], row)
+        annotated = {}
+        for rows in load("prompt_input").values():
+            annotated.update({row["id"]: row.get("annotated_prompt", "") for row in rows})
+        for prompt_id in annotated.keys() - prompts.keys():
+            prompts[prompt_id] = {"prompt_id": prompt_id}
+        _insert(conn, "prompts", PROMPT_COLS, (
+            [pid, _int_or_none(row.get("prompt_number"))]
+            + [annotated.get(pid, "") if c == "annotated_prompt" else row.get(c, "") for c in PROMPT_COLS[2:]]
+            for pid, row in sorted(prompts.items())
+        ))
+
+        # images: generated images from the generation manifest and the hidden assignment.
+        images: Dict[str, dict] = {}
+        for row in generation_rows + hidden_rows:
+            key = image_key(row.get("image_relpath") or row.get("image_path"))
+            if key:
+                images.setdefault(key, {**row, "image_key": key})
+
+        # readers + assignments
+        readers: Dict[str, tuple] = {}
+        for row in hidden_rows:
+            readers.setdefault(row["reader_id"], (row["reader_id"], row.get("reader_display", ""), "hidden_assignment"))
+        _insert(conn, "assignments", ASSIGNMENT_COLS, (
+            [
+                row["assignment_id"], row["reader_id"], _int_or_none(row.get("reader_sequence")),
+                row.get("blinded_image_id", ""), row.get("blinded_filename", ""), row.get("case_hash", ""),
+                image_key(row.get("image_relpath") or row.get("image_path")), row.get("cv_role", ""),
+                row.get("is_cross_validation_duplicate", ""), row.get("blinding_note", ""),
+            ]
+            for row in hidden_rows
+        ))
+
+        # reader_images: professor copy plans and app_survey rater-set manifests.
+        reader_images = []
+        for path, rows in load("copy_plans").items():
+            reader_id = os.path.basename(path).replace("_image_copy_plan.csv", "")
+            for row in rows:
+                key = image_key(row.get("image_relpath") or row.get("image_path"))
+                reader_images.append((reader_id, key, row.get("assignment_id", ""), row.get("blinded_filename", ""), "copy_plan"))
+        for path, rows in load("rater_sets").items():
+            set_dir = os.path.basename(os.path.dirname(path))
+            readers.setdefault(set_dir, (set_dir, set_dir, "rater_set"))
+            for row in rows:
+                key = image_key(row.get("image_id"))
+                if not key:
+                    continue
+                quality = _rater_set_quality(root, set_dir, key)
+                images.setdefault(key, {"image_key": key, "image_relpath": key, "folder": key.split("/")[0]})
+                if quality and not images[key].get("source_quality"):
+                    images[key]["source_quality"] = quality
+                reader_images.append((set_dir, key, "", "", "rater_set"))
+        _insert(conn, "reader_images", ["reader_id", "image_key", "assignment_id", "blinded_filename", "source"],
+                reader_images, mode="INSERT OR IGNORE")
+
+        # Worklists are reader-facing copies of the hidden assignment; check, do not store twice.
+        assigned = {row["assignment_id"]: row for row in hidden_rows}
+        for path, rows in load("worklists").items():
+            for row in rows:
+                hidden = assigned.get(row.get("assignment_id"))
+                if hidden is None or hidden.get("blinded_image_id") != row.get("blinded_image_id"):
+                    warnings.append(f"{os.path.relpath(path, root)}: {row.get('assignment_id')} does not match the hidden assignment")
+
+        # cross_eval
+        cross_rows = []
+        for rows in load("cross_eval").values():
+            for row in rows:
+                key = image_key(row.get("image_id"))
+                images.setdefault(key, {"image_key": key, "image_relpath": key, "folder": key.split("/")[0]})
+                if row.get("source_quality_hidden") and not images[key].get("source_quality"):
+                    images[key]["source_quality"] = row["source_quality_hidden"]
+                cross_rows.append(
+                    [_int_or_none(row.get("blind_case_order")), key] + [row.get(c, "") for c in CROSS_EVAL_COLS[2:]]
+                )
+        _insert(conn, "cross_eval", CROSS_EVAL_COLS, cross_rows)
+
+        _insert(conn, "images", IMAGE_COLS, (
+            [(row.get(c) or None) if c == "generated_image_id" else row.get(c, "") for c in IMAGE_COLS]
+            for _, row in sorted(images.items())
+        ))
+        _insert(conn, "readers", ["reader_id", "reader_display", "source"], sorted(readers.values()))
+        _insert(conn, "sources", ["path", "role", "mtime_ns", "size", "n_rows"], ingested, mode="INSERT OR REPLACE")
+        _insert(conn, "meta", ["key", "value"], [
+            ("built_at", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            ("root", os.path.abspath(root)),
+        ])
+
+        missing_images = conn.execute(
+            "SELECT COUNT(*) FROM reader_images ri LEFT JOIN images i ON i.image_key = ri.image_key WHERE i.image_key IS NULL"
+        ).fetchone()[0]
+        if missing_images:
+            warnings.append(f"{missing_images} copy-plan rows reference images not in the generation manifest")
+
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("prompts", "images", "readers", "assignments", "reader_images", "cross_eval", "sources")
+        }
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    return {"counts": counts, "warnings": warnings}
+
+
+class StudyIndex:
+    """Read-only query API over a database built by `build_study_index`."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+    def close(self):
+        self.conn.close()
+
+    def _all(self, sql: str, params=()) -> List[dict]:
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def _one(self, sql: str, params=()) -> Optional[dict]:
+        row = self.conn.execute(sql, params).fetchone()
+        return dict(row) if row is not None else None
+
+    def root(self) -> str:
+        return self._one("SELECT value FROM meta WHERE key = 'root'")["value"]
+
+    def source_paths(self, role: str) -> List[str]:
+        """Absolute paths of the CSVs ingested for a DEFAULT_SOURCES role, e.g. "hidden_assignment"."""
+        root = self.root()
+        return [os.path.join(root, r["path"]) for r in self._all("SELECT path FROM sources WHERE role = ?", (role,))]
+
+    def is_fresh(self) -> bool:
+        """True if every ingested CSV still has the mtime/size recorded at build time."""
+        root = self.root()
+        for row in self.conn.execute("SELECT path, mtime_ns, size FROM sources"):
+            try:
+                st = os.stat(os.path.join(root, row["path"]))
+            except OSError:
+                return False
+            if (st.st_mtime_ns, st.st_size) != (row["mtime_ns"], row["size"]):
+                return False
+        return True
+
+    def assignment(self, assignment_id: str) -> Optional[dict]:
+        return self._one("SELECT * FROM assignment_rows WHERE assignment_id = ?", (assignment_id,))
+
+    def assignment_rows(self, reader_id: Optional[str] = None) -> List[dict]:
+        """Hidden assignment rows as strings, in the CSV's column order (like csv.DictReader)."""
+        sql = "SELECT * FROM assignment_rows"
+        params = ()
+        if reader_id is not None:
+            sql += " WHERE reader_id = ?"
+            params = (reader_id,)
+        sql += " ORDER BY assignment_id"
+        return [
+            {c: "" if row.get(c) is None else str(row[c]) for c in HIDDEN_ASSIGNMENT_COLS}
+            for row in self._all(sql, params)
+        ]
+
+    def reader_worklist(self, reader_id: str) -> List[dict]:
+        return self._all(
+            "SELECT * FROM assignment_rows WHERE reader_id = ? ORDER BY reader_sequence", (reader_id,)
+        )
+
+    def assignments_for_image(self, key: str) -> List[dict]:
+        return self._all(
+            "SELECT * FROM assignment_rows WHERE image_relpath = ? ORDER BY assignment_id", (image_key(key),)
+        )
+
+    def image(self, key: str) -> Optional[dict]:
+        return self._one("SELECT * FROM images WHERE image_key = ?", (image_key(key),))
+
+    def images_by_generator(self, model_key: str) -> List[dict]:
+        return self._all("SELECT * FROM images WHERE model_key = ? ORDER BY image_key", (model_key,))
+
+    def prompt(self, prompt_id: str) -> Optional[dict]:
+        return self._one("SELECT * FROM prompts WHERE prompt_id = ?", (prompt_id,))
+
+    def readers(self) -> List[dict]:
+        return self._all("SELECT * FROM readers ORDER BY reader_id")
+
+    def reader_images(self, reader_id: str) -> List[dict]:
+        return self._all(
+            "SELECT ri.*, i.source_quality FROM reader_images ri LEFT JOIN images i ON i.image_key = ri.image_key "
+            "WHERE ri.reader_id = ? ORDER BY ri.image_key",
+            (reader_id,),
+        )
+
+    def cross_eval_cases(self) -> List[dict]:
+        return self._all("SELECT * FROM cross_eval ORDER BY blind_case_order")
+
+    def query(self, sql: str, params=()) -> List[dict]:
+        """Ad-hoc read-only SQL, e.g. cross-study joins."""
+        return self._all(sql, params)
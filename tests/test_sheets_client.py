@@ -0,0 +1,116 @@
+"""
+SheetsGateway save/resume paths against the in-memory Sheets emulator.
+
+    python -m unittest discover -s tests
+"""
+from __future__ import annotations
+
+import sys
+import time
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from sheets_client import QuotaBudget, QuotaExhausted, SheetsGateway  # noqa: E402
+from sheets_emulator import EmulatorSettings, connect  # noqa: E402
+
+HEADER = ["study_id", "reader_id", "assignment_id"]
+
+
+def row(assignment_id: str) -> list:
+    return ["test", "reader_1", assignment_id]
+
+
+def processed_ids(ws) -> set:
+    """app.py's resume rule: ids in the sheet plus ids still queued in the gateway."""
+    values = ws.get_all_values()
+    col = values[0].index("assignment_id") if values else 0
+    return {r[col] for r in values[1:]} | ws.pending_tags()
+
+
+class GatewayEmulatorTest(unittest.TestCase):
+    def open_worksheet(self, gateway: SheetsGateway, settings: EmulatorSettings = EmulatorSettings()):
+        # One spreadsheet per test: ":memory:" backends are shared within the process.
+        spreadsheet = connect(settings).open(self.id())
+
+        def opener():
+            try:
+                return spreadsheet.worksheet("reader_1")
+            except LookupError:
+                ws = spreadsheet.add_worksheet(title="reader_1", rows=100, cols=len(HEADER))
+                ws.append_row(HEADER)
+                return ws
+
+        return gateway.worksheet(("sheet", "reader_1"), opener)
+
+    def test_append_then_resume_after_restart(self):
+        ws = self.open_worksheet(SheetsGateway())
+        self.assertEqual(ws.get_all_values(), [HEADER])
+        for assignment_id in ("A001", "A002"):
+            self.assertTrue(ws.append_row_or_defer(row(assignment_id), tag=assignment_id))
+
+        # A new process opens the same worksheet through a fresh gateway.
+        restarted = self.open_worksheet(SheetsGateway())
+        self.assertEqual(restarted.get_all_values(), [HEADER, row("A001"), row("A002")])
+        self.assertEqual(processed_ids(restarted), {"A001", "A002"})
+
+    def test_exhausted_write_budget_defers_and_flushes_in_order(self):
+        gateway = SheetsGateway(max_wait=0.0)
+        ws = self.open_worksheet(gateway)
+        gateway.budget = QuotaBudget({"read": 100, "write": 1}, window=0.3)
+
+        self.assertTrue(ws.append_row_or_defer(row("A001"), tag="A001"))
+        self.assertFalse(ws.append_row_or_defer(row("A002"), tag="A002"))
+        self.assertFalse(ws.append_row_or_defer(row("A003"), tag="A003"))
+        self.assertEqual(ws.pending_tags(), {"A002", "A003"})
+        # Deferred rows already count as processed, so the reader is not shown them again.
+        self.assertEqual(processed_ids(ws), {"A001", "A002", "A003"})
+
+        deadline = time.monotonic() + 5.0
+        while gateway.stats()["pending_rows"] and time.monotonic() < deadline:
+            gateway.flush_deferred()
+            time.sleep(0.05)
+        self.assertEqual(ws.pending_tags(), set())
+        self.assertEqual(ws.worksheet.get_all_values(), [HEADER, row("A001"), row("A002"), row("A003")])
+        self.assertEqual(gateway.stats()["deferred_flushed"], 2)
+
+    def test_defer_false_raises_instead_of_queueing(self):
+        gateway = SheetsGateway(max_wait=0.0)
+        ws = self.open_worksheet(gateway)
+        gateway.budget = QuotaBudget({"read": 100, "write": 1}, window=60.0)
+
+        self.assertTrue(ws.append_row_or_defer(row("A001"), tag="A001", defer=False))
+        with self.assertRaises(QuotaExhausted):
+            ws.append_row_or_defer(row("A002"), tag="A002", defer=False)
+        self.assertEqual(gateway.stats()["pending_rows"], 0)
+        self.assertEqual(processed_ids(ws), {"A001"})
+
+    def test_exhausted_read_budget_serves_snapshot_with_own_appends(self):
+        gateway = SheetsGateway(max_wait=0.0)
+        ws = self.open_worksheet(gateway)
+        self.assertEqual(ws.get_all_values(), [HEADER])
+        gateway.budget = QuotaBudget({"read": 0, "write": 100})
+
+        self.assertTrue(ws.append_row_or_defer(row("A001"), tag="A001"))
+        self.assertEqual(ws.get_all_values(), [HEADER, row("A001")])
+        self.assertEqual(gateway.stats()["stale_reads"], 1)
+
+    def test_injected_errors_are_retried(self):
+        settings = EmulatorSettings(error_rate=0.3, seed=7)
+        gateway = SheetsGateway(base_delay=0.01, max_delay=0.05, max_retries=10)
+        spreadsheet = gateway.call("read", connect(settings).open, self.id())
+        raw = gateway.call("write", spreadsheet.add_worksheet, title="reader_1", rows=100, cols=len(HEADER))
+        gateway.call("write", raw.append_row, HEADER)
+        ws = gateway.worksheet(("sheet", "reader_1"), lambda: raw)
+
+        ids = [f"A{i:03d}" for i in range(1, 21)]
+        for assignment_id in ids:
+            ws.append_row_or_defer(row(assignment_id), tag=assignment_id)
+        gateway.flush_deferred(max_rows=len(ids))
+        self.assertEqual(processed_ids(ws), set(ids))
+        self.assertEqual(raw._values(), [HEADER] + [row(i) for i in ids])
+        self.assertGreater(gateway.stats()["retries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
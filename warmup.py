@@ -0,0 +1,108 @@
+"""
+Background warm-up runner with a readiness endpoint for the survey apps.
+
+A `WarmupRunner` executes named steps once, in a daemon thread, and records per-step
+status, timing and a short detail string. Steps that fail are recorded and the remaining
+steps still run, so one missing credential does not keep the image cache cold.
+
+`start_health_server(port, runner)` serves the runner's state as JSON on
+http://<host>:<port>/health (HTTP 200 once every step has finished, 503 before), which is
+what scripts/serve_app.py polls after boot. It binds to loopback unless a host is given
+(e.g. "0.0.0.0" for a load balancer probe). A port that cannot be bound is logged and the
+app keeps running without the endpoint. `extras` adds live sections to the same JSON, e.g.
+the Google Sheets quota counters of app.py.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+Step = Tuple[str, Callable[[], Optional[str]]]
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupRunner:
+    def __init__(self, steps: List[Step]):
+        self._steps = steps
+        self._lock = threading.Lock()
+        self._status = {name: {"state": "pending", "seconds": None, "detail": ""} for name, _ in steps}
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._thread = threading.Thread(target=self._run, name="m2smf-warmup", daemon=True)
+
+    def start(self) -> "WarmupRunner":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        for name, fn in self._steps:
+            with self._lock:
+                self._status[name]["state"] = "running"
+            t0 = time.perf_counter()
+            try:
+                detail, state = fn() or "", "ok"
+            # st.stop() inside a step raises a BaseException subclass; record it like any error.
+            except BaseException as e:  # noqa: B036
+                detail, state = f"{type(e).__name__}: {e}", "error"
+            with self._lock:
+                self._status[name].update(state=state, seconds=round(time.perf_counter() - t0, 3), detail=str(detail)[:500])
+        with self._lock:
+            self.finished_at = time.time()
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            steps = {name: dict(s) for name, s in self._status.items()}
+            finished_at = self.finished_at
+        return {
+            "status": "ready" if finished_at is not None else "warming",
+            "errors": sum(1 for s in steps.values() if s["state"] == "error"),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "warmup_seconds": round(finished_at - self.started_at, 3) if finished_at is not None else None,
+            "steps": steps,
+        }
+
+
+def start_health_server(
+    port: int,
+    runner: WarmupRunner,
+    host: str = "127.0.0.1",
+    extras: Optional[Dict[str, Callable[[], dict]]] = None,
+) -> Optional[ThreadingHTTPServer]:
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/health":
+                self.send_error(404)
+                return
+            snapshot = runner.snapshot()
+            for name, fn in (extras or {}).items():
+                try:
+                    snapshot[name] = fn()
+                except Exception as e:
+                    snapshot[name] = {"error": f"{type(e).__name__}: {e}"}
+            body = json.dumps(snapshot, indent=2).encode("utf-8")
+            self.send_response(200 if runner.ready else 503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", "no-store")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), HealthHandler)
+    except OSError as e:
+        logger.error("health endpoint not started: cannot bind %s:%s (%s)", host, port, e)
+        return None
+    threading.Thread(target=server.serve_forever, name="m2smf-health", daemon=True).start()
+    return server